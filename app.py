@@ -5,7 +5,6 @@
 import os
 import re
 import sqlite3
-import pandas as pd
 import streamlit as st
 
 # ---- Session state (must exist before use)
@@ -21,23 +20,20 @@ st.set_page_config(page_title="Intelligence - Invoice - System",
                    page_icon="📄", layout="wide")
 
 # ---- Local modules
+# Only what the login page needs (stdlib-only modules). pandas, the EDA
+# stack (matplotlib/seaborn) and the OCR/PDF stack are imported by the
+# sidebar, tab or background job that uses them, the first time it runs;
+# benchmarks/bench_imports.py tracks the cost of each page.
 from src.auth import authenticate_user, register_user
-from src.eda import run_eda
-from src.extract import extract_from_ocr_outputs
-from src.editable_table import edit_dataframe
-from src.visual_builder import builder
-from src.invoice_generator import generator
-from src.ingest import process_upload
-
-# Per-user DB helpers
-from src.db import set_db_path, current_db_path, insert_row
+from src import dataset_meta, fileio
 
 # ---------- Paths & constants ----------
 USERS_DIR  = "data/users"
 DUMMY_CSV  = "data/structured_csv/invoice_data.csv"   # master dummy with ~1000 rows
 REQUIRED_COLS = [
     "Invoice_No","Date","Time","Buyer_Name","Buyer_Address","PAN","GSTIN",
-    "Item","Qty","Rate","Amount","CGST","SGST","Total","Terms","Source_File"
+    "Item","Qty","Rate","Amount","CGST","SGST","Total","Terms","Source_File",
+    "Validation_Flags",  # src.normalize.FLAG_COLUMN: new datasets start normalized
 ]
 
 # ---------- path helpers ----------
@@ -60,6 +56,8 @@ def _ensure_dir(path: str) -> None:
 # ---------- seeding / data utilities ----------
 def _seed_db_from_csv(csv_path: str):
     """Seed currently selected DB (current_db_path()) from csv if table exists and is empty."""
+    from src.db import current_db_path, bulk_insert_csv
+
     dbp = current_db_path()
     os.makedirs(os.path.dirname(dbp), exist_ok=True)
     with sqlite3.connect(dbp) as conn:
@@ -73,10 +71,7 @@ def _seed_db_from_csv(csv_path: str):
             return  # already has rows → skip
 
     try:
-        df = pd.read_csv(csv_path)
-        if not df.empty:
-            for _, row in df.fillna("").iterrows():
-                insert_row(row.to_dict())
+        bulk_insert_csv(csv_path, dbp, mirror=dataset_meta.read(csv_path))  # one transaction, chunked CSV read
     except Exception as e:
         st.warning(f"DB seed from CSV skipped: {e}")
 
@@ -110,7 +105,11 @@ def init_user_storage(username: str) -> str:
     - devu_05: on first login copy DUMMY_CSV -> data/users/devu_05/invoice_data.csv
     - others : create empty CSV with required headers
     For ALL: set per-user DB path; for devu_05 seed DB from CSV if DB is empty/new.
+    An existing CSV from before validation is normalized once, here.
     """
+    import pandas as pd
+    from src.db import set_db_path
+
     userdir  = _user_dir(username)
     _ensure_dir(userdir)  # <-- create folder first
 
@@ -120,7 +119,14 @@ def init_user_storage(username: str) -> str:
         if _safe_username(username) == "devu_05" and os.path.exists(DUMMY_CSV):
             _copy_dummy_into_user_csv(csv_path)
         else:
-            pd.DataFrame(columns=REQUIRED_COLS).to_csv(csv_path, index=False)
+            with fileio.atomic_write(csv_path, newline="") as f:
+                pd.DataFrame(columns=REQUIRED_COLS).to_csv(f, index=False)
+        dataset_meta.refresh(csv_path)
+    elif "Validation_Flags" not in dataset_meta.read(csv_path)["columns"]:
+        # One-time upgrade of a dataset from before validation existed, the
+        # same step as `python -m src.normalize <csv>`. Appends never do it.
+        from src.normalize import normalize_csv
+        print(f"✅ {csv_path}: {normalize_csv(csv_path)} row(s) normalized")
 
     # Always point DB to this user (so they can add/create)
     _ensure_dir(os.path.dirname(_user_db(username)))
@@ -133,8 +139,28 @@ def init_user_storage(username: str) -> str:
     return csv_path
 
 def _has_data(path: str) -> bool:
+    # O(1): reads the metadata sidecar instead of parsing the dataset
     try:
-        return os.path.exists(path) and os.path.getsize(path) > 0 and not pd.read_csv(path).empty
+        return dataset_meta.has_rows(path)
+    except Exception:
+        return False
+
+def _dataset_cache(username: str, csv_path: str) -> "DatasetCache":
+    from src.eda_cache import DatasetCache
+    from src.storage import open_store
+
+    store = open_store(csv_path)
+    return DatasetCache(username, csv_path, loader=store.read)
+
+def _db_in_sync(db_path: str, csv_path: str) -> bool:
+    """True when the user's DB mirrors the CSV (same dataset version, and a
+    normalized CSV with every invoice column), so EDA can aggregate in SQL."""
+    from src.db import INVOICE_COLUMNS, is_mirror
+
+    try:
+        meta = dataset_meta.read(csv_path)
+        return (os.path.exists(db_path) and set(INVOICE_COLUMNS) <= set(meta["columns"])
+                and is_mirror(meta, db_path))
     except Exception:
         return False
 
@@ -184,12 +210,77 @@ def login_page():
         st.markdown('</div>', unsafe_allow_html=True)
 
 
+def _metrics_panel():
+    """Sidebar view of the in-process pipeline metrics (see src/metrics.py)."""
+    import pandas as pd
+    from src import metrics
+
+    with st.expander("📈 Pipeline metrics"):
+        stages = metrics.stage_summary()
+        if not stages:
+            st.caption("No documents processed in this session yet.")
+            return
+        st.dataframe(pd.DataFrame([
+            {"stage": name, "count": s["count"], "mean ms": round(s["mean"] * 1000, 1),
+             "max ms": round(s["max"] * 1000, 1),
+             "recent /s": round(s["recent_per_sec"], 2) if s["recent_per_sec"] else None}
+            for name, s in sorted(stages.items())
+        ]), hide_index=True, use_container_width=True)
+        slowest = metrics.slowest_documents(5, stage="document") or metrics.slowest_documents(5)
+        if slowest:
+            st.caption("Slowest documents")
+            for seconds, stage, doc in slowest:
+                st.caption(f"{seconds * 1000:,.0f} ms · {stage} · `{doc}`")
+        st.download_button("⬇️ Prometheus metrics", metrics.to_prometheus(),
+                           file_name="invoice_metrics.prom", mime="text/plain",
+                           use_container_width=True)
+
+@st.fragment(run_every=2)
+def _upload_status(username: str, batch: str | None):
+    """Progress of the user's background upload jobs; reruns itself every
+    2s, not the whole page, so other tabs stay usable."""
+    import pandas as pd
+    from src.jobs import get_queue
+
+    queue = get_queue()
+    if batch:
+        status = queue.batch_status(batch)
+        if not status.empty:
+            finished = status["status"].isin(["done", "failed"]).sum()
+            st.progress(finished / len(status), text=f"{finished}/{len(status)} file(s) processed")
+            st.dataframe(status[["filename", "status", "progress", "message"]],
+                         hide_index=True, use_container_width=True,
+                         column_config={"progress": st.column_config.ProgressColumn(min_value=0, max_value=1)})
+    batches = queue.user_batches(username)
+    if not batches.empty:
+        with st.expander("Recent upload batches"):
+            batches["created"] = pd.to_datetime(batches["created"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+            st.dataframe(batches.drop(columns=["batch"]), hide_index=True, use_container_width=True)
+
+def _csv_download(csv_path: str):
+    # deferred: the dataset is only read (and storage imported) on click
+    def data():
+        from src.storage import open_store
+        return open_store(csv_path).to_csv_bytes()
+    return data
+
+def _file_download(path: str):
+    def data():
+        with open(path, "rb") as f:
+            return f.read()
+    return data
+
 # ----------------------------- Main App -----------------------------
 def main_app():
+    from src.db import set_db_path, current_db_path
+    from src.jobs import get_queue
+
     u = st.session_state.username
     csv_path = st.session_state.user_csv or init_user_storage(u)
     # ensure DB path is always set
     set_db_path(_user_db(u))
+    # starts the upload workers, resuming jobs a restart left unfinished
+    queue = get_queue()
 
     # Sidebar
     with st.sidebar:
@@ -198,19 +289,19 @@ def main_app():
             st.session_state.clear(); st.rerun()
 
         st.caption(f"CSV: `{csv_path}`")
+        meta = dataset_meta.read(csv_path)
+        st.caption(f"Rows: {meta['rows']:,} · Columns: {len(meta['columns'])}")
         st.caption(f"DB:  `{current_db_path()}`")
         st.markdown("---")
         if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
-            with open(csv_path, "rb") as f:
-                st.download_button("⬇️ Download CSV", f.read(),
-                                   file_name=f"{_safe_username(u)}_invoice_data.csv",
-                                   mime="text/csv", use_container_width=True)
+            st.download_button("⬇️ Download CSV", _csv_download(csv_path),
+                               file_name=f"{_safe_username(u)}_invoice_data.csv",
+                               mime="text/csv", use_container_width=True)
         dbp = _user_db(u)
         if os.path.exists(dbp) and os.path.getsize(dbp) > 0:
-            with open(dbp, "rb") as f:
-                st.download_button("⬇️ Download SQLite DB", f.read(),
-                                   file_name=f"{_safe_username(u)}_invoices.db",
-                                   mime="application/octet-stream", use_container_width=True)
+            st.download_button("⬇️ Download SQLite DB", _file_download(dbp),
+                               file_name=f"{_safe_username(u)}_invoices.db",
+                               mime="application/octet-stream", use_container_width=True)
 
         # admin tools for demo user to recover dummy quickly
         # if _safe_username(u) == "devu_05":
@@ -228,58 +319,71 @@ def main_app():
         st.markdown("---")
         if st.button("🔍 Re-run Invoice Extraction", use_container_width=True):
             try:
-                extract_from_ocr_outputs("data/ocr_outputs", csv_path)
+                from src.extract import extract_from_ocr_outputs
+                extract_from_ocr_outputs("data/ocr_outputs", csv_path, incremental=True)
                 st.success("Data extracted and saved to your CSV.")
             except Exception as e:
                 st.warning(f"Extraction skipped: {e}")
 
+        _metrics_panel()
+
     st.title("🧾 Invoice Intelligence — Phase 3")
 
-    tabs = st.tabs(["📊 EDA", "✏️ Edit", "🧲 Builder", "🧾 Create Invoice", "📤 Upload"])
+    # on_change="rerun": only the open tab's body runs (and imports its modules)
+    tabs = st.tabs(["📊 EDA", "✏️ Edit", "🧲 Builder", "🧾 Create Invoice", "📤 Upload"],
+                   key="main_tab", on_change="rerun")
 
     # ------------------ EDA ------------------
-    with tabs[0]:
-        if _has_data(csv_path):
-            df = pd.read_csv(csv_path)
-            run_eda(df)
-        else:
-            st.info("Your dataset is empty. Create or upload invoices first.")
+    if tabs[0].open:
+        with tabs[0]:
+            if _has_data(csv_path):
+                from src.eda import run_eda
+                cache = _dataset_cache(u, csv_path)  # parsed data + EDA results, reused across reruns
+                df = cache.dataframe()
+                dbp = current_db_path()
+                run_eda(df, db_path=dbp if _db_in_sync(dbp, csv_path) else None, cache=cache,
+                        csv_path=csv_path)
+            else:
+                st.info("Your dataset is empty. Create or upload invoices first.")
 
     # ------------------ Edit Table ------------------
-    with tabs[1]:
-        edit_dataframe(csv_path)
+    if tabs[1].open:
+        with tabs[1]:
+            from src.editable_table import edit_dataframe
+            edit_dataframe(csv_path)
 
     # ------------------ Visual Builder ------------------
-    with tabs[2]:
-        if _has_data(csv_path):
-            df = pd.read_csv(csv_path)
-            builder(df)
-        else:
-            st.info("Your dataset is empty.")
+    if tabs[2].open:
+        with tabs[2]:
+            if _has_data(csv_path):
+                from src.visual_builder import builder
+                df = _dataset_cache(u, csv_path).dataframe().copy()
+                builder(df)
+            else:
+                st.info("Your dataset is empty.")
 
     # ------------------ Create Invoice -> PDF + persist ------------------
-    with tabs[3]:
-        generator(csv_path)  # writes to user CSV + inserts into user DB
+    if tabs[3].open:
+        with tabs[3]:
+            from src.invoice_generator import generator
+            generator(csv_path)  # writes to user CSV + inserts into user DB
 
     # ------------------ Upload (PDF/PNG/JPG) -> parse -> persist ------------------
-    with tabs[4]:
-        st.subheader("Upload Invoices (PDF/PNG/JPG) → Auto‑Extract → Save")
-        st.caption("PDF text is parsed with PyPDF2; images use Tesseract OCR (scanned PDFs fallback to OCR).")
-        files = st.file_uploader(
-            "Upload one or more invoices",
-            type=["pdf", "png", "jpg", "jpeg"],
-            accept_multiple_files=True,
-        )
-        if files:
-            logs = []
-            for f in files:
-                try:
-                    rec, msg = process_upload(f, csv_path)  # writes to user CSV + DB
-                    logs.append(msg)
-                except Exception as e:
-                    logs.append(f"❌ {f.name}: {e}")
-            st.write("\n\n".join(logs))
-            st.button("Refresh EDA", on_click=st.rerun)
+    # OCR/PDF libraries load in the job worker (src.ingest), not here
+    if tabs[4].open:
+        with tabs[4]:
+            st.subheader("Upload Invoices (PDF/PNG/JPG) → Auto‑Extract → Save")
+            st.caption("PDF text is parsed with PyPDF2; images use Tesseract OCR (scanned PDFs fallback to OCR).")
+            files = st.file_uploader(
+                "Upload one or more invoices",
+                type=["pdf", "png", "jpg", "jpeg"],
+                accept_multiple_files=True,
+            )
+            if files and st.button(f"📥 Queue {len(files)} file(s) for processing", type="primary"):
+                batch = queue.submit(u, files, csv_path, _user_db(u))
+                st.session_state.upload_batch = batch
+                st.success(f"Queued {len(files)} file(s). You can keep using the other tabs while they process.")
+            _upload_status(u, st.session_state.get("upload_batch"))
 
 # ----------------------------- Entry -----------------------------
 def main():
@@ -0,0 +1,54 @@
+# benchmarks/bench_auth.py
+# Login latency vs. number of users for the SQLite user store: cold logins
+# (indexed lookup + PBKDF2) and warm ones (in-process login cache), plus
+# registration. Users are bulk-created with a cheap hash so large stores
+# build quickly; the timed accounts use the real iteration count.
+#
+#   python -m benchmarks.bench_auth --sizes 1000,100000
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+def timed(fn, n):
+    latencies = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return round(statistics.median(latencies) * 1000, 3)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="User store login latency.")
+    ap.add_argument("--sizes", default="1000,100000")
+    ap.add_argument("--logins", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    from src import auth
+
+    workdir = tempfile.mkdtemp(prefix="bench_auth_")
+    try:
+        print(f"{'users':>8} {'register ms':>12} {'cold login ms':>14} {'warm login ms':>14}")
+        for size in (int(s) for s in args.sizes.split(",")):
+            auth.USER_DB = os.path.join(workdir, f"auth_{size}.db")
+            auth.USER_FILE = os.path.join(workdir, "missing.json")
+            auth.forget()
+            conn = auth._connect()
+            cheap = auth.hash_password("pw", iterations=1)
+            with conn:
+                conn.executemany("INSERT INTO users (username, password_hash, created) VALUES (?, ?, 0)",
+                                 ((f"bulk_{i}", cheap) for i in range(size)))
+            register = timed(lambda i: auth.register_user(f"user_{i}", "secret"), args.logins)
+            auth.forget()
+            cold = timed(lambda i: auth.authenticate_user(f"user_{i}", "secret"), args.logins)
+            warm = timed(lambda i: auth.authenticate_user(f"user_{i}", "secret"), args.logins)
+            assert not auth.authenticate_user("user_0", "wrong")
+            print(f"{auth.user_count():>8} {register:>12} {cold:>14} {warm:>14}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# benchmarks/bench_db_seed.py
+# Seeding the invoices table from a CSV: the old row-by-row insert_row loop
+# vs. db.bulk_insert_csv.
+#
+#   python -m benchmarks.bench_db_seed [--csv data/structured_csv/invoice_data.csv] [--repeat 1]
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from src import db
+
+def seed_row_by_row(csv_path, db_path):
+    df = pd.read_csv(csv_path)
+    for _, row in df.fillna("").iterrows():
+        db.insert_row(row.to_dict(), db_path)
+
+def seed_bulk(csv_path, db_path):
+    db.bulk_insert_csv(csv_path, db_path)
+
+def timed(fn, csv_path, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "invoices.db")
+            db.init_db(db_path)
+            start = time.perf_counter()
+            fn(csv_path, db_path)
+            best = min(best, time.perf_counter() - start)
+            rows = db.row_count(db_path)
+    return best, rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default="data/structured_csv/invoice_data.csv")
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    old, old_rows = timed(seed_row_by_row, args.csv, args.repeat)
+    new, new_rows = timed(seed_bulk, args.csv, args.repeat)
+    print(f"row-by-row: {old:8.3f}s  {old_rows / old:10.0f} rows/s  ({old_rows} rows)")
+    print(f"bulk      : {new:8.3f}s  {new_rows / new:10.0f} rows/s  ({new_rows} rows, {old / new:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_imports.py
+# Cold-start import cost of the Streamlit app, per page: the login page
+# (importing app.py itself), the post-login shell and each tab, measured
+# with `python -X importtime` in a fresh interpreter per run. Prints the
+# total import time, wall time and the heaviest packages of each scenario,
+# and fails if the login page pulls in the analytics/OCR stack or a
+# scenario regresses past a saved baseline.
+#
+#   python -m benchmarks.bench_imports --repeat 5 --save bench_imports.json
+#   python -m benchmarks.bench_imports --baseline bench_imports.json --tolerance 0.2
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py imports on each page: the login page is app.py's module level;
+# the shell (sidebar) and each tab add the modules they import on first use
+SHELL = ["app", "src.db", "src.jobs", "src.metrics"]
+SCENARIOS = {
+    "login": ["app"],
+    "shell": SHELL,
+    "tab:eda": SHELL + ["src.storage", "src.eda_cache", "src.eda"],
+    "tab:edit": SHELL + ["src.editable_table"],
+    "tab:builder": SHELL + ["src.storage", "src.eda_cache", "src.visual_builder"],
+    "tab:create": SHELL + ["src.invoice_generator"],
+    "tab:upload": SHELL,  # OCR/PDF libraries load in the job worker
+    "upload worker": ["src.ingest"],
+}
+# Must not be imported by the login page
+HEAVY = ["pandas", "numpy", "pyarrow", "matplotlib", "seaborn", "PIL", "pytesseract", "PyPDF2", "cv2", "fpdf", "reportlab"]
+
+def importtime(modules):
+    """One cold import of `modules`: (total import ms, wall ms, {root package: ms})
+    or None when a module is missing from the tree."""
+    code = "import " + ", ".join(modules)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        return None
+    packages = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        packages[name.split(".")[0]] += int(self_us) / 1000
+    return sum(packages.values()), wall, dict(packages)
+
+def measure(modules, repeat):
+    runs = [importtime(modules) for _ in range(repeat)]
+    if any(r is None for r in runs):
+        return None
+    # median run by total import time
+    runs.sort(key=lambda r: r[0])
+    return runs[len(runs) // 2]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cold-start import time of the app's pages.")
+    ap.add_argument("--repeat", type=int, default=3, help="fresh interpreters per scenario (median kept)")
+    ap.add_argument("--top", type=int, default=5, help="heaviest packages listed per scenario")
+    ap.add_argument("--save", help="write the results as a JSON baseline")
+    ap.add_argument("--baseline", help="compare against a JSON baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. the baseline")
+    args = ap.parse_args(argv)
+
+    results, problems = {}, []
+    print(f"{'scenario':<14} {'import ms':>10} {'wall ms':>9}  heaviest packages")
+    for name, modules in SCENARIOS.items():
+        result = measure(modules, args.repeat)
+        if result is None:
+            print(f"{name:<14} {'-':>10} {'-':>9}  (import failed: {', '.join(modules)})")
+            continue
+        total, wall, packages = result
+        results[name] = {"import_ms": round(total, 1), "wall_ms": round(wall, 1)}
+        heaviest = sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]
+        print(f"{name:<14} {total:>10.1f} {wall:>9.1f}  " + ", ".join(f"{p} {ms:.0f}" for p, ms in heaviest))
+        if name == "login":
+            leaked = [p for p in HEAVY if p in packages]
+            if leaked:
+                problems.append(f"login page imports {', '.join(leaked)}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, base in baseline.items():
+            now = results.get(name)
+            if now and now["import_ms"] > base["import_ms"] * (1 + args.tolerance):
+                problems.append(f"{name}: {now['import_ms']:.0f} ms vs. {base['import_ms']:.0f} ms baseline")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if problems:
+        print("❌ " + "; ".join(problems))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
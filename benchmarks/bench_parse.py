@@ -0,0 +1,91 @@
+# benchmarks/bench_parse.py
+# Micro-benchmark: parse_invoice_text vs. the original per-field re.search
+# version, over the OCR text corpus. Also checks both give the same output.
+#
+#   python -m benchmarks.bench_parse [--folder data/ocr_outputs] [--rounds 5]
+
+import argparse
+import os
+import re
+import time
+from datetime import datetime
+
+from src import extract
+from src.extract import parse_invoice_text
+
+def legacy_parse_invoice_text(text):
+    def extract(pattern, default=""):
+        match = re.search(pattern, text, re.IGNORECASE)
+        return match.group(1).strip() if match else default
+
+    return {
+        "Invoice_No": extract(r"Invoice\s*No[:\-]?\s*([\w\/-]+)", "INV"),
+        "Date": extract(r"Date[:\-]?\s*([\d\-\/]+)", datetime.today().strftime("%Y-%m-%d")),
+        "Time": extract(r"Time[:\-]?\s*([\d:APMapm\s]+)", datetime.now().strftime("%H:%M:%S")),
+        "Buyer_Name": extract(r"Buyer\s*Name[:\-]?\s*(.+)"),
+        "Buyer_Address": extract(r"Buyer\s*Address[:\-]?\s*(.+)"),
+        "PAN": extract(r"PAN\s*No[:\-]?\s*(\w{10})"),
+        "GSTIN": extract(r"GSTIN[:\-]?\s*([\dA-Z]{15})"),
+        "Item": extract(r"Item[:\-]?\s*(.+)"),
+        "Qty": extract(r"Quantity[:\-]?\s*(\d+)"),
+        "Rate": extract(r"Rate[:\-]?\s*Rs\.?(\d+)"),
+        "Amount": extract(r"Amount[:\-]?\s*Rs\.?([\d,.]+)"),
+        "CGST": extract(r"CGST.*Rs\.?([\d,.]+)"),
+        "SGST": extract(r"SGST.*Rs\.?([\d,.]+)"),
+        "Total": extract(r"Total\s*Amount\s*Payable[:\-]?\s*Rs\.?([\d,.]+)"),
+        "Terms": extract(r"Terms[:\-]?\s*(.+)"),
+    }
+
+class _FrozenClock(datetime):
+    # Missing Date/Time default to "now"; freeze it so outputs are comparable
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2000, 1, 1, 12, 0, 0)
+
+    @classmethod
+    def today(cls):
+        return cls.now()
+
+def count_mismatches(texts):
+    global datetime
+    real = datetime
+    datetime = extract.datetime = _FrozenClock
+    try:
+        return sum(legacy_parse_invoice_text(t) != parse_invoice_text(t) for t in texts)
+    finally:
+        datetime = extract.datetime = real
+
+def load_corpus(folder):
+    texts = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".txt"):
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                texts.append(f.read())
+    return texts
+
+def docs_per_sec(fn, texts, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--folder", default="data/ocr_outputs")
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    texts = load_corpus(args.folder)
+    mismatches = count_mismatches(texts)
+    print(f"📄 {len(texts)} documents, {mismatches} output mismatch(es)")
+
+    old = docs_per_sec(legacy_parse_invoice_text, texts, args.rounds)
+    new = docs_per_sec(parse_invoice_text, texts, args.rounds)
+    print(f"legacy : {old:10.0f} docs/s")
+    print(f"current: {new:10.0f} docs/s  ({new / old:.1f}x)")
+
+if __name__ == "__main__":
+    main()
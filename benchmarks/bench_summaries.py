@@ -0,0 +1,82 @@
+# benchmarks/bench_summaries.py
+# Dashboard aggregates vs. dataset size: the materialized summary reads
+# (src.summaries) against the same aggregates computed from the rows with
+# pandas, plus the cost the summary adds to an append and a full rebuild.
+# Datasets are the shipped sample CSV tiled to each size, with buyers and
+# dates spread out so the summary tables grow too.
+#
+#   python -m benchmarks.bench_summaries --sizes 10000,100000,1000000
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+SAMPLE_CSV = "data/structured_csv/invoice_data.csv"
+
+def timed(fn, n=5):
+    latencies = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return round(statistics.median(latencies) * 1000, 2)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Materialized summary reads vs. full scans.")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--append", type=int, default=50, help="rows per timed append")
+    args = ap.parse_args(argv)
+
+    import pandas as pd
+    from src import dedup, eda, metrics, normalize, summaries
+    from src.extract import upsert_records
+
+    sample = normalize.normalize_records(pd.read_csv(SAMPLE_CSV, dtype=str, keep_default_na=False))
+    workdir = tempfile.mkdtemp(prefix="bench_summaries_")
+    try:
+        print(f"{'rows':>9} {'rebuild ms':>11} {'summary ms':>11} {'pandas ms':>10} {'append ms':>10} {'of which summary':>17}")
+        for size in (int(s) for s in args.sizes.split(",")):
+            reps = -(-size // len(sample))
+            df = pd.concat([sample] * reps, ignore_index=True).iloc[:size]
+            copy = (df.index // len(sample)).astype(str)
+            df["Invoice_No"] = df["Invoice_No"].astype(str) + "-" + copy
+            df["Buyer_Name"] = df["Buyer_Name"].astype(str) + " " + (df.index % 5000).astype(str)
+            df["Date"] = (pd.to_datetime(df["Date"]) + pd.to_timedelta(df.index // len(sample), unit="D")).dt.strftime("%Y-%m-%d")
+            path = os.path.join(workdir, f"invoices_{size}.csv")
+            df.to_csv(path, index=False)
+
+            t0 = time.perf_counter()
+            summaries.rebuild(path)
+            rebuild = round((time.perf_counter() - t0) * 1000, 1)
+
+            def from_summary():
+                summaries.top_buyers(path, 10)
+                summaries.daily_totals(path)
+                summaries.hourly_counts(path)
+                summaries.column_stats(path)
+                summaries.top_values(path, "Item", 3)
+
+            def from_rows():
+                eda._top_buyers(df, None, None)
+                eda._daily_total(df, None, None)
+                eda._hourly(df, None, None)
+                df[summaries.STATS_COLUMNS].astype("float64").agg(["count", "mean", "std", "min", "max"])
+                df["Item"].value_counts().head(3)
+
+            dedup.open_index(path).close()  # index bootstrap isn't part of an append
+            extra = sample.iloc[:args.append].assign(Invoice_No=lambda d: d["Invoice_No"].astype(str) + "-new")
+            metrics.reset()
+            t0 = time.perf_counter()
+            upsert_records(path, extra)
+            append = round((time.perf_counter() - t0) * 1000, 1)
+            update = metrics.stage_summary().get("summary_update", {"count": 0, "mean": 0})
+            share = round(update["count"] * update["mean"] * 1000, 1)
+            print(f"{size:>9} {rebuild:>11} {timed(from_summary):>11} {timed(from_rows):>10} {append:>10} {share:>17}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
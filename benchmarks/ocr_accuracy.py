@@ -0,0 +1,141 @@
+# benchmarks/ocr_accuracy.py
+# Accuracy/latency report for the OCR preprocessing presets and layout
+# templates. Each variant OCRs the same invoices; the parsed fields are
+# compared with the ground-truth CSV written by the generator. Presets run
+# full-page OCR only; "+templates" rows use template field crops first.
+#
+#   python -m benchmarks.ocr_accuracy --count 100 --presets none,default,fast,regions+templates
+#   python -m benchmarks.ocr_accuracy --images data/synthetic_invoices --truth truth.csv
+#
+# Without --images a fresh seeded corpus is generated in a temp dir. --stub
+# only checks the plumbing: stub OCR returns fixed text, so accuracy is
+# meaningless, but the preprocessing time and pixel counts are real.
+
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+FIELDS = ["Invoice_No", "Date", "Time", "Buyer_Name", "Buyer_Address", "PAN", "GSTIN",
+          "Item", "Qty", "Rate", "Amount", "CGST", "SGST", "Total"]
+
+def same_value(expected, actual):
+    expected, actual = str(expected).strip(), str(actual).strip()
+    if expected == actual:
+        return True
+    try:
+        return abs(float(expected.replace(",", "")) - float(actual.replace(",", ""))) < 0.005
+    except ValueError:
+        return False
+
+def load_truth(path):
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return {os.path.splitext(row["Source_File"])[0]: row for row in df.to_dict("records")}
+
+def run_preset(name, images, truth):
+    from PIL import Image
+    from src import metrics, ocr, preprocess, templates
+    from src.extract import parse_invoice_text
+
+    name, _, variant = name.partition("+")
+    settings = preprocess.preset(name)
+    ocr.OCR_SETTINGS["preprocess"] = settings
+    ocr.OCR_SETTINGS["templates"] = templates.fingerprint() if variant == "templates" else None
+    metrics.reset()
+    latencies, pixel_ratios = [], []
+    correct = {field: 0 for field in FIELDS}
+    docs_exact = 0
+    for path in images:
+        with open(path, "rb") as f:
+            img = Image.open(io.BytesIO(f.read())).convert(ocr.OCR_SETTINGS["mode"])
+        out = preprocess.apply(img, settings)
+        pixel_ratios.append(out.width * out.height / (img.width * img.height))
+
+        t0 = time.perf_counter()
+        text = ocr.extract_text_from_image(path, use_cache=False)
+        latencies.append(time.perf_counter() - t0)
+
+        expected = truth[os.path.splitext(os.path.basename(path))[0]]
+        parsed = parse_invoice_text(text)
+        hits = [same_value(expected[field], parsed[field]) for field in FIELDS]
+        for field, hit in zip(FIELDS, hits):
+            correct[field] += hit
+        docs_exact += all(hits)
+
+    stages = metrics.stage_summary()
+    counts = metrics.counters()
+    n = len(images)
+    return {
+        "settings": settings,
+        "images": n,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p95_ms": round(sorted(latencies)[int(0.95 * (n - 1))] * 1000, 2),
+        "tesseract_ms": round(stages.get("ocr", {}).get("mean", 0) * 1000, 2),
+        "preprocess_ms": round(stages.get("preprocess", {}).get("mean", 0) * 1000, 2),
+        "template_ms": round(stages.get("ocr_fields", {}).get("mean", 0) * 1000, 2),
+        "template_hit_rate": round(counts.get("template_hits", 0) / n, 4),
+        "pixels_vs_original": round(statistics.mean(pixel_ratios), 3),
+        "field_accuracy": round(sum(correct.values()) / (n * len(FIELDS)), 4),
+        "exact_documents": round(docs_exact / n, 4),
+        "per_field": {field: round(hits / n, 4) for field, hits in correct.items()},
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="OCR preprocessing accuracy/latency report.")
+    ap.add_argument("--presets", default="none,default,fast,regions,default+templates",
+                    help="comma-separated presets; append +templates to try layout templates first")
+    ap.add_argument("--images", default=None, help="folder of invoice images (default: generate a corpus)")
+    ap.add_argument("--truth", default=None, help="ground-truth CSV with a Source_File column")
+    ap.add_argument("--count", type=int, default=50, help="invoices to generate/evaluate")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--stub", action="store_true", help="stub out Tesseract (OCR_ENGINE=stub)")
+    ap.add_argument("--out", default="ocr_accuracy.json")
+    args = ap.parse_args(argv)
+
+    if args.stub:
+        os.environ["OCR_ENGINE"] = "stub"  # must be set before src.ocr is imported
+    from src.generate_invoices_indian import generate_invoices
+
+    workdir = None
+    if args.images:
+        if not args.truth:
+            ap.error("--images needs --truth")
+        image_dir, truth_path = args.images, args.truth
+    else:
+        workdir = tempfile.mkdtemp(prefix="ocr_accuracy_")
+        image_dir, truth_path = os.path.join(workdir, "images"), os.path.join(workdir, "truth.csv")
+        generate_invoices(args.count, args.seed, image_dir, truth_path, workers=1)
+
+    try:
+        truth = load_truth(truth_path)
+        images = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                        if os.path.splitext(name)[0] in truth)[:args.count]
+        if not images:
+            print("⚠️ No images with ground truth found.")
+            return 1
+        report = {name: run_preset(name, images, truth) for name in args.presets.split(",")}
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    base = report.get("none")
+    print(f"{'preset':<18} {'mean ms':>9} {'tess ms':>9} {'prep ms':>9} {'tmpl ms':>9} {'tmpl hit':>8} "
+          f"{'pixels':>7} {'fields':>7} {'docs':>6}")
+    for name, res in report.items():
+        speedup = f"  ({base['mean_ms'] / res['mean_ms']:.1f}x)" if base and res["mean_ms"] else ""
+        print(f"{name:<18} {res['mean_ms']:>9} {res['tesseract_ms']:>9} {res['preprocess_ms']:>9} "
+              f"{res['template_ms']:>9} {res['template_hit_rate']:>8.0%} {res['pixels_vs_original']:>7} "
+              f"{res['field_accuracy']:>7.1%} {res['exact_documents']:>6.1%}{speedup}")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Report written to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
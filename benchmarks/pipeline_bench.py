@@ -0,0 +1,223 @@
+# benchmarks/pipeline_bench.py
+# End-to-end pipeline benchmark on synthetic corpora. Each stage is timed
+# on its own: invoice rendering, OCR, parsing, CSV and SQLite writes, and
+# the EDA aggregations (pandas and SQL). Results are written as JSON and can
+# be compared against a previous run.
+#
+#   python -m benchmarks.pipeline_bench --sizes 1000,10000 --stub --out bench.json
+#   python -m benchmarks.pipeline_bench --sizes 1000 --stub --baseline bench.json
+#
+# --stub runs OCR with OCR_ENGINE=stub (no Tesseract needed; for CI). Image
+# rendering and OCR only run on the first --images invoices of each corpus,
+# since they dominate wall time; every other stage uses the full size.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def stage_result(items, seconds, latencies):
+    return {
+        "items": items,
+        "seconds": round(seconds, 4),
+        "throughput_per_s": round(items / seconds, 2) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def time_each(items, fn):
+    """Call fn(item) for each item; returns (results, total seconds, latencies)."""
+    results, latencies = [], []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        results.append(fn(item))
+        latencies.append(time.perf_counter() - t0)
+    return results, time.perf_counter() - start, latencies
+
+def timed_chunks(chunks, latencies):
+    """Pass chunks through to a writer, recording how long it spends on each."""
+    for chunk in chunks:
+        t0 = time.perf_counter()
+        yield chunk
+        latencies.append(time.perf_counter() - t0)
+
+def run_size(size, workdir, args):
+    import pandas as pd
+    from src import db, eda
+    from src.extract import WRITERS, iter_chunks, parse_invoice_text
+    from src.generate_invoices_indian import (
+        _get_fake, create_invoice_image, generate_invoice_data, invoice_text, load_font,
+    )
+    from src.ocr import extract_text_from_image
+
+    results = {}
+    img_dir = os.path.join(workdir, "images")
+    os.makedirs(img_dir, exist_ok=True)
+    n_images = min(size, args.images)
+
+    # -- generation: invoice data for the whole corpus, images for a sample
+    fake, font = _get_fake(), load_font()
+
+    def make_record(i):
+        fake.seed_instance(f"{args.seed}:{i}")
+        return generate_invoice_data(random.Random(f"{args.seed}:{i}"), fake)
+
+    records, secs, lat = time_each(range(size), make_record)
+    results["generate_data"] = stage_result(size, secs, lat)
+
+    def render(i):
+        path = f"invoice_india_{i}.jpg"
+        create_invoice_image(records[i], path, img_dir, font)
+        return os.path.join(img_dir, path)
+
+    image_paths, secs, lat = time_each(range(n_images), render)
+    results["create_invoice_image"] = stage_result(n_images, secs, lat)
+
+    # -- OCR (cache disabled so every image is really processed)
+    _, secs, lat = time_each(image_paths, lambda p: extract_text_from_image(p, use_cache=False))
+    results["extract_text_from_image"] = stage_result(n_images, secs, lat)
+
+    # -- parsing, on the text each invoice would OCR to
+    texts = [invoice_text(r) for r in records]
+    parsed, secs, lat = time_each(texts, parse_invoice_text)
+    results["parse_invoice_text"] = stage_result(size, secs, lat)
+    for i, record in enumerate(parsed):
+        record["Source_File"] = f"invoice_india_{i}.txt"
+    del texts
+
+    # -- CSV write (latency per chunk)
+    csv_path = os.path.join(workdir, "invoice_data.csv")
+    lat = []
+    start = time.perf_counter()
+    WRITERS["csv"](timed_chunks(iter_chunks(parsed, args.chunk_size), lat), csv_path)
+    results["csv_write"] = stage_result(size, time.perf_counter() - start, lat)
+
+    # -- SQLite bulk load (latency per batch)
+    db_path = os.path.join(workdir, "invoices.db")
+    lat = []
+    start = time.perf_counter()
+    frames = (pd.DataFrame(chunk) for chunk in iter_chunks(parsed, args.chunk_size))
+    db.bulk_insert(timed_chunks(frames, lat), db_path, batch_size=args.chunk_size)
+    results["sqlite_write"] = stage_result(size, time.perf_counter() - start, lat)
+    del parsed
+
+    # -- EDA aggregations, pandas over the CSV vs. SQL over the indexed DB
+    df, secs, lat = time_each([csv_path], pd.read_csv)
+    results["csv_read"] = stage_result(size, secs, lat)
+    df = df[0]
+    aggregations = {
+        "eda_describe": lambda: df.describe(include="all"),
+        "eda_top_buyers_pandas": lambda: eda._top_buyers(df, None, None),
+        "eda_daily_total_pandas": lambda: eda._daily_total(df, None, None),
+        "eda_hourly_pandas": lambda: eda._hourly(df, None, None),
+        "eda_top_buyers_sql": lambda: db.top_buyers_by_qty(10, None, db_path),
+        "eda_daily_total_sql": lambda: db.daily_totals(None, db_path),
+        "eda_hourly_sql": lambda: db.hourly_counts(None, db_path),
+        "eda_histogram_bins": lambda: eda.histogram_bins(df["Amount"]),
+        "eda_kde_curve": lambda: eda.kde_curve(df["Amount"]),
+        "eda_box_stats": lambda: eda.box_stats(df["Rate"]),
+        "eda_raw_page_sql": lambda: db.fetch_page(size // 2, eda.PAGE_SIZE, db_path=db_path),
+    }
+    for name, fn in aggregations.items():
+        _, secs, lat = time_each(range(args.repeat), lambda _: fn())
+        results[name] = stage_result(args.repeat, secs, lat)
+    return results
+
+def compare(current, baseline, tolerance):
+    """Print throughput ratios vs. a baseline; returns the regressed stages."""
+    regressions = []
+    for size, stages in current["sizes"].items():
+        base_stages = baseline.get("sizes", {}).get(size, {})
+        for stage, res in stages.items():
+            base = base_stages.get(stage)
+            if not base or not base.get("throughput_per_s") or not res.get("throughput_per_s"):
+                continue
+            ratio = res["throughput_per_s"] / base["throughput_per_s"]
+            flag = ""
+            if ratio < 1 - tolerance:
+                flag = "  ⚠️ regression"
+                regressions.append(f"{size}/{stage}")
+            print(f"{size:>8} {stage:<28} {ratio:6.2f}x{flag}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pipeline benchmark on synthetic invoice corpora.")
+    ap.add_argument("--sizes", default="1000", help="comma-separated corpus sizes, e.g. 1000,10000,100000")
+    ap.add_argument("--images", type=int, default=200, help="max invoices rendered + OCR'd per corpus")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--chunk-size", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=5, help="runs per EDA aggregation")
+    ap.add_argument("--stub", action="store_true", help="stub out Tesseract (OCR_ENGINE=stub)")
+    ap.add_argument("--workdir", default=None, help="keep corpora here instead of a temp dir")
+    ap.add_argument("--out", default="bench_output.json")
+    ap.add_argument("--baseline", default=None, help="previous JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs. baseline")
+    args = ap.parse_args(argv)
+
+    if args.stub:
+        os.environ["OCR_ENGINE"] = "stub"  # must be set before src.ocr is imported
+    from src.ocr import OCR_SETTINGS
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ocr_engine": OCR_SETTINGS["engine"],
+        "args": vars(args),
+        "sizes": {},
+    }
+    root = args.workdir or tempfile.mkdtemp(prefix="invoice_bench_")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            print(f"▶ corpus of {size} invoices")
+            workdir = os.path.join(root, str(size))
+            os.makedirs(workdir, exist_ok=True)
+            report["sizes"][str(size)] = stages = run_size(size, workdir, args)
+            for stage, res in stages.items():
+                print(f"  {stage:<28} {res['throughput_per_s'] or 0:>12.1f}/s  "
+                      f"p50 {res['p50_ms']} ms  p99 {res['p99_ms']} ms  rss {res['peak_rss_mb']} MB")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
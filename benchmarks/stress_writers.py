@@ -0,0 +1,106 @@
+# benchmarks/stress_writers.py
+# Concurrent-writer stress test for the per-user storage layer. Several
+# processes append invoices to the same CSV (the upload/extract path) and
+# register users in the same user store at once, and some writers crash
+# mid-append. Afterwards every row and user must be present exactly once
+# and the files must parse.
+#
+#   python -m benchmarks.stress_writers --writers 8 --records 500 --crashes 3
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+def _record(writer, i):
+    return {"Invoice_No": f"W{writer}-{i}", "Date": "2025-01-01", "Time": "10:00:00",
+            "Buyer_Name": f"Buyer, {writer}", "Buyer_Address": "1, \"Main\" Road\nCity",
+            "Item": "Mouse", "Qty": 1, "Rate": 100, "Amount": 100, "CGST": 9.0, "SGST": 9.0,
+            "Total": 118.0, "Source_File": f"w{writer}.txt"}
+
+def _writer(args):
+    writer, csv_path, user_db, records, batch = args
+    from src import auth
+    from src.extract import upsert_records
+
+    auth.USER_DB = user_db
+    auth.USER_FILE = os.path.join(os.path.dirname(user_db), "no_legacy_users.json")
+    for start in range(0, records, batch):
+        upsert_records(csv_path, [_record(writer, i) for i in range(start, min(start + batch, records))])
+        auth.register_user(f"user_{writer}_{start}", "pw")
+    return writer
+
+def _crasher(args):
+    # dies halfway through an append, leaving a partial row and its journal
+    csv_path, = args
+    from src import fileio
+
+    with fileio.journaled_append(csv_path) as f:
+        f.write('CRASH-1,2025-01-01,10:00:00,"half a ro')
+        f.flush()
+        os._exit(1)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Concurrent writers against one user's files.")
+    ap.add_argument("--writers", type=int, default=8)
+    ap.add_argument("--records", type=int, default=500, help="rows appended per writer")
+    ap.add_argument("--batch", type=int, default=10, help="rows per append")
+    ap.add_argument("--crashes", type=int, default=3, help="writers killed mid-append")
+    args = ap.parse_args(argv)
+
+    import pandas as pd
+    from src import dataset_meta
+    from src.extract import upsert_records
+
+    workdir = tempfile.mkdtemp(prefix="stress_writers_")
+    csv_path = os.path.join(workdir, "invoice_data.csv")
+    user_db = os.path.join(workdir, "auth.db")
+    try:
+        upsert_records(csv_path, [_record("seed", 0)])
+        ctx = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        with ctx.Pool(args.writers + args.crashes) as pool:
+            crashes = [pool.apply_async(_crasher, ((csv_path,),)) for _ in range(args.crashes)]
+            done = pool.map(_writer, [(w, csv_path, user_db, args.records, args.batch)
+                                      for w in range(args.writers)])
+            for c in crashes:
+                c.wait(0)  # crashed workers never return; the pool replaces them
+        elapsed = time.perf_counter() - start
+
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+        expected = {f"W{w}-{i}" for w in range(args.writers) for i in range(args.records)} | {"Wseed-0"}
+        seen = df["Invoice_No"].tolist()
+        with closing(sqlite3.connect(user_db)) as conn:
+            users = [name for name, in conn.execute("SELECT username FROM users")]
+        expected_users = {f"user_{w}_{s}" for w in range(args.writers) for s in range(0, args.records, args.batch)}
+        problems = []
+        if len(seen) != len(set(seen)):
+            problems.append(f"{len(seen) - len(set(seen))} duplicate rows")
+        if set(seen) != expected:
+            problems.append(f"{len(expected - set(seen))} missing / {len(set(seen) - expected)} unexpected rows")
+        if (df["Buyer_Address"] != "1, \"Main\" Road\nCity").any():
+            problems.append("corrupted field values")
+        if dataset_meta.row_count(csv_path) != len(df):
+            problems.append("metadata sidecar row count is off")
+        if set(users) != expected_users:
+            problems.append(f"{len(expected_users - set(users))} users lost / "
+                            f"{len(set(users) - expected_users)} unexpected")
+
+        total = len(done) * args.records
+        print(f"{len(done)} writers + {args.crashes} crashing writers: {total} rows, "
+              f"{len(expected_users)} sign-ups in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+        if problems:
+            print("❌ " + "; ".join(problems))
+            return 1
+        print(f"✅ {len(df)} rows and {len(users)} users intact")
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
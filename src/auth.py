@@ -1,33 +1,175 @@
 # src/auth.py
+# User accounts in SQLite: one row per user behind a unique username index,
+# passwords stored as salted PBKDF2 hashes. Logins are an indexed lookup
+# plus one hash check; a small in-process cache of recent successful
+# logins skips the (deliberately slow) hash on repeat logins; a password
+# changed from another process is picked up once the entry expires.
+#
+# The old plaintext src/user.json is imported once, the first time the
+# store is opened empty (or explicitly: python -m src.auth migrate).
 
+import base64
+import hashlib
+import hmac
 import json
 import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
 
-USER_FILE = os.path.join(os.path.dirname(__file__), "user.json")
+USER_DB = os.environ.get("AUTH_DB", "data/auth.db")
+USER_FILE = os.path.join(os.path.dirname(__file__), "user.json")  # legacy store
+# PBKDF2 iterations for new hashes; older hashes are upgraded on login
+HASH_ITERATIONS = int(os.environ.get("AUTH_HASH_ITERATIONS", "240000"))
+# Recent logins remembered per process, and for how long
+CACHE_SIZE = 10_000
+CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "900"))
 
-# Load users
-def load_users():
-    if not os.path.exists(USER_FILE):
-        with open(USER_FILE, "w") as f:
-            json.dump({}, f)
-    with open(USER_FILE, "r") as f:
-        return json.load(f)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id            INTEGER PRIMARY KEY,
+    username      TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    created       REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
+"""
 
-# Save users
-def save_users(users):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f)
+_local = threading.local()
+_ready = set()
+_cache = OrderedDict()   # username -> (fast digest, expires)
+_cache_lock = threading.Lock()
+# keys the cache's fast digests; never leaves this process
+_CACHE_SECRET = secrets.token_bytes(32)
 
+# ---------- password hashing ----------
+def hash_password(password, iterations=None):
+    iterations = iterations or HASH_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "pbkdf2_sha256${}${}${}".format(
+        iterations, base64.b64encode(salt).decode("ascii"), base64.b64encode(digest).decode("ascii"))
+
+def verify_password(password, encoded):
+    try:
+        algorithm, iterations, salt, digest = encoded.split("$")
+    except ValueError:
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    check = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(check, base64.b64decode(digest))
+
+def _needs_rehash(encoded):
+    return encoded.split("$")[1] != str(HASH_ITERATIONS)
+
+# ---------- storage ----------
+def _connect():
+    # one connection per thread (Streamlit runs sessions on threads)
+    key = (os.getpid(), USER_DB)
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "key", None) != key:
+        os.makedirs(os.path.dirname(USER_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(USER_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.key = conn, key
+        if USER_DB not in _ready:
+            _ready.add(USER_DB)
+            if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None and os.path.exists(USER_FILE):
+                migrate_json(USER_FILE)
+    return conn
+
+def _load_json_users(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def migrate_json(path=USER_FILE):
+    """Import users from the legacy plaintext JSON file (skipping names that
+    already exist). Returns the number of users added."""
+    users = _load_json_users(path)
+    conn = _connect()
+    now = time.time()
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password_hash, created) VALUES (?, ?, ?)",
+            [(name, hash_password(str(pw)), now) for name, pw in users.items()])
+        return conn.total_changes - before
+
+# ---------- login cache ----------
+def _fast_digest(password):
+    return hmac.new(_CACHE_SECRET, password.encode("utf-8"), hashlib.sha256).digest()
+
+def _cache_check(username, password):
+    with _cache_lock:
+        entry = _cache.get(username)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del _cache[username]
+            return None
+        _cache.move_to_end(username)
+    return hmac.compare_digest(entry[0], _fast_digest(password))
+
+def _cache_store(username, password):
+    with _cache_lock:
+        _cache[username] = (_fast_digest(password), time.monotonic() + CACHE_TTL)
+        _cache.move_to_end(username)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def forget(username=None):
+    """Drop cached logins (for one user, or all)."""
+    with _cache_lock:
+        if username is None:
+            _cache.clear()
+        else:
+            _cache.pop(username, None)
+
+# ---------- public API ----------
 # Register new user
 def register_user(username, password):
-    users = load_users()
-    if username in users:
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("INSERT INTO users (username, password_hash, created) VALUES (?, ?, ?)",
+                         (username, hash_password(password), time.time()))
+    except sqlite3.IntegrityError:  # unique index: name taken, even by a concurrent sign-up
         return False
-    users[username] = password
-    save_users(users)
     return True
 
 # Authenticate login
 def authenticate_user(username, password):
-    users = load_users()
-    return users.get(username) == password
+    if _cache_check(username, password):
+        return True
+    row = _connect().execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+    if row is None or not verify_password(password, row[0]):
+        return False
+    if _needs_rehash(row[0]):
+        with _connect() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = ?",
+                         (hash_password(password), username))
+    _cache_store(username, password)
+    return True
+
+def set_password(username, password):
+    with _connect() as conn:
+        changed = conn.execute("UPDATE users SET password_hash = ? WHERE username = ?",
+                               (hash_password(password), username)).rowcount
+    forget(username)
+    return changed > 0
+
+def user_count():
+    return _connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["migrate"]:
+        src = sys.argv[2] if len(sys.argv) > 2 else USER_FILE
+        print(f"✅ Imported {migrate_json(src)} user(s) from {src} into {USER_DB}")
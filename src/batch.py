@@ -0,0 +1,263 @@
+# src/batch.py
+# Headless batch ingestion: image/PDF/text files -> OCR -> parse -> store,
+# straight into a user's dataset (CSV + SQLite, same files the app uses),
+# for backfills of large scanned archives without the UI.
+#
+# The files stream through three stages, each with its own workers:
+#
+#   read   process pool: OCR images, PDF text layers (scanned pages OCR'd),
+#          plain .txt as is
+#   parse  process pool: parse_invoice_text + normalize, in batches
+#   store  one writer: dedup + append to the CSV and DB every --chunk rows
+#
+# Every stage keeps a bounded number of jobs in flight, so memory stays
+# flat however large the archive is. Files are split across machines by a
+# hash of their path relative to the input folder (--shard i/n). After
+# each stored chunk its files are checkpointed in a manifest, so a rerun
+# resumes where the last one stopped and skips unchanged files; files
+# whose content changed are re-ingested, replacing their old rows. Rows of
+# files stored but not yet checkpointed when a run dies are dropped as
+# duplicates on the rerun (src.dedup).
+#
+#   python -m src.batch data/raw_invoices --user alice --shard 0/4
+#   python -m src.batch archive/ --csv data/structured_csv/invoice_data.csv --read-workers 16
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from src import metrics, normalize
+from src.extract import CHUNK_SIZE, parse_invoice_text, upsert_records
+from src.manifest import Manifest, file_stamp
+
+USERS_DIR = "data/users"
+PDF_EXTENSIONS = (".pdf",)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+TEXT_EXTENSIONS = (".txt",)
+# Files per parse job
+PARSE_BATCH = 200
+# Jobs in flight per worker before a stage stops taking input
+PENDING_PER_WORKER = 4
+# A chunk is stored after this many seconds even if it isn't full
+FLUSH_SECONDS = 60.0
+
+# ---------- input ----------
+def parse_shard(spec):
+    """Parse "i/n" into (i, n), with 0 <= i < n."""
+    m = re.fullmatch(r"(\d+)/(\d+)", spec or "")
+    if not m or int(m.group(2)) < 1 or int(m.group(1)) >= int(m.group(2)):
+        raise argparse.ArgumentTypeError(f"shard must be i/n with 0 <= i < n, got {spec!r}")
+    return int(m.group(1)), int(m.group(2))
+
+def shard_of(relpath, n):
+    """Shard of a file, from its path relative to the input folder ("/"
+    separated, so every machine agrees whatever the mount point)."""
+    digest = hashlib.sha1(relpath.replace(os.sep, "/").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n
+
+def iter_input_files(folder):
+    """(path, relpath) of every image, PDF and .txt file under `folder`,
+    streamed with os.scandir."""
+    stack = [folder]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS + PDF_EXTENSIONS + TEXT_EXTENSIONS):
+                    yield entry.path, os.path.relpath(entry.path, folder).replace(os.sep, "/")
+
+def user_paths(username, users_dir=USERS_DIR):
+    """(csv, db) of a user's dataset, laid out like app.py's."""
+    folder = os.path.join(users_dir, re.sub(r"[^a-z0-9_-]+", "", (username or "").strip().lower()))
+    return os.path.join(folder, "invoice_data.csv"), os.path.join(folder, "invoices.db")
+
+# ---------- stages ----------
+def _read_task(item):
+    # read stage, in a pool worker: [(source, text)] of the invoices in one
+    # file; the item comes back with the file's manifest stamp, so the
+    # single writer never reads the file again to checkpoint it
+    path, relpath, changed = item
+    from src.ocr import MIN_TEXT_LENGTH, extract_text_from_image
+
+    lower = path.lower()
+    try:
+        item = (path, relpath, changed, file_stamp(path))
+        if lower.endswith(TEXT_EXTENSIONS):
+            with open(path, "r", encoding="utf-8") as f:
+                texts = [(relpath, f.read())]
+        elif lower.endswith(PDF_EXTENSIONS):
+            from src.pdf_ingest import invoice_texts, page_texts
+            with open(path, "rb") as f:
+                # this worker is already one of many: no nested OCR pool
+                return item, invoice_texts(page_texts(f, relpath, workers=1), relpath), None
+        else:
+            texts = [(relpath, extract_text_from_image(path))]
+    except Exception as e:
+        return item, [], f"{type(e).__name__}: {e}"
+    return item, [(source, t) for source, t in texts if len(t.strip()) >= MIN_TEXT_LENGTH], None
+
+def _parse_task(files):
+    # parse stage, in a pool worker: [(item, texts)] -> (items, normalized rows)
+    records = []
+    for _, texts in files:
+        for source, text in texts:
+            record = parse_invoice_text(text)
+            record["Source_File"] = source
+            records.append(record)
+    rows = normalize.normalize_records(records) if records else None
+    return [item for item, _ in files], rows
+
+def _staged(pool, fn, items, max_pending):
+    """fn(item) for each of `items`, run on `pool`, in completion order,
+    with at most `max_pending` jobs in flight."""
+    pending = set()
+    for item in items:
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from (fut.result() for fut in done)
+        pending.add(pool.submit(fn, item))
+        done = {fut for fut in pending if fut.done()}
+        pending -= done
+        yield from (fut.result() for fut in done)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from (fut.result() for fut in done)
+
+def _batches(results, stats, size=PARSE_BATCH):
+    # read results -> parse jobs of up to `size` files with text
+    batch = []
+    for item, texts, error in results:
+        if error:
+            stats["failed"] += 1
+            print(f"❌ {item[1]}: {error}")
+        elif not texts:
+            stats["no_text"] += 1  # not checkpointed: retried next run, like ocr.py
+        else:
+            batch.append((item, texts))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+# ---------- pipeline ----------
+def run_batch(input_folder, csv_path, db_path=None, shard=(0, 1), checkpoint=None,
+              read_workers=None, parse_workers=None, chunk_size=CHUNK_SIZE,
+              flush_seconds=FLUSH_SECONDS, resume=True):
+    """Ingest every file of shard `shard` under `input_folder` into the
+    dataset `csv_path` and, if given, its SQLite mirror `db_path`.
+    Returns a stats dict."""
+    from src.ingest import save_records
+
+    index, n_shards = shard
+    read_workers = max(1, read_workers or os.cpu_count() or 1)
+    parse_workers = max(1, parse_workers or (os.cpu_count() or 1) // 4)
+    checkpoint = checkpoint or f"{csv_path}.batch-{index}of{n_shards}.db"
+    manifest = Manifest(checkpoint)
+    stats = {"files": 0, "other_shards": 0, "unchanged": 0, "queued": 0, "no_text": 0, "failed": 0,
+             "invoices": 0, "saved": 0}
+
+    def todo():
+        for path, relpath in iter_input_files(input_folder):
+            stats["files"] += 1
+            if shard_of(relpath, n_shards) != index:
+                stats["other_shards"] += 1
+                continue
+            status = manifest.status(path) if resume else "new"
+            if status == "unchanged":
+                stats["unchanged"] += 1
+                continue
+            stats["queued"] += 1
+            yield path, relpath, status == "changed"
+
+    buffer, done_items = [], []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        if buffer:
+            replace = sorted({relpath for _, relpath, changed, _ in done_items if changed})
+            rows = pd.concat(buffer, ignore_index=True)
+            with metrics.timer("batch_store"):
+                if db_path:
+                    saved = save_records(rows, csv_path, db_path, replace)
+                else:
+                    saved = upsert_records(csv_path, rows, replace)
+            stats["saved"] += len(saved)
+        for path, _, _, stamp in done_items:
+            manifest.record(path, stamp)
+        manifest.save()  # checkpoint: these files are stored
+        buffer.clear()
+        done_items.clear()
+        last_flush = time.monotonic()
+
+    ctx = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(read_workers, mp_context=ctx) as read_pool, \
+                ProcessPoolExecutor(parse_workers, mp_context=ctx) as parse_pool:
+            texts = _staged(read_pool, _read_task, todo(), read_workers * PENDING_PER_WORKER)
+            parsed = _staged(parse_pool, _parse_task, _batches(texts, stats), parse_workers * PENDING_PER_WORKER)
+            for items, rows in parsed:
+                done_items.extend(items)
+                if rows is not None:
+                    buffer.append(rows)
+                    stats["invoices"] += len(rows)
+                if sum(map(len, buffer)) >= chunk_size or time.monotonic() - last_flush >= flush_seconds:
+                    flush()
+                    print(f"💾 {stats['saved']} invoice(s) stored, {stats['queued']} file(s) queued")
+            flush()
+    finally:
+        manifest.close(save=False)
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["files_per_sec"] = stats["queued"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Ingest a folder of invoices (images, PDFs, OCR text) "
+                                             "into a user's dataset, without the UI.")
+    ap.add_argument("input", help="folder to ingest (searched recursively)")
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", help="store into this user's dataset (data/users/<user>/)")
+    target.add_argument("--csv", help="store into this dataset CSV instead")
+    ap.add_argument("--db", help="SQLite mirror of --csv (default: none for --csv)")
+    ap.add_argument("--users-dir", default=USERS_DIR)
+    ap.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="I/N",
+                    help="only files whose path hashes to shard I of N")
+    ap.add_argument("--checkpoint", help="resume manifest (default: next to the dataset, one per shard)")
+    ap.add_argument("--no-resume", action="store_true", help="ignore the checkpoint and ingest every file")
+    ap.add_argument("--read-workers", type=int, help="OCR/PDF processes (default: all cores)")
+    ap.add_argument("--parse-workers", type=int, help="parse/normalize processes (default: cores / 4)")
+    ap.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="invoices per store + checkpoint")
+    ap.add_argument("--prometheus", help="write pipeline metrics here when done")
+    args = ap.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        print(f"❌ Input folder '{args.input}' does not exist.")
+        return 1
+    csv_path, db_path = user_paths(args.user, args.users_dir) if args.user else (args.csv, args.db)
+
+    stats = run_batch(args.input, csv_path, db_path, shard=args.shard, checkpoint=args.checkpoint,
+                      read_workers=args.read_workers, parse_workers=args.parse_workers,
+                      chunk_size=args.chunk, resume=not args.no_resume)
+    i, n = args.shard
+    print(f"✅ Shard {i}/{n}: {stats['queued']} of {stats['files']} file(s) processed in {stats['seconds']:.1f}s "
+          f"({stats['files_per_sec']:.2f} files/s); {stats['invoices']} invoice(s) parsed, "
+          f"{stats['saved']} saved to {csv_path}")
+    print(f"⏭️ {stats['unchanged']} unchanged, {stats['other_shards']} in other shards, "
+          f"{stats['no_text']} without readable text, {stats['failed']} failed")
+    if args.prometheus:
+        metrics.export_prometheus(args.prometheus)
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
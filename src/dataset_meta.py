@@ -0,0 +1,107 @@
+# src/dataset_meta.py
+# Small JSON sidecar next to each dataset CSV (<csv>.meta.json) holding row
+# count, columns, size/mtime and a CRC32 checksum, so "does this user have
+# data?" and sidebar stats never require parsing the CSV.
+#
+# Writers call refresh() (or note_append() after appending rows). If some
+# path writes the CSV without doing so, read() notices the size/mtime
+# mismatch and rebuilds the sidecar once, under the CSV's file lock. The
+# sidecar itself is replaced atomically (fileio.atomic_write).
+
+import csv
+import json
+import os
+import zlib
+
+from src import fileio
+
+CHUNK = 1024 * 1024
+
+def meta_path(csv_path):
+    return csv_path + ".meta.json"
+
+def _stat(csv_path):
+    st = os.stat(csv_path)
+    return st.st_size, st.st_mtime_ns
+
+def _crc32(csv_path, start=0, crc=0, stop=None):
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        left = float("inf") if stop is None else stop - start
+        while left > 0:
+            chunk = f.read(int(min(CHUNK, left)))
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            left -= len(chunk)
+    return crc
+
+def prefix_crc32(csv_path, size):
+    """CRC32 of the first `size` bytes of `csv_path`: equal to an earlier
+    metadata's crc32 (at that size) when the file was only appended to since."""
+    return _crc32(csv_path, stop=size)
+
+def _save(csv_path, meta):
+    fileio.write_json(meta_path(csv_path), meta)
+    return meta
+
+def _empty_meta():
+    return {"rows": 0, "columns": [], "size": 0, "mtime_ns": 0, "crc32": 0}
+
+def refresh(csv_path):
+    """Rescan `csv_path` and rewrite its sidecar. Returns the metadata."""
+    if not os.path.exists(csv_path):
+        return _empty_meta()
+    size, mtime_ns = _stat(csv_path)
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        rows = sum(1 for _ in reader)
+    return _save(csv_path, {
+        "rows": rows, "columns": columns, "size": size,
+        "mtime_ns": mtime_ns, "crc32": _crc32(csv_path),
+    })
+
+def note_append(csv_path, before, rows_added):
+    """Update the sidecar after appending `rows_added` rows.
+
+    `before` is the metadata read just before the append; only the newly
+    written bytes are checksummed. Falls back to a full refresh if the file
+    was changed by someone else in between.
+    """
+    if not before.get("columns") or not os.path.exists(csv_path):
+        return refresh(csv_path)
+    size, mtime_ns = _stat(csv_path)
+    if size < before["size"]:
+        return refresh(csv_path)
+    meta = dict(before, rows=before["rows"] + rows_added, size=size, mtime_ns=mtime_ns,
+                crc32=_crc32(csv_path, before["size"], before["crc32"]))
+    return _save(csv_path, meta)
+
+def _fresh(csv_path):
+    # the stored sidecar if it still matches the CSV, else None
+    try:
+        with open(meta_path(csv_path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta["size"], meta["mtime_ns"]) == _stat(csv_path):
+            return meta
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def read(csv_path):
+    """Metadata for `csv_path`: one stat() plus a small JSON read when fresh."""
+    if not os.path.exists(csv_path):
+        return _empty_meta()
+    meta = _fresh(csv_path)
+    if meta is not None:
+        return meta
+    # stale: rebuild under the CSV's lock, unless another session just did
+    with fileio.file_lock(csv_path):
+        return _fresh(csv_path) or refresh(csv_path)
+
+def row_count(csv_path):
+    return read(csv_path)["rows"]
+
+def has_rows(csv_path):
+    return row_count(csv_path) > 0
@@ -0,0 +1,300 @@
+# src/db.py
+# Per-user SQLite storage for invoices.
+
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from src import metrics, normalize
+
+DEFAULT_DB = "data/invoices.db"
+INVOICE_COLUMNS = [
+    "Invoice_No","Date","Time","Buyer_Name","Buyer_Address","PAN","GSTIN",
+    "Item","Qty","Rate","Amount","CGST","SGST","Total","Terms","Source_File",
+    normalize.FLAG_COLUMN,
+]
+# Rows sent to executemany per batch when bulk loading
+BULK_BATCH_SIZE = 5000
+# Pragmas for bulk loads: WAL + NORMAL sync is crash-safe for the database
+# and avoids an fsync per statement; 64 MB page cache, temp tables in RAM.
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Typed columns; everything else is TEXT. Dates are stored as ISO
+# YYYY-MM-DD text (SQLite's native date format).
+COLUMN_TYPES = {
+    "Date": "DATE",
+    "Qty": "INTEGER",
+    "Rate": "REAL",
+    "Amount": "REAL",
+    "CGST": "REAL",
+    "SGST": "REAL",
+    "Total": "REAL",
+}
+NUMERIC_COLUMNS = [c for c, t in COLUMN_TYPES.items() if t in ("INTEGER", "REAL")]
+INDEXED_COLUMNS = ["Invoice_No", "Buyer_Name", "Date", "Source_File"]
+
+_db_path = DEFAULT_DB
+
+# Each invoice of a multi-invoice PDF is stored under "<file>#p<first>-<last>"
+# (src.pdf_ingest); the rows of a source file are its own and those.
+PAGE_RANGE_MARK = "#p"
+
+_COLUMN_LIST = ", ".join(f'"{c}"' for c in INVOICE_COLUMNS)
+_INSERT_SQL = "INSERT INTO invoices ({}) VALUES ({})".format(
+    _COLUMN_LIST, ", ".join("?" for _ in INVOICE_COLUMNS)
+)
+
+# ---------- schema migrations (PRAGMA user_version) ----------
+def _table_columns(conn, table):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+def _migrate_1_create(conn):
+    # Original untyped layout; also what df.to_sql used to create.
+    conn.execute("CREATE TABLE IF NOT EXISTS invoices ({})".format(_COLUMN_LIST))
+
+def _migrate_2_typed(conn):
+    """Rebuild invoices with typed columns, converting existing rows."""
+    existing = set(_table_columns(conn, "invoices"))
+    cols = ",\n".join(f'"{c}" {COLUMN_TYPES.get(c, "TEXT")}' for c in INVOICE_COLUMNS)
+    conn.execute(f"CREATE TABLE invoices_typed (id INTEGER PRIMARY KEY,\n{cols})")
+
+    def convert(c):
+        if c not in existing:
+            return "NULL"
+        if c in NUMERIC_COLUMNS:
+            return f"""CAST(NULLIF(REPLACE(TRIM("{c}"), ',', ''), '') AS {COLUMN_TYPES[c]})"""
+        if c == "Date":
+            return f'date("{c}")'
+        return f'"{c}"'
+
+    conn.execute("INSERT INTO invoices_typed ({}) SELECT {} FROM invoices".format(
+        _COLUMN_LIST, ", ".join(convert(c) for c in INVOICE_COLUMNS)))
+    conn.execute("DROP TABLE invoices")
+    conn.execute("ALTER TABLE invoices_typed RENAME TO invoices")
+
+def _migrate_3_indexes(conn):
+    for c in INDEXED_COLUMNS:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_invoices_{c.lower()} ON invoices("{c}")')
+
+def _migrate_4_validation_flags(conn):
+    # tables created by _migrate_2_typed from this version on already have it
+    if normalize.FLAG_COLUMN not in _table_columns(conn, "invoices"):
+        conn.execute(f'ALTER TABLE invoices ADD COLUMN "{normalize.FLAG_COLUMN}" TEXT')
+
+def _migrate_5_mirror(conn):
+    # version (dataset_meta rows/size/crc32) of the CSV the table is a copy of
+    conn.execute("CREATE TABLE IF NOT EXISTS mirror "
+                 "(id INTEGER PRIMARY KEY CHECK (id = 1), rows INTEGER, size INTEGER, crc32 INTEGER)")
+
+MIGRATIONS = [
+    (1, _migrate_1_create),
+    (2, _migrate_2_typed),
+    (3, _migrate_3_indexes),
+    (4, _migrate_4_validation_flags),
+    (5, _migrate_5_mirror),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(conn) -> int:
+    """Apply pending migrations, each in its own transaction. Returns the version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in MIGRATIONS:
+        if target <= version:
+            continue
+        with conn:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+        version = target
+    return version
+
+def set_db_path(path: str) -> None:
+    global _db_path
+    _db_path = path
+    init_db()
+
+def current_db_path() -> str:
+    return _db_path
+
+def connect(db_path: str = None) -> sqlite3.Connection:
+    path = db_path or _db_path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return sqlite3.connect(path, timeout=30)
+
+def init_db(db_path: str = None) -> None:
+    with closing(connect(db_path)) as conn:
+        migrate(conn)
+
+def coerce_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Align `df` to the invoices schema: normalized values (see
+    src.normalize; frames already normalized aren't parsed again) and
+    None for anything missing/unparseable."""
+    df = normalize.normalize_records(df).reindex(columns=INVOICE_COLUMNS)
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+def insert_row(row: dict, db_path: str = None) -> None:
+    """Insert a single invoice (one connection + commit). Use bulk_insert for many."""
+    values = next(coerce_frame(pd.DataFrame([row])).itertuples(index=False, name=None))
+    with closing(connect(db_path)) as conn:
+        migrate(conn)
+        with conn:
+            conn.execute(_INSERT_SQL, values)
+
+def _iter_batches(data, batch_size):
+    """Turn a DataFrame, an iterable of DataFrames (e.g. a chunked
+    pd.read_csv reader) or an iterable of dicts into lists of row tuples."""
+    if isinstance(data, pd.DataFrame):
+        data = [data]
+    pending = []
+    for item in data:
+        if isinstance(item, pd.DataFrame):
+            if pending:
+                yield from _frame_batches(pd.DataFrame(pending), batch_size)
+                pending = []
+            yield from _frame_batches(item, batch_size)
+        else:
+            pending.append(item)
+            if len(pending) >= batch_size:
+                yield from _frame_batches(pd.DataFrame(pending), batch_size)
+                pending = []
+    if pending:
+        yield from _frame_batches(pd.DataFrame(pending), batch_size)
+
+def _frame_batches(df, batch_size):
+    for start in range(0, len(df), batch_size):
+        yield list(coerce_frame(df.iloc[start:start + batch_size]).itertuples(index=False, name=None))
+
+def bulk_insert(data, db_path: str = None, batch_size: int = BULK_BATCH_SIZE, replace: bool = False,
+                replace_sources=(), mirror: dict = None) -> int:
+    """Insert many invoices with executemany inside a single transaction.
+
+    `data` may be a DataFrame, an iterable of DataFrames such as
+    ``pd.read_csv(path, chunksize=...)``, or an iterable of row dicts.
+    With `replace`, existing rows are deleted in the same transaction;
+    with `replace_sources`, only the rows from those Source_Files (and
+    their page ranges, see PAGE_RANGE_MARK).
+    `mirror` is the dataset_meta of the CSV the table holds exactly the
+    rows of once this insert is done (see is_mirror); without it the
+    table no longer mirrors any CSV version.
+    Either everything is inserted or, on error, nothing is.
+    Returns the number of rows inserted.
+    """
+    count = 0
+    with closing(connect(db_path)) as conn:
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        migrate(conn)
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM invoices")
+            elif replace_sources:
+                where, params = source_rows_sql()
+                conn.executemany(f"DELETE FROM invoices WHERE {where}", [params(s) for s in replace_sources])
+            for batch in _iter_batches(data, batch_size):
+                with metrics.timer("db_write"):
+                    conn.executemany(_INSERT_SQL, batch)
+                count += len(batch)
+            conn.execute("DELETE FROM mirror")
+            if mirror is not None:
+                conn.execute("INSERT INTO mirror (id, rows, size, crc32) VALUES (1, ?, ?, ?)",
+                             (mirror["rows"], mirror["size"], mirror["crc32"]))
+        metrics.incr("db_rows_written", count)
+    return count
+
+def bulk_insert_csv(csv_path: str, db_path: str = None, chunksize: int = BULK_BATCH_SIZE,
+                    mirror: dict = None) -> int:
+    """Stream a CSV into the invoices table without loading it all at once."""
+    return bulk_insert(pd.read_csv(csv_path, chunksize=chunksize), db_path, chunksize, mirror=mirror)
+
+def row_count(db_path: str = None) -> int:
+    with closing(connect(db_path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+def is_mirror(meta: dict, db_path: str = None) -> bool:
+    """True when the invoices table holds exactly the rows of the CSV whose
+    dataset_meta is `meta` (recorded by bulk_insert's `mirror`)."""
+    with closing(connect(db_path)) as conn:
+        migrate(conn)
+        version = conn.execute("SELECT rows, size, crc32 FROM mirror WHERE id = 1").fetchone()
+        if version is None:  # never recorded: only an empty table mirrors an empty CSV
+            return meta["rows"] == 0 and conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0
+    return version == (meta["rows"], meta["size"], meta["crc32"])
+
+# ---------- aggregations (run in SQLite, use the indexes) ----------
+def _query(sql, params=(), db_path=None) -> pd.DataFrame:
+    with closing(connect(db_path)) as conn:
+        migrate(conn)
+        return pd.read_sql_query(sql, conn, params=params)
+
+# Rows the EDA charts count (see normalize.complete_rows): a value in every
+# column but the optional ones, with the cells pd.read_csv reads as missing
+_NA_LIST = ", ".join(f"'{v}'" for v in normalize.NA_VALUES)
+_COMPLETE = " AND ".join(
+    f'"{c}" IS NOT NULL' + ("" if c in NUMERIC_COLUMNS else f' AND "{c}" NOT IN ({_NA_LIST})')
+    for c in INVOICE_COLUMNS if c not in normalize.OPTIONAL_COLUMNS)
+
+def source_rows_sql(column="Source_File"):
+    """SQL condition (and a params function) matching the rows of a source
+    file: the file itself or any of its page ranges. The range comparison
+    keeps it on `column`'s index."""
+    sql = f'("{column}" = ? OR ("{column}" >= ? AND "{column}" < ?))'
+    def params(source):
+        prefix = source + PAGE_RANGE_MARK
+        return source, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return sql, params
+
+def from_sources(values, sources):
+    """Boolean mask of the Source_File `values` that belong to one of the
+    files `sources` (themselves or a page range of them)."""
+    sources = list(sources)
+    values = pd.Series(values)
+    mask = values.isin(set(sources))
+    if sources:
+        mask |= values.str.startswith(tuple(source + PAGE_RANGE_MARK for source in sources)).fillna(False).astype(bool)
+    return mask.to_numpy(dtype=bool)
+
+def _source_filter(source_file):
+    if source_file is None:
+        return "", ()
+    return ' AND "Source_File" = ?', (source_file,)
+
+def fetch_page(offset: int, limit: int, source_file: str = None, db_path: str = None) -> pd.DataFrame:
+    """`limit` invoices starting at row `offset`, in insertion order."""
+    where, params = _source_filter(source_file)
+    return _query(f"SELECT {_COLUMN_LIST} FROM invoices WHERE 1{where} ORDER BY id LIMIT ? OFFSET ?",
+                  params + (limit, offset), db_path)
+
+def source_files(db_path: str = None) -> list:
+    return _query('SELECT DISTINCT "Source_File" FROM invoices WHERE "Source_File" IS NOT NULL '
+                  'ORDER BY "Source_File"', db_path=db_path)["Source_File"].tolist()
+
+def top_buyers_by_qty(limit: int = 10, source_file: str = None, db_path: str = None) -> pd.Series:
+    where, params = _source_filter(source_file)
+    df = _query(f"""SELECT "Buyer_Name", SUM("Qty") AS "Qty" FROM invoices
+                    WHERE {_COMPLETE}{where}
+                    GROUP BY "Buyer_Name" ORDER BY "Qty" DESC, "Buyer_Name" LIMIT ?""",
+                params + (limit,), db_path)
+    return df.set_index("Buyer_Name")["Qty"]
+
+def daily_totals(source_file: str = None, db_path: str = None) -> pd.Series:
+    where, params = _source_filter(source_file)
+    df = _query(f"""SELECT "Date", TOTAL("Total") AS "Total" FROM invoices
+                    WHERE {_COMPLETE}{where}
+                    GROUP BY "Date" ORDER BY "Date" """, params, db_path)
+    return df.set_index(pd.to_datetime(df["Date"]).dt.date)["Total"]
+
+def hourly_counts(source_file: str = None, db_path: str = None) -> pd.Series:
+    where, params = _source_filter(source_file)
+    df = _query(f"""SELECT CAST(substr("Time", 1, 2) AS INTEGER) AS "Hour", COUNT(*) AS "Count"
+                    FROM invoices
+                    WHERE {_COMPLETE} AND "Time" GLOB '[0-2][0-9]:[0-5][0-9]:[0-5][0-9]'
+                      AND CAST(substr("Time", 1, 2) AS INTEGER) < 24{where}
+                    GROUP BY "Hour" ORDER BY "Hour" """, params, db_path)
+    return df.set_index("Hour")["Count"]
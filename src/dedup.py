@@ -0,0 +1,331 @@
+# src/dedup.py
+# Duplicate detection for invoices, shared by every ingest path (extraction,
+# incremental re-extraction, uploads). Each dataset has a persistent index
+# next to it (<csv>.dedup.db) with one entry per stored invoice:
+#
+#   key       normalized Invoice_No (OCR look-alikes folded: O->0, I/L->1,
+#             S->5, B->8) + Date + Total; same invoice => exact duplicate
+#   content   hash of every field except Source_File; catches re-uploads
+#             of invoices whose number wasn't read
+#   block_a   Date + whole-rupee Total   } blocking keys for near-duplicates:
+#   block_b   Invoice_No + whole-rupee   } only entries sharing a block are
+#             Total                      } compared (fuzzily), never all pairs,
+#                                        } and at most MAX_CANDIDATES of them
+#
+# Lookups go through SQLite indexes in batches, so checking a chunk of new
+# rows costs the same at 1M stored rows as at 1k. Exact duplicates are
+# dropped; near-duplicates are kept and flagged "possible_duplicate" (or
+# dropped with DEDUP_NEAR=drop).
+#
+# The index records the version of the dataset it describes (dataset_meta
+# rows/size/crc32 for a CSV, size/mtime for Parquet/SQLite outputs). When
+# the dataset was deleted, recreated or written without the index, it no
+# longer matches and open_index() rebuilds it from the stored rows.
+#
+#   python -m src.dedup data/users/alice/invoice_data.csv   # drop existing duplicates
+
+import difflib
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src import metrics, normalize
+from src.db import INVOICE_COLUMNS, source_rows_sql
+
+# "flag" near-duplicates in Validation_Flags, or "drop" them
+NEAR_DUPLICATES = os.environ.get("DEDUP_NEAR", "flag").lower()
+# Similarity (0-1) of Invoice_No + Buyer_Name above which a row sharing a
+# block with a stored invoice is a near-duplicate
+FUZZY_THRESHOLD = float(os.environ.get("DEDUP_FUZZY_THRESHOLD", "0.85"))
+# Stored invoices compared per block; keeps a check O(1) for crowded blocks
+MAX_CANDIDATES = 50
+NEAR_FLAG = "possible_duplicate"
+# Values extract falls back to when no invoice number was read
+MISSING_INVOICE_NOS = ("", "INV")
+
+CONTENT_COLUMNS = [c for c in INVOICE_COLUMNS if c not in ("Source_File", normalize.FLAG_COLUMN)]
+_LOOKALIKES = str.maketrans("OILSB", "01158")
+# SQLite's default limit on host parameters is 999
+_IN_BATCH = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id         INTEGER PRIMARY KEY,
+    key        INTEGER,
+    content    INTEGER NOT NULL,
+    block_a    INTEGER,
+    block_b    INTEGER,
+    invoice_no TEXT,
+    buyer      TEXT,
+    source     TEXT
+);
+-- dataset version the entries describe
+CREATE TABLE IF NOT EXISTS state (id INTEGER PRIMARY KEY CHECK (id = 1), version TEXT);
+"""
+_INDEXED = ["key", "content", "block_a", "block_b", "source"]
+_CREATE_INDEXES = "".join(f"CREATE INDEX IF NOT EXISTS idx_entries_{c} ON entries({c});\n" for c in _INDEXED)
+_DROP_INDEXES = "".join(f"DROP INDEX IF EXISTS idx_entries_{c};\n" for c in _INDEXED)
+
+def index_path(csv_path):
+    return csv_path + ".dedup.db"
+
+def dataset_version(path, fmt="csv"):
+    """Version of the dataset at `path` as the index records it."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return "empty"
+    if fmt == "csv":
+        from src import dataset_meta
+        meta = dataset_meta.read(path)
+        return f"csv:{meta['rows']}:{meta['size']}:{meta['crc32']}"
+    st = os.stat(path)
+    return f"{fmt}:{st.st_size}:{st.st_mtime_ns}"
+
+def _stored_chunks(path, fmt, chunksize):
+    # the rows already in the dataset, a chunk at a time
+    if fmt == "csv":
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif fmt == "sqlite":
+        with sqlite3.connect(path) as conn:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoices'").fetchone():
+                yield from pd.read_sql_query("SELECT * FROM invoices", conn, chunksize=chunksize)
+
+def _text(df, col):
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype="string")
+    return df[col].astype("string").fillna("").str.strip()
+
+def _paise(df, col):
+    # amounts as whole paise (-1 when missing), so they hash as plain integers
+    if col not in df.columns:
+        return np.full(len(df), -1, dtype=np.int64)
+    amount = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    return np.where(np.isnan(amount), -1, np.round(amount * 100)).astype(np.int64)
+
+def _hash(*columns):
+    # one 64-bit hash per row over `columns` (fits SQLite's INTEGER);
+    # deterministic across runs and processes
+    frame = pd.DataFrame({i: c for i, c in enumerate(columns)})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+def invoice_skeleton(values):
+    """Invoice numbers compared the way OCR reads them: upper-cased, only
+    letters and digits, look-alike letters folded to digits."""
+    cleaned = values.astype("string").fillna("").str.upper().str.replace(r"[^0-9A-Z]", "", regex=True)
+    return cleaned.str.translate(_LOOKALIKES)
+
+def fingerprints(df):
+    """Index fields for each row of normalized records `df`: a DataFrame
+    with key (NA when there's no invoice number), content, block_a,
+    block_b, invoice_no, buyer and source."""
+    invoice = _text(df, "Invoice_No")
+    skeleton = invoice_skeleton(invoice)
+    date = _text(df, "Date").str.slice(0, 10)
+    total = _paise(df, "Total")
+    rupees = np.where(total < 0, -1, total // 100)
+
+    content = [_paise(df, c) if c in normalize.AMOUNT_COLUMNS + ["Qty"] else _text(df, c) for c in CONTENT_COLUMNS]
+    # the fallback number would put every unread invoice of a total in one block
+    no_number = invoice.str.upper().isin(MISSING_INVOICE_NOS).to_numpy()
+    def masked(hashes, missing):
+        return pd.Series(hashes, index=df.index, dtype="Int64").mask(missing)
+    return pd.DataFrame({
+        "key": masked(_hash(skeleton, date, total), no_number),
+        "content": _hash(*content),
+        "block_a": masked(_hash(date, rupees), (date.eq("") | (rupees < 0)).to_numpy()),
+        "block_b": masked(_hash(skeleton, rupees), no_number | (skeleton.eq("") | (rupees < 0)).to_numpy()),
+        "invoice_no": skeleton,
+        "buyer": _text(df, "Buyer_Name").str.lower(),
+        "source": _text(df, "Source_File"),
+    }, index=df.index)
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+class DedupIndex:
+    """Persistent duplicate index for one dataset.
+
+    `filter(df)` returns the rows of normalized records `df` that aren't
+    already stored (near-duplicates flagged) and stages them; `save()`
+    commits what was staged once those rows are written, `close(save=False)`
+    forgets it. `close()` also records the version of `dataset` (its path
+    and format) it now describes. Use under the dataset's file lock.
+    """
+
+    def __init__(self, db_path, dataset=None):
+        self.db_path = db_path
+        self.dataset = dataset
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-65536")  # 64 MB: index pages stay hot
+        self.conn.executescript(_SCHEMA + _CREATE_INDEXES)
+
+    def version(self):
+        row = self.conn.execute("SELECT version FROM state WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def _set_version(self, version):
+        self.conn.execute("INSERT OR REPLACE INTO state (id, version) VALUES (1, ?)", (version,))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _existing(self, column, values, fields="1"):
+        # rows of `fields` for entries whose `column` is in `values`, batched
+        values = list({int(v) for v in values if not pd.isna(v)})
+        rows = []
+        for start in range(0, len(values), _IN_BATCH):
+            batch = values[start:start + _IN_BATCH]
+            rows += self.conn.execute(
+                f"SELECT {column}, {fields} FROM entries WHERE {column} IN ({','.join('?' * len(batch))})",
+                batch).fetchall()
+        return rows
+
+    def _candidates(self, column, blocks):
+        # block -> names of at most MAX_CANDIDATES stored entries per block;
+        # one LIMITed index lookup each, so a crowded block costs no more
+        query = f"SELECT invoice_no, buyer FROM entries WHERE {column} = ? ORDER BY id LIMIT ?"
+        return {(column, block): [f"{invoice_no} {buyer}" for invoice_no, buyer
+                                  in self.conn.execute(query, (block, MAX_CANDIDATES))]
+                for block in {int(b) for b in blocks if not pd.isna(b)}}
+
+    def _near(self, fp, fresh):
+        # block -> [(invoice_no, buyer)] of stored and already-accepted rows
+        blocks = {}
+        for column in ("block_a", "block_b"):
+            blocks.update(self._candidates(column, fp.loc[fresh, column]))
+        near = np.zeros(len(fp), dtype=bool)
+        names = (fp["invoice_no"] + " " + fp["buyer"]).tolist()
+        block_ids = {column: fp[column].astype(object).where(fp[column].notna(), None).tolist()
+                     for column in ("block_a", "block_b")}
+        for i in np.flatnonzero(fresh):
+            name = names[i]
+            for column in ("block_a", "block_b"):
+                block = block_ids[column][i]
+                if block is None:
+                    continue
+                candidates = blocks.setdefault((column, block), [])
+                if not near[i] and any(similarity(name, c) >= FUZZY_THRESHOLD for c in candidates):
+                    near[i] = True
+                if len(candidates) < MAX_CANDIDATES:
+                    candidates.append(name)
+        return near
+
+    def filter(self, df):
+        """Rows of `df` to store: exact duplicates of stored rows, or of
+        earlier rows in `df`, are removed; near-duplicates are flagged or
+        removed (NEAR_DUPLICATES). The rows kept are staged in the index."""
+        if df.empty:
+            return df
+        with metrics.timer("dedup"):
+            df = normalize.normalize_records(df)
+            fp = fingerprints(df)
+            known_keys = {k for k, _ in self._existing("key", fp["key"])}
+            known_content = {c for c, _ in self._existing("content", fp["content"])}
+            exact = (fp["key"].isin(known_keys).to_numpy()
+                     | fp["content"].isin(known_content).to_numpy()
+                     | (fp["key"].notna() & fp["key"].duplicated()).to_numpy()
+                     | fp["content"].duplicated().to_numpy())
+            near = self._near(fp, ~exact)
+            keep = ~exact & ~near if NEAR_DUPLICATES == "drop" else ~exact
+            metrics.incr("duplicates_dropped", int((~keep).sum()))
+            metrics.incr("near_duplicates", int(near.sum()))
+
+            out = df[keep].copy()
+            flagged = near[keep]
+            if flagged.any():
+                flags = out[normalize.FLAG_COLUMN].astype("string").fillna("")
+                out[normalize.FLAG_COLUMN] = flags.where(~flagged, (flags + ";" + NEAR_FLAG).str.lstrip(";"))
+            self._stage(fp[keep])
+            return out
+
+    def _stage(self, fp):
+        rows = fp.astype(object).where(fp.notna(), None)
+        self.conn.executemany(
+            "INSERT INTO entries (key, content, block_a, block_b, invoice_no, buyer, source)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows[["key", "content", "block_a", "block_b", "invoice_no", "buyer", "source"]].itertuples(index=False, name=None))
+
+    def add(self, df):
+        """Stage every row of `df` as stored, duplicates included."""
+        if not df.empty:
+            self._stage(fingerprints(normalize.normalize_records(df)))
+
+    def forget_sources(self, sources):
+        """Drop the entries of rows from `sources` (they're being replaced),
+        page ranges of those files included."""
+        where, params = source_rows_sql("source")
+        self.conn.executemany(f"DELETE FROM entries WHERE {where}", [params(s) for s in sources])
+
+    def clear(self):
+        self.conn.execute("DELETE FROM entries")
+
+    def save(self):
+        self.conn.commit()
+
+    def close(self, save=True):
+        if save:
+            if self.dataset is not None:
+                self._set_version(dataset_version(*self.dataset))
+            self.save()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+def open_index(dataset_path, fmt="csv", chunksize=100_000, bootstrap=True):
+    """The dedup index of the dataset at `dataset_path` ("csv", "parquet" or
+    "sqlite"). If it doesn't describe the dataset as it is now (new index,
+    dataset deleted, recreated or written elsewhere), it is rebuilt from
+    the rows stored there, or just emptied without `bootstrap` (the caller
+    is replacing the dataset). Call with the dataset's lock held."""
+    index = DedupIndex(index_path(dataset_path), (dataset_path, fmt))
+    version = dataset_version(dataset_path, fmt)
+    if index.version() == version:
+        return index
+    try:
+        index.clear()
+        if bootstrap and version != "empty":
+            # bulk load: indexes are built once at the end, not row by row
+            index.conn.executescript(_DROP_INDEXES)
+            for chunk in _stored_chunks(dataset_path, fmt, chunksize):
+                index.add(chunk)
+            index.conn.executescript(_CREATE_INDEXES)
+        index._set_version(version)
+        index.save()
+    except BaseException:
+        index.close(save=False)
+        raise
+    return index
+
+def dedupe_csv(csv_path):
+    """Drop duplicate rows already stored in `csv_path` (keeping the first
+    of each) and rebuild its index. Returns the number of rows dropped."""
+    from src import dataset_meta, fileio
+
+    with fileio.file_lock(csv_path):
+        fileio.recover(csv_path)
+        df = normalize.normalize_records(pd.read_csv(csv_path, dtype=str, keep_default_na=False))
+        index = DedupIndex(index_path(csv_path), (csv_path, "csv"))
+        try:
+            index.clear()
+            kept = index.filter(df)
+            with fileio.atomic_write(csv_path, newline="") as f:
+                kept.to_csv(f, index=False)
+            dataset_meta.refresh(csv_path)
+        except BaseException:
+            index.close(save=False)
+            raise
+        index.close()
+    return len(df) - len(kept)
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(f"✅ {path}: {dedupe_csv(path)} duplicate row(s) removed")
@@ -1,63 +1,289 @@
+import io
+import os
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import sqlite3
 
-def run_eda(df):
+from src import db, normalize, summaries
+from src.eda_cache import cached
+
+# Above this many rows the dashboard switches to large-data mode: the raw
+# table is paged and the distribution charts are drawn from pre-binned
+# aggregates instead of every row
+LARGE_DATA_ROWS = int(os.environ.get("EDA_LARGE_ROWS", "50000"))
+# KDE curve in large-data mode: "approx" (smoothed from binned counts) or "skip"
+LARGE_DATA_KDE = os.environ.get("EDA_LARGE_KDE", "approx")
+# Rows per page of the raw table in large-data mode
+PAGE_SIZE = int(os.environ.get("EDA_PAGE_SIZE", "1000"))
+HIST_BINS = 30
+# Outliers drawn on a pre-aggregated boxplot (the most extreme on each side)
+MAX_FLIERS = 200
+
+def _png(fig):
+    # Figures are cached as PNG bytes; closing them also frees matplotlib state
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+def _value_counts_top3(df, summary_csv=None):
+    def top3(col):
+        if summary_csv and col in summaries.VALUE_TABLES:
+            return summaries.top_values(summary_csv, col, 3)
+        # ties in value order, as the summary returns them
+        return df[col].value_counts().sort_index().sort_values(ascending=False, kind="stable").head(3)
+    return {col: top3(col) for col in df.columns if df[col].dtype == "object"}
+
+# The group-by charts read, in order of preference: the dataset's
+# materialized summary (src.summaries; unfiltered views only), the
+# user's SQLite DB, or the rows in `df`.
+def _top_buyers(df, db_path, source_filter, summary_csv=None):
+    if summary_csv:
+        return summaries.top_buyers(summary_csv, 10)
+    if db_path:
+        return db.top_buyers_by_qty(10, source_filter, db_path)
+    return df.groupby('Buyer_Name')['Qty'].sum().sort_values(ascending=False, kind="stable").head(10)
+
+def _daily_total(df, db_path, source_filter, summary_csv=None):
+    if summary_csv:
+        return summaries.daily_totals(summary_csv)
+    if db_path:
+        return db.daily_totals(source_filter, db_path)
+    dates = df['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):  # normalized CSVs load typed already
+        dates = pd.to_datetime(dates, errors='coerce')
+    if dates.isnull().all():
+        return pd.Series(dtype=float)
+    return df['Total'].groupby(dates.dt.date).sum()
+
+def _hourly(df, db_path, source_filter, summary_csv=None):
+    if summary_csv:
+        return summaries.hourly_counts(summary_csv)
+    if db_path:
+        return db.hourly_counts(source_filter, db_path)
+    hours = pd.to_datetime(df['Time'], format="%H:%M:%S", errors='coerce').dt.hour
+    return hours.dropna().astype(int).value_counts().sort_index()
+
+# ---------- pre-binned aggregates (large-data mode) ----------
+def _finite(values):
+    x = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    return x[np.isfinite(x)]
+
+def histogram_bins(values, bins=HIST_BINS):
+    """Equal-width histogram of `values`: one row per bin (left, right, count)."""
+    x = _finite(values)
+    if not len(x):
+        return pd.DataFrame({"left": [], "right": [], "count": []})
+    counts, edges = np.histogram(x, bins=bins)
+    return pd.DataFrame({"left": edges[:-1], "right": edges[1:], "count": counts})
+
+def kde_curve(values, bins=HIST_BINS, grid=512):
+    """Gaussian KDE of `values` (Scott's bandwidth), scaled to the counts of
+    a `bins`-bin histogram like seaborn's kde=True.
+
+    Approximated by binning the values on a fine grid and smoothing the
+    counts with the kernel, so it costs one pass over the data. Returns
+    None when there's nothing to estimate.
+    """
+    x = _finite(values)
+    if len(x) < 2 or x.min() == x.max():
+        return None
+    h = x.std(ddof=1) * len(x) ** -0.2
+    counts, edges = np.histogram(x, bins=grid, range=(x.min() - 3 * h, x.max() + 3 * h))
+    step = edges[1] - edges[0]
+    half = min(int(np.ceil(3 * h / step)), (grid - 1) // 2)
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) * step / h) ** 2)
+    smoothed = np.convolve(counts, kernel / kernel.sum(), mode="same")
+    bin_width = (x.max() - x.min()) / bins
+    return pd.DataFrame({"x": (edges[:-1] + edges[1:]) / 2, "y": smoothed * bin_width / step})
+
+def box_stats(values):
+    """Box-plot summary of `values` as Axes.bxp takes it: quartiles,
+    whiskers at the furthest points within 1.5 IQR, and at most
+    MAX_FLIERS outliers (the most extreme ones)."""
+    x = _finite(values)
+    if not len(x):
+        return None
+    q1, med, q3 = np.percentile(x, [25, 50, 75])
+    lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = (x >= lo) & (x <= hi)
+    fliers = np.sort(x[~inside])
+    if len(fliers) > MAX_FLIERS:
+        k = MAX_FLIERS // 2
+        fliers = np.concatenate([fliers[:k], fliers[-k:]])
+    return {"q1": q1, "med": med, "q3": q3, "whislo": x[inside].min(), "whishi": x[inside].max(),
+            "fliers": fliers, "n": len(x)}
+
+def _raw_table(df, db_path):
+    if len(df) <= LARGE_DATA_ROWS:
+        st.dataframe(df)
+        return
+    # only the visible page is fetched and sent to the browser
+    pages = -(-len(df) // PAGE_SIZE)
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1,
+                           key="eda_raw_page")
+    offset = (page - 1) * PAGE_SIZE
+    if db_path:
+        rows = db.fetch_page(offset, PAGE_SIZE, db_path=db_path)
+    else:
+        rows = df.iloc[offset:offset + PAGE_SIZE]
+    st.dataframe(rows)
+    st.caption(f"Rows {offset + 1:,}–{offset + len(rows):,} of {len(df):,}")
+
+def _draw_top_buyers(qty_df):
+    fig, ax = plt.subplots()
+    sns.barplot(x=qty_df.values, y=qty_df.index, ax=ax)
+    ax.set_title("Top 10 Items by Quantity")
+    ax.set_xlabel("Total Quantity")
+    ax.set_ylabel("Buyer_Name")
+    return _png(fig)
+
+def _draw_histogram(values, num_col):
+    fig, ax = plt.subplots()
+    sns.histplot(values, kde=True, ax=ax, bins=30)
+    ax.set_title(f"Distribution of {num_col}")
+    return _png(fig)
+
+def _draw_binned_histogram(hist, kde, num_col):
+    fig, ax = plt.subplots()
+    ax.bar(hist["left"], hist["count"], width=hist["right"] - hist["left"], align="edge",
+           color=sns.color_palette()[0], alpha=0.75, edgecolor="white", linewidth=0.5)
+    if kde is not None:
+        ax.plot(kde["x"], kde["y"], color=sns.color_palette()[0])
+    ax.set_xlim(hist["left"].min(), hist["right"].max())
+    ax.set_title(f"Distribution of {num_col}")
+    ax.set_xlabel(num_col)
+    ax.set_ylabel("Count")
+    return _png(fig)
+
+def _draw_boxplot(values):
+    fig, ax = plt.subplots()
+    sns.boxplot(x=values, ax=ax)
+    ax.set_title("Boxplot of Item Rates")
+    return _png(fig)
+
+def _draw_binned_boxplot(stats):
+    fig, ax = plt.subplots()
+    ax.bxp([stats], orientation="horizontal", widths=0.6, showfliers=True, patch_artist=True,
+           boxprops={"facecolor": sns.color_palette()[0]})
+    ax.set_yticks([])
+    ax.set_xlabel("Rate")
+    ax.set_title("Boxplot of Item Rates")
+    return _png(fig)
+
+def _draw_heatmap(numeric_cols):
+    fig, ax = plt.subplots()
+    sns.heatmap(numeric_cols.corr(), annot=True, cmap='coolwarm', ax=ax)
+    return _png(fig)
+
+def _draw_pie(terms_counts):
+    fig, ax = plt.subplots()
+    ax.pie(terms_counts, labels=terms_counts.index, autopct='%1.1f%%', startangle=90)
+    ax.set_title("Top Terms Distribution")
+    return _png(fig)
+
+def _draw_daily(daily_total):
+    fig, ax = plt.subplots()
+    daily_total.plot(kind='line', ax=ax)
+    ax.set_title("Total Amount Over Time")
+    ax.set_ylabel("Total ₹")
+    return _png(fig)
+
+def _draw_hourly(hourly):
+    fig, ax = plt.subplots()
+    sns.barplot(x=hourly.index, y=hourly.values, ax=ax)
+    ax.set_title("Invoices by Hour of Day")
+    return _png(fig)
+
+def run_eda(df, db_path=None, cache=None, csv_path=None):
+    """Render the EDA dashboard for `df`.
+
+    With `csv_path` (the dataset `df` was read from), the group-by charts
+    and value counts of the unfiltered view are read from its materialized
+    summary (src.summaries), so they cost the same at any row count.
+    Otherwise, if `db_path` points at an invoices DB holding the same rows,
+    they are computed in SQLite instead of pandas. With a
+    `cache` (eda_cache.DatasetCache for the file `df` came from), tables,
+    aggregates and figures are reused across reruns; changing the source
+    filter only recomputes the parts that depend on it.
+
+    Above LARGE_DATA_ROWS rows the raw table is paged, the histogram
+    and boxplot are drawn from binned aggregates (see histogram_bins,
+    kde_curve, box_stats) rather than from every row, and Basic Info shows
+    the summary's running statistics instead of describe().
+    """
     st.subheader("📄 Raw Data")
-    st.dataframe(df)
-  # 🔻 Drop all rows with any missing values
-    columns_to_drop = ['GSTIN', 'PAN', 'Terms']
-    df = df.drop(columns=[col for col in columns_to_drop if col in df.columns])
+    _raw_table(df, db_path)
+
+    if normalize.FLAG_COLUMN in df.columns:
+        st.subheader("🧪 Validation Flags")
+        flags = cached(cache, "validation_flags", lambda: normalize.flag_counts(df[normalize.FLAG_COLUMN]))
+        if flags.empty:
+            st.success("✅ Every row passed validation.")
+        else:
+            st.write(flags.rename("Rows"))
 
-    # 🔻 Drop rows with any nulls
-    df = df.dropna()
+    def clean():
+        # 🔻 Keep rows with every value but the optional ones (the same rule the
+        # summary and SQL aggregates use), then drop sensitive columns and flags
+        columns_to_drop = normalize.OPTIONAL_COLUMNS
+        kept = df[normalize.complete_rows(df)]
+        return kept.drop(columns=[col for col in columns_to_drop if col in kept.columns])
+
+    df = cached(cache, "clean", clean)
 
     # --- Save to SQLite ---
     st.subheader("🗄️ Save Raw Data to SQLite")
     if st.button("💾 Save to Database"):
         try:
-            conn = sqlite3.connect("invoice_data.db")
-            df.to_sql("invoices", conn, if_exists="replace", index=False)
-            conn.close()
+            db.bulk_insert(df, "invoice_data.db", replace=True)
             st.success("✅ Data saved to SQLite database: `invoice_data.db`")
         except Exception as e:
             st.error(f"❌ Failed to save: {e}")
 
     # --- Optional: Filter by Source File ---
+    source_filter = None
     if 'Source_File' in df.columns:
-        selected_file = st.selectbox("📂 Filter by Source File", options=["All"] + sorted(df['Source_File'].unique().tolist()))
+        files = cached(cache, "source_files", lambda: sorted(df['Source_File'].unique().tolist()))
+        selected_file = st.selectbox("📂 Filter by Source File", options=["All"] + files)
         if selected_file != "All":
             df = df[df["Source_File"] == selected_file]
+            source_filter = selected_file
+
+    def memo(name, compute):
+        return cached(cache, name, compute, source_filter)
+
+    large = len(df) > LARGE_DATA_ROWS
+    summary_csv = csv_path if source_filter is None else None
 
     st.subheader("📊 Basic Info:")
-    st.dataframe(df.describe(include='all'))
+    if large and summary_csv:
+        st.dataframe(memo("column_stats", lambda: summaries.column_stats(summary_csv)))
+        st.caption("Running statistics over every stored invoice with all required fields.")
+    else:
+        st.dataframe(memo("describe", lambda: df.describe(include='all')))
 
     st.subheader("📌 Column Types with Null Count:")
-    st.write(df.dtypes.astype(str) + " | Nulls: " + df.isnull().sum().astype(str))
+    nulls = memo("nulls", lambda: df.isnull().sum())
+    st.write(df.dtypes.astype(str) + " | Nulls: " + nulls.astype(str))
 
     st.subheader("📉 Missing Values:")
-    st.write(df.isnull().sum())
-   
+    st.write(nulls)
 
     st.subheader("📌 Value Counts (Top 3):")
-    for col in df.columns:
-        if df[col].dtype == "object":
-            st.write(f"🔸 {col}")
-            st.write(df[col].value_counts().head(3))
+    for col, counts in memo("value_counts", lambda: _value_counts_top3(df, summary_csv)).items():
+        st.write(f"🔸 {col}")
+        st.write(counts)
 
     # 📦 Top 10 Items by Quantity
     st.subheader("📦 Top 10 Buyer_Name by Quantity")
     if 'Buyer_Name' in df.columns and 'Qty' in df.columns:
         try:
-            qty_df = df.groupby('Buyer_Name')['Qty'].sum().sort_values(ascending=False).head(10)
-            fig, ax = plt.subplots()
-            sns.barplot(x=qty_df.values, y=qty_df.index, ax=ax)
-            ax.set_title("Top 10 Items by Quantity")
-            ax.set_xlabel("Total Quantity")
-            ax.set_ylabel("Buyer_Name")
-            st.pyplot(fig)
+            qty_df = memo("top_buyers", lambda: _top_buyers(df, db_path, source_filter, summary_csv))
+            st.image(memo("fig:top_buyers", lambda: _draw_top_buyers(qty_df)))
         except Exception as e:
             st.warning(f"Couldn't generate quantity chart: {e}")
 
@@ -66,10 +292,12 @@ def run_eda(df):
     num_col = 'Amount' if 'Amount' in df.columns else 'Total'
     if num_col in df.columns:
         try:
-            fig, ax = plt.subplots()
-            sns.histplot(df[num_col].dropna(), kde=True, ax=ax, bins=30)
-            ax.set_title(f"Distribution of {num_col}")
-            st.pyplot(fig)
+            if large:
+                hist = memo(f"hist:{num_col}", lambda: histogram_bins(df[num_col]))
+                kde = memo(f"kde:{num_col}", lambda: kde_curve(df[num_col])) if LARGE_DATA_KDE == "approx" else None
+                st.image(memo(f"fig:hist:{num_col}", lambda: _draw_binned_histogram(hist, kde, num_col)))
+            else:
+                st.image(memo(f"fig:hist:{num_col}", lambda: _draw_histogram(df[num_col].dropna(), num_col)))
         except Exception as e:
             st.warning(f"Histogram failed: {e}")
 
@@ -77,10 +305,14 @@ def run_eda(df):
     st.subheader("📉 Boxplot of Rates")
     if 'Rate' in df.columns:
         try:
-            fig, ax = plt.subplots()
-            sns.boxplot(x=df['Rate'].dropna(), ax=ax)
-            ax.set_title("Boxplot of Item Rates")
-            st.pyplot(fig)
+            if large:
+                stats = memo("box:Rate", lambda: box_stats(df['Rate']))
+                if stats is None:
+                    st.warning("No numeric rates to plot.")
+                else:
+                    st.image(memo("fig:box:Rate", lambda: _draw_binned_boxplot(stats)))
+            else:
+                st.image(memo("fig:box:Rate", lambda: _draw_boxplot(df['Rate'].dropna())))
         except Exception as e:
             st.warning(f"Boxplot failed: {e}")
 
@@ -88,20 +320,14 @@ def run_eda(df):
     st.subheader("🧩 Correlation Heatmap (Numerical Columns)")
     numeric_cols = df.select_dtypes(include=['int64', 'float64'])
     if not numeric_cols.empty:
-        fig, ax = plt.subplots()
-        corr = numeric_cols.corr()
-        sns.heatmap(corr, annot=True, cmap='coolwarm', ax=ax)
-        st.pyplot(fig)
+        st.image(memo("fig:corr", lambda: _draw_heatmap(numeric_cols)))
 
     # 🥧 Terms Distribution
     st.subheader("🥧 Terms Distribution (Pie Chart)")
     if 'Terms' in df.columns:
         try:
-            terms_counts = df['Terms'].value_counts().head(5)
-            fig, ax = plt.subplots()
-            ax.pie(terms_counts, labels=terms_counts.index, autopct='%1.1f%%', startangle=90)
-            ax.set_title("Top Terms Distribution")
-            st.pyplot(fig)
+            terms_counts = memo("terms_counts", lambda: df['Terms'].value_counts().head(5))
+            st.image(memo("fig:terms", lambda: _draw_pie(terms_counts)))
         except Exception as e:
             st.warning(f"Pie chart error: {e}")
 
@@ -109,16 +335,11 @@ def run_eda(df):
     st.subheader("📅 Daily Invoice Total Trend")
     if 'Date' in df.columns and 'Total' in df.columns:
         try:
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-            if df['Date'].isnull().all():
+            daily_total = memo("daily_total", lambda: _daily_total(df, db_path, source_filter, summary_csv))
+            if daily_total.empty:
                 st.warning("Date conversion failed.")
             else:
-                daily_total = df.groupby(df['Date'].dt.date)['Total'].sum()
-                fig, ax = plt.subplots()
-                daily_total.plot(kind='line', ax=ax)
-                ax.set_title("Total Amount Over Time")
-                ax.set_ylabel("Total ₹")
-                st.pyplot(fig)
+                st.image(memo("fig:daily_total", lambda: _draw_daily(daily_total)))
         except Exception as e:
             st.warning(f"Date trend failed: {e}")
 
@@ -126,13 +347,10 @@ def run_eda(df):
     st.subheader("🕓 Invoice Time Distribution")
     if 'Time' in df.columns:
         try:
-            df['Hour'] = pd.to_datetime(df['Time'], format="%H:%M:%S", errors='coerce').dt.hour
-            if df['Hour'].isnull().all():
+            hourly = memo("hourly", lambda: _hourly(df, db_path, source_filter, summary_csv))
+            if hourly.empty:
                 st.warning("Time format parsing failed.")
             else:
-                fig, ax = plt.subplots()
-                sns.countplot(x='Hour', data=df, ax=ax)
-                ax.set_title("Invoices by Hour of Day")
-                st.pyplot(fig)
+                st.image(memo("fig:hourly", lambda: _draw_hourly(hourly)))
         except Exception as e:
             st.warning(f"Hour-wise chart failed: {e}")
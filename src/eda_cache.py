@@ -0,0 +1,105 @@
+# src/eda_cache.py
+# Memoization for the EDA tab. Results are keyed on the dataset
+# fingerprint (size, mtime, CRC32 from the dataset_meta sidecar, which
+# writers keep up to date incrementally) plus the active filter, held in a
+# per-user LRU with a memory cap, and survive Streamlit reruns because they
+# live at module level in the server process.
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from src import dataset_meta
+
+MAX_BYTES_PER_USER = int(os.environ.get("EDA_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+_MISSING = object()
+_lock = threading.Lock()
+_user_caches = {}
+
+def fingerprint(path):
+    """Version of the dataset CSV at `path`: one stat() and a sidecar read;
+    the file is only rescanned when some writer skipped dataset_meta."""
+    meta = dataset_meta.read(path)
+    return f"{meta['size']}-{meta['mtime_ns']}-{meta['crc32']:08x}"
+
+def size_of(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """Byte-bounded LRU. Entries bigger than the whole budget aren't kept."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        with _lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        nbytes = size_of(value)
+        with _lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._items[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, old) = self._items.popitem(last=False)
+                self.bytes -= old
+
+    def clear(self):
+        with _lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+def user_cache(username):
+    with _lock:
+        cache = _user_caches.get(username)
+        if cache is None:
+            cache = _user_caches[username] = LRUCache(MAX_BYTES_PER_USER)
+        return cache
+
+class DatasetCache:
+    """View of a user's cache bound to one dataset version."""
+
+    def __init__(self, username, path, loader=None):
+        self.path = path
+        self.fingerprint = fingerprint(path)
+        self._lru = user_cache(username)
+        self._loader = loader or (lambda: pd.read_csv(path))
+
+    def get_or_compute(self, name, compute, filter_key=None):
+        key = (self.fingerprint, name, filter_key)
+        value = self._lru.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self._lru.put(key, value)
+        return value
+
+    def dataframe(self):
+        """The parsed CSV; treat it as read-only (copy before mutating)."""
+        return self.get_or_compute("dataframe", self._loader)
+
+def cached(cache, name, compute, filter_key=None):
+    """`cache.get_or_compute` that degrades to a plain call when cache is None."""
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(name, compute, filter_key)
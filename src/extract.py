@@ -3,43 +3,347 @@ import re
 import pandas as pd
 from datetime import datetime
 
+from src import dataset_meta, db, dedup, fileio, metrics, normalize, summaries
+from src.manifest import Manifest
+
+# Field patterns, compiled once below. Every pattern starts with its
+# keyword, so a match can only begin where that keyword occurs in the text.
+FIELD_PATTERNS = [
+    ("Invoice_No", "invoice", r"Invoice\s*No[:\-]?\s*([\w\/-]+)"),
+    ("Date", "date", r"Date[:\-]?\s*([\d\-\/]+)"),
+    ("Time", "time", r"Time[:\-]?\s*([\d:APMapm\s]+)"),
+    ("Buyer_Name", "buyer", r"Buyer\s*Name[:\-]?\s*(.+)"),
+    ("Buyer_Address", "buyer", r"Buyer\s*Address[:\-]?\s*(.+)"),
+    ("PAN", "pan", r"PAN\s*No[:\-]?\s*(\w{10})"),
+    ("GSTIN", "gstin", r"GSTIN[:\-]?\s*([\dA-Z]{15})"),
+    ("Item", "item", r"Item[:\-]?\s*(.+)"),
+    ("Qty", "quantity", r"Quantity[:\-]?\s*(\d+)"),
+    ("Rate", "rate", r"Rate[:\-]?\s*Rs\.?(\d+)"),
+    ("Amount", "amount", r"Amount[:\-]?\s*Rs\.?([\d,.]+)"),
+    ("CGST", "cgst", r"CGST.*Rs\.?([\d,.]+)"),
+    ("SGST", "sgst", r"SGST.*Rs\.?([\d,.]+)"),
+    ("Total", "total", r"Total\s*Amount\s*Payable[:\-]?\s*Rs\.?([\d,.]+)"),
+    ("Terms", "terms", r"Terms[:\-]?\s*(.+)"),
+]
+FIELD_DEFAULTS = {"Invoice_No": "INV"}
+# Date/Time fall back to "now"; only computed when the field is missing
+LAZY_DEFAULTS = {
+    "Date": lambda: datetime.today().strftime("%Y-%m-%d"),
+    "Time": lambda: datetime.now().strftime("%H:%M:%S"),
+}
+_FIELDS = [(field, keyword, re.compile(pattern, re.IGNORECASE)) for field, keyword, pattern in FIELD_PATTERNS]
+
 def parse_invoice_text(text):
-    def extract(pattern, default=""):
-        match = re.search(pattern, text, re.IGNORECASE)
-        return match.group(1).strip() if match else default
-
-    return {
-        "Invoice_No": extract(r"Invoice\s*No[:\-]?\s*([\w\/-]+)", "INV"),
-        "Date": extract(r"Date[:\-]?\s*([\d\-\/]+)", datetime.today().strftime("%Y-%m-%d")),
-        "Time": extract(r"Time[:\-]?\s*([\d:APMapm\s]+)", datetime.now().strftime("%H:%M:%S")),
-        "Buyer_Name": extract(r"Buyer\s*Name[:\-]?\s*(.+)"),
-        "Buyer_Address": extract(r"Buyer\s*Address[:\-]?\s*(.+)"),
-        "PAN": extract(r"PAN\s*No[:\-]?\s*(\w{10})"),
-        "GSTIN": extract(r"GSTIN[:\-]?\s*([\dA-Z]{15})"),
-        "Item": extract(r"Item[:\-]?\s*(.+)"),
-        "Qty": extract(r"Quantity[:\-]?\s*(\d+)"),
-        "Rate": extract(r"Rate[:\-]?\s*Rs\.?(\d+)"),
-        "Amount": extract(r"Amount[:\-]?\s*Rs\.?([\d,.]+)"),
-        "CGST": extract(r"CGST.*Rs\.?([\d,.]+)"),
-        "SGST": extract(r"SGST.*Rs\.?([\d,.]+)"),
-        "Total": extract(r"Total\s*Amount\s*Payable[:\-]?\s*Rs\.?([\d,.]+)"),
-        "Terms": extract(r"Terms[:\-]?\s*(.+)"),
-    }
-
-def extract_from_ocr_outputs(input_folder, output_csv):
-    records = []
-    for file in os.listdir(input_folder):
-        if file.endswith(".txt"):
-            with open(os.path.join(input_folder, file), "r", encoding="utf-8") as f:
+    """Extract invoice fields from raw OCR text.
+
+    Each field jumps from one occurrence of its keyword to the next with
+    str.find and tries an anchored match there, instead of running a
+    case-insensitive regex search over the whole text. The first
+    occurrence that matches is the same one re.search would return.
+    """
+    if not text.isascii():
+        # str.lower() only keeps offsets aligned for ASCII text
+        return {field: _search_field(field, pattern, text) for field, _, pattern in _FIELDS}
+
+    find = text.lower().find
+    record = {}
+    for field, keyword, pattern in _FIELDS:
+        pos = find(keyword)
+        match = None
+        while pos >= 0:
+            match = pattern.match(text, pos)
+            if match:
+                break
+            pos = find(keyword, pos + 1)
+        record[field] = match.group(1).strip() if match else _default(field)
+    return record
+
+def _search_field(field, pattern, text):
+    match = pattern.search(text)
+    return match.group(1).strip() if match else _default(field)
+
+def _default(field):
+    lazy = LAZY_DEFAULTS.get(field)
+    return lazy() if lazy else FIELD_DEFAULTS.get(field, "")
+
+# Records buffered per write; bounds memory no matter how many files there are
+CHUNK_SIZE = 5000
+
+def iter_invoice_records(input_folder, names=None):
+    """Yield one parsed record per .txt file in `input_folder`.
+
+    Entries are streamed with os.scandir, so only the current file is held
+    in memory. `names`, if given, restricts parsing to those file names.
+    """
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".txt") or not entry.is_file():
+                continue
+            if names is not None and entry.name not in names:
+                continue
+            with open(entry.path, "r", encoding="utf-8") as f:
                 text = f.read()
+            with metrics.timer("parse", entry.name):
                 record = parse_invoice_text(text)
-                record["Source_File"] = file
-                records.append(record)
+            record["Source_File"] = entry.name
+            yield record
+
+def iter_chunks(records, chunk_size=CHUNK_SIZE):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def remove_sources(csv_path, sources, chunk_size=CHUNK_SIZE):
+    """Delete the rows of the files in `sources` (page ranges included, see
+    db.PAGE_RANGE_MARK) from `csv_path` and forget them in its dedup index.
+
+    The CSV is streamed into a temp file `chunk_size` rows at a time, so
+    memory stays bounded. Returns the number of rows removed.
+    """
+    with fileio.file_lock(csv_path):
+        fileio.recover(csv_path)
+        if not sources or not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+            return 0
+        index = dedup.open_index(csv_path)
+        removed = 0
+        try:
+            with summaries.updating(csv_path) as summary:
+                with fileio.atomic_write(csv_path, newline="") as f:
+                    # stored rows as written; a dataset from before the
+                    # normalization stage stays as it is until
+                    # `python -m src.normalize` converts it
+                    pd.read_csv(csv_path, nrows=0).to_csv(f, index=False)
+                    for chunk in pd.read_csv(csv_path, dtype=str, keep_default_na=False,
+                                             chunksize=chunk_size):
+                        if "Source_File" in chunk.columns:
+                            kept = chunk[~db.from_sources(chunk["Source_File"], sources)]
+                        else:
+                            kept = chunk
+                        removed += len(chunk) - len(kept)
+                        kept.to_csv(f, header=False, index=False)
+                        summary.add(kept)
+                dataset_meta.refresh(csv_path)
+            index.forget_sources(sources)
+        except BaseException:
+            index.close(save=False)
+            raise
+        index.close()
+    metrics.incr("csv_rows_removed", removed)
+    return removed
+
+def _write_csv_chunks(chunks, path, append=False):
+    # Appends are journaled per chunk; a full write goes to a temp file that
+    # replaces `path` at the end. Either way under the file's lock.
+    with fileio.file_lock(path):
+        fileio.recover(path)
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            # rows take the file's columns; Validation_Flags is dropped for a
+            # dataset not yet normalized (see normalize.normalize_csv)
+            header = pd.read_csv(path, nrows=0).columns
+            before = dataset_meta.read(path)
+            appended = 0
+            with summaries.updating(path, before) as summary:
+                for chunk in chunks:
+                    with metrics.timer("csv_write"):
+                        df = pd.DataFrame(chunk).reindex(columns=header)
+                        with fileio.journaled_append(path) as f:
+                            df.to_csv(f, header=False, index=False)
+                    summary.add(df)
+                    appended += len(df)
+                    metrics.incr("csv_rows_written", len(df))
+                dataset_meta.note_append(path, before, appended)
+            return
+
+        header = None
+        with summaries.updating(path) as summary:
+            with fileio.atomic_write(path, newline="") as f:
+                for chunk in chunks:
+                    with metrics.timer("csv_write"):
+                        df = pd.DataFrame(chunk)
+                        if header is None:
+                            df.to_csv(f, index=False)
+                            header = df.columns
+                        else:
+                            df = df.reindex(columns=header)
+                            df.to_csv(f, header=False, index=False)
+                    summary.add(df)
+                    metrics.incr("csv_rows_written", len(df))
+            dataset_meta.refresh(path)
+
+def _write_parquet_chunks(chunks, path, append=False):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow") from e
+    if append:
+        raise ValueError("Parquet files can't be appended to; write a new file instead.")
+    writer = None
+    try:
+        for chunk in chunks:
+            df = pd.DataFrame(chunk)
+            if writer is None:
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _write_sqlite_chunks(chunks, path, append=False):
+    # through db.bulk_insert, so the output keeps the migrated, typed and
+    # indexed invoices table; a full write empties it with the first chunk
+    for chunk in chunks:
+        db.bulk_insert(pd.DataFrame(chunk), path, replace=not append)
+        append = True
+
+WRITERS = {
+    "csv": _write_csv_chunks,
+    "parquet": _write_parquet_chunks,
+    "sqlite": _write_sqlite_chunks,
+}
+
+def _format_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        return "sqlite"
+    return "csv"
+
+def write_records(records, output_path, chunk_size=CHUNK_SIZE, fmt=None, append=False, raw=False):
+    """Stream `records` to `output_path`, flushing every `chunk_size` rows.
+    Each chunk is normalized (src.normalize) and deduplicated against what
+    the output already holds (src.dedup) first; with `raw` the records are
+    written exactly as given (e.g. generated ground truth).
+
+    `fmt` is "csv", "parquet" or "sqlite"; by default it is picked from the
+    file extension. Returns the number of records written, duplicates excluded.
+    """
+    fmt = fmt or _format_for(output_path)
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    count = 0
+    if raw:
+        def counted(chunks):
+            nonlocal count
+            for chunk in chunks:
+                count += len(chunk)
+                yield chunk
+
+        # the dedup index no longer matches the output; open_index rebuilds it
+        with fileio.file_lock(output_path):
+            WRITERS[fmt](counted(iter_chunks(records, chunk_size)), output_path, append=append)
+        return count
+
+    with fileio.file_lock(output_path):
+        index = dedup.open_index(output_path, fmt, bootstrap=append)
+        if not append:
+            index.clear()  # the output is being replaced
+
+        def deduped(chunks):
+            nonlocal count
+            for chunk in chunks:
+                chunk = index.filter(normalize.normalize_records(chunk))
+                count += len(chunk)
+                yield chunk
+                if append:
+                    index.save()  # the writer has stored the chunk
+
+        try:
+            WRITERS[fmt](deduped(iter_chunks(records, chunk_size)), output_path, append=append)
+        except BaseException:
+            index.close(save=False)
+            raise
+        index.close()
+    return count
+
+def _manifest_path(output_csv):
+    return output_csv + ".manifest.db"
+
+def upsert_records(output_csv, records, replace_sources=()):
+    """Write `records` into `output_csv`, keyed on Source_File.
+
+    Rows from the files in `replace_sources` (page ranges included, see
+    db.PAGE_RANGE_MARK) are removed first (see remove_sources), then the new
+    rows are appended.
+    `records` is a list of dicts or a DataFrame, normalized here unless it
+    already is. Duplicates of stored invoices are dropped (see src.dedup).
+    Returns the rows actually written.
+    """
+    new_df = normalize.normalize_records(records)
+    if new_df.empty:
+        return new_df
+    os.makedirs(os.path.dirname(output_csv) or ".", exist_ok=True)
+    with fileio.file_lock(output_csv):
+        fileio.recover(output_csv)
+        remove_sources(output_csv, replace_sources)
+        index = dedup.open_index(output_csv)
+        try:
+            new_df = index.filter(new_df)
+            if not new_df.empty:
+                _write_csv_chunks([new_df], output_csv, append=True)
+        except BaseException:
+            index.close(save=False)
+            raise
+        index.close()
+    return new_df
+
+def extract_incremental(input_folder, output_csv, chunk_size=CHUNK_SIZE):
+    """Parse only new or changed .txt files and upsert them into `output_csv`."""
+    manifest = Manifest(_manifest_path(output_csv))
+    # Without a manifest we can't tell which CSV rows came from which text,
+    # so the first run replaces by Source_File instead of blindly appending.
+    replace_all = len(manifest) == 0 and os.path.exists(output_csv) and os.path.getsize(output_csv) > 0
+    new, changed = set(), []
+    try:
+        with os.scandir(input_folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".txt") or not entry.is_file():
+                    continue
+                status = manifest.status(entry.path)
+                if status == "unchanged":
+                    continue
+                if status == "changed" or replace_all:
+                    changed.append(entry.name)
+                else:
+                    new.add(entry.name)
+                manifest.record(entry.path)
+
+        count = 0
+        if changed:
+            # drop the stale rows once; the fresh ones are then streamed in
+            # with the new files, chunk by chunk
+            remove_sources(output_csv, changed, chunk_size)
+        if new or changed:
+            count = write_records(iter_invoice_records(input_folder, new | set(changed)), output_csv,
+                                  chunk_size=chunk_size, fmt="csv", append=True)
+        manifest.save()
+    finally:
+        manifest.close(save=False)
+    print(f"✅ Incremental extraction: {count} new/changed file(s) saved to: {output_csv}")
+    return count
+
+def extract_from_ocr_outputs(input_folder, output_csv, incremental=False, chunk_size=CHUNK_SIZE):
+    """Parse every OCR .txt file in `input_folder` into `output_csv`.
+
+    Records are streamed and written `chunk_size` rows at a time; the output
+    format follows the extension (.csv, .parquet, .db). With `incremental`,
+    only new or changed files are parsed and upserted into the CSV.
+    """
+    if incremental:
+        return extract_incremental(input_folder, output_csv, chunk_size)
 
-    df = pd.DataFrame(records)
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-    df.to_csv(output_csv, index=False)
+    count = write_records(iter_invoice_records(input_folder), output_csv, chunk_size=chunk_size)
     print(f"✅ Extracted structured data saved to: {output_csv}")
+    return count
 
 if __name__ == "__main__":
     extract_from_ocr_outputs("data/ocr_outputs", "data/structured_csv/invoice_data.csv")
@@ -0,0 +1,157 @@
+# src/fileio.py
+# Concurrency-safe file writes for per-user data (CSV datasets, user file,
+# OCR text). Several Streamlit sessions and background workers may write
+# the same files, so every writer goes through:
+#
+#   file_lock(path)          exclusive advisory lock (<path>.lock), across
+#                            processes and threads; re-entrant per thread
+#   atomic_write(path)       write a temp file in the same folder, fsync,
+#                            then os.replace: readers see old or new, never half
+#   journaled_append(path)   append under the lock with an undo journal
+#                            (<path>.journal): an append cut short by a crash
+#                            is rolled back by the next writer
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_TIMEOUT = float(os.environ.get("FILE_LOCK_TIMEOUT", "60"))
+
+_held = threading.local()
+
+def lock_path(path):
+    return path + ".lock"
+
+def journal_path(path):
+    return path + ".journal"
+
+def _try_lock(fd):
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT):
+    """Hold an exclusive lock on `path` for the block.
+
+    The lock is advisory: it only excludes other code that also uses
+    file_lock. Nested calls for the same path in one thread don't block.
+    Raises TimeoutError after `timeout` seconds.
+    """
+    key = os.path.abspath(path)
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = {}
+    if key in held:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    os.makedirs(os.path.dirname(key), exist_ok=True)
+    fd = os.open(lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out after {timeout}s waiting for the lock on {path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8", newline=None):
+    """Yield a file to write `path`'s new contents to; it replaces `path`
+    only when the block finishes without error."""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=folder)
+    try:
+        kwargs = {} if "b" in mode else {"encoding": encoding, "newline": newline}
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def write_json(path, obj, **dump_kwargs):
+    with atomic_write(path) as f:
+        json.dump(obj, f, **dump_kwargs)
+
+def recover(path):
+    """Undo an append to `path` that never finished (its journal is still
+    there). Call with the lock held; returns True if something was undone."""
+    journal = journal_path(path)
+    if not os.path.exists(journal):
+        return False
+    try:
+        with open(journal, "r", encoding="utf-8") as f:
+            offset = json.load(f)["offset"]
+    except (OSError, ValueError, KeyError):
+        offset = None  # journal itself incomplete: the append never started
+    if offset is not None and os.path.exists(path) and os.path.getsize(path) > offset:
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+    os.remove(journal)
+    return offset is not None
+
+@contextmanager
+def journaled_append(path, encoding="utf-8", newline=""):
+    """Open `path` for appending, all or nothing.
+
+    The file's size is journaled before the first byte is written; on an
+    error (or, via recover(), after a crash) the file is truncated back.
+    """
+    with file_lock(path):
+        recover(path)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        write_json(journal_path(path), {"offset": offset, "pid": os.getpid(), "time": time.time()})
+        try:
+            with open(path, "a", encoding=encoding, newline=newline) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+            raise
+        finally:
+            os.remove(journal_path(path))
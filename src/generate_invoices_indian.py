@@ -1,32 +1,72 @@
+import argparse
 import os
 import random
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from PIL import Image, ImageDraw, ImageFont
 from faker import Faker
-import pandas as pd
 
-fake = Faker("en_IN")
 output_dir = "data/synthetic_invoices"
-os.makedirs(output_dir, exist_ok=True)
+csv_output_path = "data/structured_csv/invoice_data.csv"
 
 items = ["USB Cable", "Power Bank", "Mouse", "Keyboard", "Charger", "Mobile Case", "HDMI Cable", "Earphones", "Webcam", "Laptop Stand"]
-structured_data = []
+# Upper bound for random dates/times. Faker defaults to "now", which would
+# make output depend on when the generator runs instead of only the seed.
+END_DATETIME = datetime(2025, 12, 31, 23, 59, 59)
+# Invoices handed to a worker per task
+CHUNK_SIZE = 250
+# Tasks running or finished-but-not-yet-written per worker; bounds memory
+PENDING_PER_WORKER = 2
+
+# Per-process state, created once (in each pool worker, or lazily in-process)
+_fake = None
+_font = None
+
+def _get_fake():
+    global _fake
+    if _fake is None:
+        _fake = Faker("en_IN")
+    return _fake
+
+def load_font():
+    global _font
+    if _font is None:
+        try:
+            _font = ImageFont.truetype("arial.ttf", 24)
+        except OSError:
+            _font = ImageFont.load_default()
+    return _font
+
+_GSTIN_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
-def generate_invoice_data():
-    qty = random.randint(1, 5)
-    rate = random.randint(100, 1000)
+def gstin(state, pan, entity="1"):
+    """15-character GSTIN: state code, PAN, entity number, "Z" and the
+    mod-36 check character."""
+    base = f"{state:02d}{pan}{entity}Z"
+    total = 0
+    for i, ch in enumerate(base):
+        q = _GSTIN_CHARS.index(ch) * (2 if i % 2 else 1)
+        total += q // 36 + q % 36
+    return base + _GSTIN_CHARS[-total % 36]
+
+def generate_invoice_data(rng=random, fake=None):
+    fake = fake or _get_fake()
+    qty = rng.randint(1, 5)
+    rate = rng.randint(100, 1000)
     amount = qty * rate
     cgst = amount * 0.09
     sgst = amount * 0.09
     total = amount + cgst + sgst
-    item = random.choice(items)
+    item = rng.choice(items)
+    pan = fake.bothify("ABCDE####F")
     return {
         "Invoice_No": fake.bothify("INV/20##/0###"),
-        "Date": fake.date(),
-        "Time": fake.time(),
+        "Date": fake.date(end_datetime=END_DATETIME),
+        "Time": fake.time(end_datetime=END_DATETIME),
         "Buyer_Name": fake.name(),
         "Buyer_Address": fake.address().replace("\n", ", "),
-        "PAN": fake.bothify("ABCDE####F"),
-        "GSTIN": fake.bothify("##ABCDE####Z#1"),
+        "PAN": pan,
+        "GSTIN": gstin(fake.random_int(1, 37), pan),
         "Item": item,
         "Qty": qty,
         "Rate": rate,
@@ -37,13 +77,31 @@ def generate_invoice_data():
         "Terms": "Goods once sold will not be taken back."
     }
 
-def create_invoice_image(data, filename):
+def invoice_text(data):
+    """The invoice as plain text, line by line as drawn on the image (i.e.
+    what a perfect OCR pass would return)."""
+    lines = ["INVOICE"]
+    lines += [f"{key.replace('_', ' ')}: {data[key]}"
+              for key in ["Invoice_No", "Date", "Time", "Buyer_Name", "Buyer_Address", "PAN", "GSTIN"]]
+    lines += [
+        "",
+        "Item Details:",
+        "",
+        f"Item: {data['Item']}",
+        f"Quantity: {data['Qty']}  Rate: Rs.{data['Rate']}  Amount: Rs.{data['Amount']}",
+        "",
+        f"CGST (9%): Rs.{data['CGST']}",
+        f"SGST (9%): Rs.{data['SGST']}",
+        f"Total Amount Payable: Rs.{data['Total']}",
+        "",
+        data["Terms"],
+    ]
+    return "\n".join(lines) + "\n"
+
+def create_invoice_image(data, filename, out_dir=None, font=None):
     img = Image.new("RGB", (900, 700), color="white")
     draw = ImageDraw.Draw(img)
-    try:
-        font = ImageFont.truetype("arial.ttf", 24)
-    except:
-        font = ImageFont.load_default()
+    font = font or load_font()
 
     y = 40
     draw.text((300, y), "INVOICE", font=font, fill="black")
@@ -68,18 +126,103 @@ def create_invoice_image(data, filename):
     y += 60
     draw.text((50, y), data["Terms"], font=font, fill="black")
 
-    img.save(os.path.join(output_dir, filename))
+    img.save(os.path.join(out_dir or output_dir, filename))
 
-# Generate and save data
-for i in range(1, 1001):
-    data = generate_invoice_data()
-    filename = f"invoice_india_{i}.jpg"
-    create_invoice_image(data, filename)
-    data["Source_File"] = filename
-    structured_data.append(data)
+def _render_range(args):
+    """Generate and render invoices [start, stop); returns their records.
 
-df = pd.DataFrame(structured_data)
-csv_output_path = "data/structured_csv/invoice_data.csv"
-os.makedirs(os.path.dirname(csv_output_path), exist_ok=True)
-df.to_csv(csv_output_path, index=False)
-print(f"✅ Generated 1000 invoices and saved to {csv_output_path}")
+    Each invoice gets RNGs seeded from (seed, index), so the output for a
+    given seed doesn't depend on worker count or chunking.
+    """
+    start, stop, seed, out_dir, image_format = args
+    fake, font = _get_fake(), load_font()
+    records = []
+    for i in range(start, stop):
+        fake.seed_instance(f"{seed}:{i}")
+        data = generate_invoice_data(random.Random(f"{seed}:{i}"), fake)
+        filename = f"invoice_india_{i}.{image_format}"
+        create_invoice_image(data, filename, out_dir, font)
+        data["Source_File"] = filename
+        records.append(data)
+    return records
+
+def _init_worker():
+    # load Faker + font once per worker process, not once per image
+    _get_fake()
+    load_font()
+
+def iter_invoices(count=1000, seed=None, out_dir=None, workers=1, image_format="jpg",
+                  start=1, chunk_size=CHUNK_SIZE):
+    """Render `count` invoices and yield their records in index order."""
+    out_dir = out_dir or output_dir
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = ((i, min(i + chunk_size, start + count), seed, out_dir, image_format)
+             for i in range(start, start + count, chunk_size))
+    if workers <= 1:
+        for task in tasks:
+            yield from _render_range(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        yield from _iter_in_order(pool, tasks, workers * PENDING_PER_WORKER)
+
+def _iter_in_order(pool, tasks, max_pending):
+    """Yield the records of `tasks` in task order, rendering them on `pool`.
+
+    Chunks that finish ahead of their turn wait in `ready`; running plus
+    waiting chunks never exceed `max_pending`, so memory stays flat however
+    large `count` is.
+    """
+    pending = {}  # future -> task number
+    ready = {}    # task number -> records
+    submitted = next_out = 0
+    while True:
+        while len(pending) + len(ready) < max_pending:
+            task = next(tasks, None)
+            if task is None:
+                break
+            pending[pool.submit(_render_range, task)] = submitted
+            submitted += 1
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            ready[pending.pop(fut)] = fut.result()
+        while next_out in ready:
+            yield from ready.pop(next_out)
+            next_out += 1
+
+def generate_invoices(count=1000, seed=None, out_dir=None, csv_path=None, workers=1,
+                      image_format="jpg", start=1, chunk_size=CHUNK_SIZE):
+    """Generate `count` synthetic invoices: images plus a ground-truth table.
+
+    Records are streamed to `csv_path` (.csv, .parquet or .db, see
+    extract.write_records) exactly as generated, as workers finish, never
+    held all in memory.
+    The same `seed` always produces the same invoices. Returns the seed used.
+    """
+    from src.extract import write_records
+
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+    csv_path = csv_path or csv_output_path
+    records = iter_invoices(count, seed, out_dir, workers, image_format, start, chunk_size)
+    # raw: one ground-truth row per rendered image, not normalized or deduplicated
+    n = write_records(records, csv_path, chunk_size=chunk_size, raw=True)
+    print(f"✅ Generated {n} invoices (seed={seed}) and saved to {csv_path}")
+    return seed
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate synthetic Indian GST invoices.")
+    ap.add_argument("--count", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=None, help="reproducible output (random if omitted)")
+    ap.add_argument("--output-dir", default=output_dir)
+    ap.add_argument("--csv", default=csv_output_path, help="ground-truth output (.csv, .parquet or .db)")
+    ap.add_argument("--format", default="jpg", choices=["jpg", "png"], help="image format")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--start", type=int, default=1, help="index of the first invoice file")
+    args = ap.parse_args(argv)
+    generate_invoices(args.count, args.seed, args.output_dir, args.csv, args.workers,
+                      args.format, args.start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# src/ingest.py
+# Upload ingestion: turn an uploaded PDF or image into invoice records
+# and persist them to the user's CSV and SQLite DB.
+
+from src import dataset_meta, db, fileio, metrics, normalize
+from src.extract import parse_invoice_text, upsert_records
+from src.ocr import MIN_TEXT_LENGTH, extract_text_from_image
+from src.pdf_ingest import pdf_records
+
+PDF_EXTENSIONS = (".pdf",)
+
+def upload_records(f):
+    """Invoice records found in uploaded file `f`: one per invoice for
+    PDFs (see pdf_ingest), one for an image."""
+    name = getattr(f, "name", "upload")
+    if name.lower().endswith(PDF_EXTENSIONS):
+        return pdf_records(f, name)
+    text = extract_text_from_image(f)
+    if len(text.strip()) < MIN_TEXT_LENGTH:
+        return []
+    with metrics.timer("parse", name):
+        record = parse_invoice_text(text)
+    record["Source_File"] = name
+    return [record]
+
+def save_records(records, csv_path, db_path=None, replace_sources=()):
+    """Normalize `records` and append the ones not already stored to the
+    user's CSV and DB, first removing rows from `replace_sources` (files
+    being re-ingested). Returns the rows saved."""
+    df = normalize.normalize_records(records)
+    # one writer per dataset at a time, across threads and sessions
+    with fileio.file_lock(csv_path):
+        before = dataset_meta.read(csv_path)
+        saved = upsert_records(csv_path, df, replace_sources)
+        if not saved.empty or replace_sources:
+            # a DB that mirrored the CSV before the write still does after it
+            mirror = dataset_meta.read(csv_path) if db.is_mirror(before, db_path) else None
+            db.bulk_insert(saved, db_path, replace_sources=replace_sources, mirror=mirror)
+    return saved
+
+def process_upload(f, csv_path, db_path=None, progress=None):
+    """Extract the invoice(s) in uploaded file `f` and save them.
+
+    `progress`, if given, is called with the fraction done (0-1).
+    Returns (records, message); records is empty if no usable text was found.
+    """
+    name = getattr(f, "name", "upload")
+    records = upload_records(f)
+    if progress:
+        progress(0.8)
+    if not records:
+        return records, f"⚠️ {name}: no readable text found, skipped."
+    saved = save_records(records, csv_path, db_path)
+    skipped = len(records) - len(saved)
+    if saved.empty:
+        return records, f"⚠️ {name}: already in your dataset, skipped."
+    if len(records) == 1:
+        return records, f"✅ {name}: saved invoice {records[0]['Invoice_No']}."
+    note = f" ({skipped} duplicate(s) skipped)" if skipped else ""
+    return records, f"✅ {name}: saved {len(saved)} invoices{note}."
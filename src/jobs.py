@@ -0,0 +1,214 @@
+# src/jobs.py
+# Background ingestion queue for uploads. Jobs are recorded in SQLite and
+# the uploaded bytes are spooled to disk, so a batch survives Streamlit
+# reruns (and app restarts: unfinished jobs are picked up again). A small
+# in-process thread pool works through them with bounded concurrency;
+# the UI polls batch_status() for per-file progress.
+#
+# Several app processes may share one queue DB. Each claims jobs under its
+# own owner id and keeps a heartbeat in the owners table; a running job is
+# only taken over once its owner has stopped beating (the process is
+# gone). Spooled bytes are deleted as soon as a job is done or failed.
+
+import io
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import pandas as pd
+
+JOBS_DB = os.environ.get("INGEST_JOBS_DB", "data/cache/ingest_jobs.db")
+SPOOL_DIR = os.environ.get("INGEST_SPOOL_DIR", "data/cache/uploads")
+# Files processed at the same time (OCR is the bottleneck)
+MAX_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Seconds between an app process's heartbeats; a process silent for
+# OWNER_TIMEOUT is gone, and its running jobs are queued again
+HEARTBEAT_SECONDS = 10
+OWNER_TIMEOUT = 60
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id        INTEGER PRIMARY KEY,
+    batch     TEXT NOT NULL,
+    username  TEXT NOT NULL,
+    filename  TEXT NOT NULL,
+    path      TEXT NOT NULL,
+    csv_path  TEXT NOT NULL,
+    db_path   TEXT,
+    status    TEXT NOT NULL,
+    progress  REAL NOT NULL DEFAULT 0,
+    message   TEXT,
+    created   REAL NOT NULL,
+    started   REAL,
+    finished  REAL,
+    owner     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs(batch);
+CREATE INDEX IF NOT EXISTS idx_jobs_user_status ON jobs(username, status);
+-- app processes working the queue, with their last heartbeat
+CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, heartbeat REAL NOT NULL);
+"""
+
+class _NamedBytes(io.BytesIO):
+    # what ingest.process_upload expects from an uploaded file
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+class JobQueue:
+    def __init__(self, db_path=JOBS_DB, spool_dir=SPOOL_DIR, max_workers=MAX_WORKERS):
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        os.makedirs(spool_dir, exist_ok=True)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            if "owner" not in [r[1] for r in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")  # queue DBs from before owners
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest")
+        self._beat()
+        self._resume()
+        threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True).start()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _update(self, job_id, **fields):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def _beat(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)",
+                         (self.owner, time.time()))
+
+    def _reclaim(self):
+        # requeue running jobs whose owner is gone; returns their ids
+        cutoff = time.time() - OWNER_TIMEOUT
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM owners WHERE heartbeat < ?", (cutoff,))
+            return [r[0] for r in conn.execute(
+                "UPDATE jobs SET status = ?, progress = 0, owner = NULL WHERE status = ?"
+                " AND (owner IS NULL OR owner NOT IN (SELECT owner FROM owners)) RETURNING id",
+                (QUEUED, RUNNING))]
+
+    def _resume(self):
+        # jobs left queued, or running by a process that's gone, start over
+        self._reclaim()
+        with closing(self._connect()) as conn:
+            ids = [r[0] for r in conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY id", (QUEUED,))]
+        for job_id in ids:
+            self._pool.submit(self._run, job_id)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self._beat()
+                for job_id in sorted(self._reclaim()):
+                    self._pool.submit(self._run, job_id)
+            except sqlite3.Error:
+                pass  # busy DB: try again next beat
+
+    def submit(self, username, files, csv_path, db_path=None):
+        """Spool uploaded `files` and queue one job per file; returns the batch id."""
+        batch = uuid.uuid4().hex
+        batch_dir = os.path.join(self.spool_dir, batch)
+        os.makedirs(batch_dir, exist_ok=True)
+        rows = []
+        for i, f in enumerate(files):
+            name = os.path.basename(getattr(f, "name", f"upload_{i}"))
+            path = os.path.join(batch_dir, f"{i:05d}_{name}")
+            data = f.getvalue() if hasattr(f, "getvalue") else f.read()
+            with open(path, "wb") as out:
+                out.write(data)
+            rows.append((batch, username, name, path, csv_path, db_path, QUEUED, time.time()))
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO jobs (batch, username, filename, path, csv_path, db_path, status, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            ids = [r[0] for r in conn.execute("SELECT id FROM jobs WHERE batch = ? ORDER BY id", (batch,))]
+        for job_id in ids:
+            self._pool.submit(self._run, job_id)
+        return batch
+
+    def _run(self, job_id):
+        from src import metrics
+        from src.ingest import process_upload
+
+        # claim the job atomically, so it never runs twice
+        with closing(self._connect()) as conn, conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, progress = 0.1, started = ?, owner = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), self.owner, job_id, QUEUED)).rowcount
+            row = conn.execute("SELECT filename, path, csv_path, db_path FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        if not claimed:
+            return
+        filename, path, csv_path, db_path = row
+        try:
+            with open(path, "rb") as f:
+                upload = _NamedBytes(f.read(), filename)
+            with metrics.profile_document(filename), metrics.timer("document", filename):
+                _, message = process_upload(upload, csv_path, db_path,
+                                            progress=lambda p: self._update(job_id, progress=p))
+            self._update(job_id, status=DONE, progress=1.0, message=message, finished=time.time())
+        except Exception as e:
+            self._update(job_id, status=FAILED, progress=1.0, message=f"❌ {filename}: {e}",
+                         finished=time.time())
+        _remove_spooled(path)
+
+    def batch_status(self, batch):
+        """One row per file in `batch`: filename, status, progress, message."""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT filename, status, progress, message, created, started, finished"
+                " FROM jobs WHERE batch = ? ORDER BY id", conn, params=(batch,))
+
+    def user_batches(self, username, limit=5):
+        """Latest batches for `username` with per-status counts."""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT batch, MIN(created) AS created, COUNT(*) AS files,"
+                " SUM(status = 'done') AS done, SUM(status = 'failed') AS failed,"
+                " SUM(status IN ('queued', 'running')) AS pending"
+                " FROM jobs WHERE username = ? GROUP BY batch ORDER BY created DESC LIMIT ?",
+                conn, params=(username, limit))
+
+    def pending(self, username=None):
+        sql = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        params = ()
+        if username is not None:
+            sql += " AND username = ?"
+            params = (username,)
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+def _remove_spooled(path):
+    # a finished job's upload, and its batch folder once that's empty
+    for remove, target in ((os.remove, path), (os.rmdir, os.path.dirname(path))):
+        try:
+            remove(target)
+        except OSError:
+            pass
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    """The process-wide queue (Streamlit reruns and sessions share it)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
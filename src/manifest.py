@@ -0,0 +1,85 @@
+# src/manifest.py
+# Manifest of already-processed files (path, mtime, size, content hash) so
+# the OCR and extraction stages can skip inputs that have not changed.
+
+import hashlib
+import os
+import sqlite3
+
+HASH_CHUNK = 1024 * 1024
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_stamp(path):
+    """(mtime, size, content hash) of `path`, as the manifest stores them."""
+    st = os.stat(path)
+    return st.st_mtime, st.st_size, file_hash(path)
+
+class Manifest:
+    """Change tracker backed by a small SQLite file.
+
+    `status(path)` returns "new", "changed" or "unchanged". mtime/size are
+    compared first; the content hash is only computed when they differ, so
+    touching a file without changing it does not trigger reprocessing.
+    Call `record(path)` once a file is processed and `save()` at the end;
+    a worker that already read the file can pass its file_stamp() along.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                path  TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size  INTEGER NOT NULL,
+                hash  TEXT NOT NULL
+            )""")
+        self.entries = {
+            path: (mtime, size, digest)
+            for path, mtime, size, digest in self.conn.execute("SELECT path, mtime, size, hash FROM manifest")
+        }
+        self._pending = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def status(self, path):
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        old = self.entries.get(key)
+        if old is None:
+            return "new"
+        if old[0] == st.st_mtime and old[1] == st.st_size:
+            return "unchanged"
+        digest = file_hash(path)
+        if digest == old[2]:
+            # content identical, just refresh the stat fields
+            self._pending[key] = (st.st_mtime, st.st_size, digest)
+            return "unchanged"
+        return "changed"
+
+    def record(self, path, stamp=None):
+        self._pending[os.path.abspath(path)] = stamp or file_stamp(path)
+
+    def save(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO manifest (path, mtime, size, hash) VALUES (?, ?, ?, ?)",
+                [(k, *v) for k, v in self._pending.items()],
+            )
+        self.entries.update(self._pending)
+        self._pending = {}
+
+    def close(self, save=True):
+        if save:
+            self.save()
+        self.conn.close()
@@ -0,0 +1,166 @@
+# src/metrics.py
+# Lightweight in-process instrumentation for the ingestion pipeline:
+# per-stage timers and counters, an optional per-document cProfile hook,
+# and exporters for Prometheus text format and JSON lines.
+#
+#   with metrics.timer("ocr", doc=path):
+#       text = pytesseract.image_to_string(img)
+#
+# Metrics live in the process that records them; OCR pool workers keep their
+# own, so run with workers=1 when you need OCR stage timings in the app.
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Recent samples kept per stage for throughput / slowest-document views
+RECENT_SAMPLES = 1000
+# cProfile one in every METRICS_PROFILE documents (0 = off; 1 = all, slow)
+PROFILE_EVERY = int(os.environ.get("METRICS_PROFILE", "0") or 0)
+# If set, every timing is also appended to this JSON-lines file
+JSONL_PATH = os.environ.get("METRICS_JSONL", "")
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_stages = {}          # stage -> {"count", "sum", "max"}
+_recent = defaultdict(lambda: deque(maxlen=RECENT_SAMPLES))  # stage -> (ts, seconds, doc)
+_profiles = {}        # doc -> (seconds, pstats text), for the slowest profiled documents
+_MAX_PROFILES = 20
+_profiling = threading.local()
+_profile_seen = 0
+
+def incr(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+def observe(stage, seconds, doc=None):
+    now = time.time()
+    with _lock:
+        s = _stages.setdefault(stage, {"count": 0, "sum": 0.0, "max": 0.0})
+        s["count"] += 1
+        s["sum"] += seconds
+        s["max"] = max(s["max"], seconds)
+        _recent[stage].append((now, seconds, doc))
+    if JSONL_PATH:
+        _append_jsonl(JSONL_PATH, {"ts": now, "stage": stage, "seconds": seconds, "doc": doc})
+
+@contextmanager
+def timer(stage, doc=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, doc)
+
+def _should_profile(enabled):
+    global _profile_seen
+    if enabled is not None:
+        return enabled
+    if PROFILE_EVERY <= 0:
+        return False
+    with _lock:
+        _profile_seen += 1
+        return _profile_seen % PROFILE_EVERY == 0
+
+@contextmanager
+def profile_document(doc, enabled=None):
+    """cProfile everything inside the block for a sample of documents and
+    keep the report for the slowest ones. Nested calls reuse the outer
+    profile (only one profiler can be active at a time)."""
+    if getattr(_profiling, "active", False) or not _should_profile(enabled):
+        yield
+        return
+    prof = cProfile.Profile()
+    _profiling.active = True
+    start = time.perf_counter()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        _profiling.active = False
+        elapsed = time.perf_counter() - start
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(15)
+        with _lock:
+            _profiles[doc] = (elapsed, out.getvalue())
+            if len(_profiles) > _MAX_PROFILES:
+                del _profiles[min(_profiles, key=lambda d: _profiles[d][0])]
+
+def profile_report(doc):
+    entry = _profiles.get(doc)
+    return entry[1] if entry else None
+
+# ---------- views ----------
+def stage_summary():
+    """Per-stage count, total, mean and max seconds, plus recent docs/sec."""
+    with _lock:
+        stages = {k: dict(v) for k, v in _stages.items()}
+        recent = {k: list(v) for k, v in _recent.items()}
+    for stage, s in stages.items():
+        s["mean"] = s["sum"] / s["count"] if s["count"] else 0.0
+        samples = recent.get(stage, [])
+        span = samples[-1][0] - samples[0][0] if len(samples) > 1 else 0.0
+        s["recent_per_sec"] = (len(samples) - 1) / span if span > 0 else None
+    return stages
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+def slowest_documents(n=10, stage=None):
+    """(seconds, stage, doc) for the slowest recent samples that name a document."""
+    with _lock:
+        samples = [(sec, st, doc) for st, dq in _recent.items() if stage in (None, st)
+                   for _, sec, doc in dq if doc is not None]
+    return sorted(samples, key=lambda x: x[0], reverse=True)[:n]
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _stages.clear()
+        _recent.clear()
+        _profiles.clear()
+
+# ---------- exporters ----------
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def to_prometheus(prefix="invoice_pipeline"):
+    """Prometheus text exposition format (summary-style counters per stage)."""
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+        f"# TYPE {prefix}_stage_seconds summary",
+    ]
+    for stage, s in sorted(stage_summary().items()):
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{_label(stage)}"}} {s["count"]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{_label(stage)}"}} {s["sum"]:.6f}')
+    lines.append(f"# HELP {prefix}_stage_seconds_max Slowest observation per stage.")
+    lines.append(f"# TYPE {prefix}_stage_seconds_max gauge")
+    for stage, s in sorted(stage_summary().items()):
+        lines.append(f'{prefix}_stage_seconds_max{{stage="{_label(stage)}"}} {s["max"]:.6f}')
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for name, value in sorted(counters().items()):
+        lines.append(f'{prefix}_events_total{{name="{_label(name)}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+def _append_jsonl(path, event):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event) + "\n")
+
+def export_jsonl(path):
+    """Append a snapshot of stage summaries and counters as one JSON line."""
+    _append_jsonl(path, {"ts": time.time(), "stages": stage_summary(), "counters": counters()})
+
+def export_prometheus(path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(to_prometheus())
+    os.replace(tmp, path)
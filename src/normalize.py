@@ -0,0 +1,250 @@
+# src/normalize.py
+# Batch normalization and validation of extracted invoice records. Runs
+# once at ingest over whole columns (vectorized pandas/NumPy), so stored
+# datasets hold canonical, typed values and readers never re-coerce them:
+#
+#   amounts   "Rs. 1,234.50" -> 1234.5, Qty -> integer
+#   Date      DD/MM/YYYY, DD-MM-YYYY, YYYY/MM/DD, ... -> YYYY-MM-DD
+#   Time      "3:47 pm", "15:47" -> HH:MM:SS
+#   PAN/GSTIN upper-cased, spaces removed
+#
+# Nothing is fixed silently: each row gets a Validation_Flags value naming
+# the checks it failed ("" when clean), e.g. "tax_mismatch;bad_gstin".
+#
+#   python -m src.normalize data/users/alice/invoice_data.csv   # normalize in place
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+
+FLAG_COLUMN = "Validation_Flags"
+# Columns a row may leave empty and still count in the EDA charts
+OPTIONAL_COLUMNS = ["GSTIN", "PAN", "Terms", FLAG_COLUMN]
+# Cell values pd.read_csv reads as missing by default
+NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+             "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+AMOUNT_COLUMNS = ["Rate", "Amount", "CGST", "SGST", "Total"]
+# CGST + SGST together
+TAX_RATE = float(os.environ.get("INVOICE_TAX_RATE", "0.18"))
+# Rupees of rounding slack in the arithmetic checks
+TOLERANCE = 1.0
+
+# Tried in order; Indian invoices are day-first
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%y", "%d-%m-%y"]
+TIME_FORMATS = ["%H:%M:%S", "%H:%M", "%I:%M:%S %p", "%I:%M %p"]
+
+PAN_PATTERN = r"[A-Z]{5}\d{4}[A-Z]"
+# state code, PAN, entity number, "Z", checksum character
+GSTIN_PATTERN = r"\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z]"
+
+def _text(values):
+    return pd.Series(values).astype("string").str.strip().replace("", pd.NA)
+
+def parse_amounts(values):
+    """Currency text to float: drops "Rs.", "₹", "INR", thousands separators
+    and spaces; anything else unparseable becomes NaN."""
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.Series(values, dtype="float64")
+    cleaned = _text(values).str.replace(r"(?i)rs\.?|inr|₹|[,\s]", "", regex=True)
+    try:
+        return cleaned.astype("float64")  # fast path: every value is a plain number
+    except (TypeError, ValueError):
+        return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+
+def _parse_formats(text, formats):
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        todo = parsed.isna() & text.notna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+    return parsed
+
+def _iso(parsed, unit):
+    # numpy formats ISO strings far faster than Series.dt.strftime
+    text = pd.Series(np.datetime_as_string(parsed.to_numpy(), unit=unit), index=parsed.index, dtype="string")
+    return text.mask(parsed.isna())
+
+def parse_dates(values):
+    """Dates in any of DATE_FORMATS as datetime64 (NaT when unparseable)."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.Series(values)
+    return _parse_formats(_text(values), DATE_FORMATS)
+
+def _canonical(text, parsed, pattern, unit, start=0):
+    # values already in canonical form are kept; only the rest are formatted
+    out = text.copy()
+    redo = ~_is(text.str.fullmatch(pattern)) & parsed.notna().to_numpy()
+    if redo.any():
+        out[redo] = _iso(parsed[redo], unit).str.slice(start)
+    return out.mask(parsed.isna())
+
+def parse_times(values):
+    """Times in any of TIME_FORMATS as "HH:MM:SS" strings (NA when unparseable)."""
+    text = _text(values).str.upper().str.replace(r"\s+", " ", regex=True).str.replace(r"(\d)([AP]M)$", r"\1 \2", regex=True)
+    return _canonical(text, _parse_formats(text, TIME_FORMATS), r"\d{2}:\d{2}:\d{2}", "s", start=11)
+
+def _is(mask):
+    # nullable/arrow booleans -> numpy bool, NA counting as False
+    return pd.Series(mask).to_numpy(dtype=bool, na_value=False)
+
+def _flags(checks, index):
+    # one bit per check, then one string per distinct combination
+    bits = np.zeros(len(index), dtype=np.int64)
+    for i, (_, failed) in enumerate(checks):
+        bits |= _is(failed).astype(np.int64) << i
+    combos = np.unique(bits)
+    labels = [";".join(code for i, (code, _) in enumerate(checks) if combo >> i & 1) for combo in combos]
+    return pd.Series(np.array(labels, dtype=object)[np.searchsorted(combos, bits)], index=index)
+
+def normalize_frame(df):
+    """Typed, canonical copy of raw invoice records `df`, plus FLAG_COLUMN.
+
+    Columns that are missing are skipped, along with the checks that need
+    them. Unparseable values become null and are flagged (bad_number,
+    bad_date, bad_time); other flags: bad_item (a label such as
+    "Details:" instead of an item), amount_mismatch (Qty × Rate ≠ Amount),
+    tax_mismatch (CGST + SGST ≠ Amount × TAX_RATE), total_mismatch
+    (Amount + taxes ≠ Total), bad_pan, bad_gstin, pan_gstin_mismatch.
+    """
+    with metrics.timer("normalize"):
+        df = df.copy()
+        checks = []
+        has = df.columns.__contains__
+
+        bad_number = np.zeros(len(df), dtype=bool)
+        for col in AMOUNT_COLUMNS + ["Qty"]:
+            if has(col):
+                raw = _text(df[col]) if not pd.api.types.is_numeric_dtype(df[col]) else df[col]
+                df[col] = parse_amounts(df[col])
+                bad_number |= (raw.notna() & df[col].isna()).to_numpy()
+        checks.append(("bad_number", bad_number))
+        if has("Qty"):
+            df["Qty"] = df["Qty"].round().astype("Int64")
+
+        if has("Date"):
+            if pd.api.types.is_datetime64_any_dtype(df["Date"]):
+                df["Date"] = _iso(df["Date"], "D")
+            text = _text(df["Date"])
+            dates = parse_dates(text)
+            checks.append(("bad_date", text.notna() & dates.isna()))
+            df["Date"] = _canonical(text, dates, r"\d{4}-\d{2}-\d{2}", "D")
+        if has("Time"):
+            present = _text(df["Time"]).notna()
+            df["Time"] = parse_times(df["Time"])
+            checks.append(("bad_time", present & df["Time"].isna()))
+        if has("Item"):
+            checks.append(("bad_item", _is(_text(df["Item"]).str.endswith(":"))))
+
+        if has("Qty") and has("Rate") and has("Amount"):
+            checks.append(("amount_mismatch",
+                           (df["Qty"].astype("float64") * df["Rate"] - df["Amount"]).abs() > TOLERANCE))
+        if has("Amount") and has("CGST") and has("SGST"):
+            taxes = df["CGST"] + df["SGST"]
+            checks.append(("tax_mismatch", (taxes - df["Amount"] * TAX_RATE).abs() > TOLERANCE))
+            if has("Total"):
+                checks.append(("total_mismatch", (df["Amount"] + taxes - df["Total"]).abs() > TOLERANCE))
+
+        for col, pattern in (("PAN", PAN_PATTERN), ("GSTIN", GSTIN_PATTERN)):
+            if has(col):
+                df[col] = _text(df[col]).str.upper().str.replace(r"\s+", "", regex=True)
+                checks.append((f"bad_{col.lower()}", df[col].notna() & ~_is(df[col].str.fullmatch(pattern))))
+        if has("PAN") and has("GSTIN"):
+            both = _is(df["PAN"].str.fullmatch(PAN_PATTERN)) & _is(df["GSTIN"].str.fullmatch(GSTIN_PATTERN))
+            checks.append(("pan_gstin_mismatch", both & _is(df["GSTIN"].str.slice(2, 12) != df["PAN"])))
+
+        df[FLAG_COLUMN] = _flags(checks, df.index)
+        metrics.incr("rows_normalized", len(df))
+        metrics.incr("rows_flagged", int((df[FLAG_COLUMN] != "").sum()))
+        return df
+
+def complete_rows(df):
+    """Boolean mask of the rows of `df` (raw or normalized records) with a
+    value in every column but OPTIONAL_COLUMNS, judged the way pd.read_csv
+    reads the stored rows back (NA_VALUES are missing): the rows the EDA
+    charts count."""
+    complete = np.ones(len(df), dtype=bool)
+    for col in df.columns:
+        if col in OPTIONAL_COLUMNS:
+            continue
+        values = df[col]
+        missing = values.isna()
+        if not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)):
+            missing |= values.astype("string").isin(NA_VALUES)
+        complete &= ~_is(missing)
+    return complete
+
+def is_normalized(df):
+    return FLAG_COLUMN in df.columns
+
+def normalize_records(records):
+    """normalize_frame for a list of record dicts or a DataFrame; frames
+    that already went through it are returned as they are."""
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    return df if is_normalized(df) else normalize_frame(df)
+
+def _add_flag(flags, mask, code):
+    # append `code` to the flags of the rows in `mask` that don't have it yet
+    base = flags.fillna("")
+    add = _is(mask) & ~_is(base.str.contains(rf"(?:^|;){code}(?:;|$)"))
+    return flags.mask(add, (base + ";" + code).str.lstrip(";"))
+
+def coerce_stored(df):
+    """Types for a normalized dataset read back as text (pd.read_csv with
+    dtype=str): amounts float64, Qty Int64, Date datetime64, flags string.
+
+    A value some other writer stored unparsed is parsed like at ingest
+    ("1,200" -> 1200.0); one that still doesn't parse becomes null and is
+    flagged (bad_number, bad_date) instead of failing the read."""
+    df = df.copy()
+    bad = {}
+    for col in AMOUNT_COLUMNS + ["Qty"]:
+        if col in df.columns:
+            try:
+                df[col] = df[col].astype("float64")  # fast path: stored canonical
+            except (TypeError, ValueError):
+                raw = _text(df[col])
+                df[col] = parse_amounts(raw)
+                bad["bad_number"] = bad.get("bad_number", False) | (raw.notna() & df[col].isna()).to_numpy()
+    if "Qty" in df.columns:
+        df["Qty"] = df["Qty"].round().astype("Int64")
+    if "Date" in df.columns:
+        raw = _text(df["Date"])
+        df["Date"] = parse_dates(raw)
+        bad["bad_date"] = (raw.notna() & df["Date"].isna()).to_numpy()
+    if FLAG_COLUMN in df.columns:
+        flags = df[FLAG_COLUMN].astype("string")
+        for code, mask in bad.items():
+            if mask.any():
+                flags = _add_flag(flags, mask, code)
+        df[FLAG_COLUMN] = flags
+    return df
+
+def flag_counts(flags):
+    """Rows per validation flag, most common first."""
+    split = pd.Series(flags).dropna().astype(str).str.split(";").explode()
+    return split[split != ""].value_counts()
+
+def normalize_csv(path):
+    """Normalize a dataset CSV written before this stage existed, in place."""
+    from src import dataset_meta, fileio
+
+    with fileio.file_lock(path):
+        fileio.recover(path)
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        if is_normalized(df):
+            return 0
+        df = normalize_frame(df)
+        with fileio.atomic_write(path, newline="") as f:
+            df.to_csv(f, index=False)
+        dataset_meta.refresh(path)
+    return len(df)
+
+if __name__ == "__main__":
+    for csv_path in sys.argv[1:]:
+        n = normalize_csv(csv_path)
+        print(f"✅ {csv_path}: {n} row(s) normalized" if n else f"{csv_path}: already normalized")
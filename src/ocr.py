@@ -1,51 +1,238 @@
-import numpy as np
-import pandas as pd
+import io
 import os
+import time
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from PIL import Image
 import pytesseract
 
+from src import fileio, metrics, ocr_cache, preprocess, templates
+from src.manifest import Manifest
+
 # ✅ Set path to Tesseract (update if needed)
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
-def extract_text_from_image(img_path):
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MIN_TEXT_LENGTH = 30
+# In-flight OCR jobs allowed per worker before we stop feeding the pool
+PENDING_PER_WORKER = 4
+OCR_MANIFEST = ".ocr_manifest.db"
+
+# Everything that changes the OCR output for the same image. It is part of
+# the cache key, so editing it automatically bypasses stale cache entries;
+# call ocr_cache.invalidate(OCR_SETTINGS) to also reclaim their space.
+OCR_SETTINGS = {"engine": os.environ.get("OCR_ENGINE", "tesseract"), "lang": "eng", "config": "", "mode": "L",
+                "preprocess": preprocess.preset(),
+                # OCR_TEMPLATES=1: layout templates (src/templates.py) are tried before
+                # full-page OCR. Off by default until benchmarks/ocr_accuracy.py shows
+                # no accuracy regression against real Tesseract.
+                "templates": templates.fingerprint() if os.environ.get("OCR_TEMPLATES", "0") != "0" else None}
+
+# OCR_ENGINE=stub skips Tesseract and returns STUB_TEXT (after sleeping
+# OCR_STUB_DELAY seconds), so benchmarks and CI can run the pipeline on
+# machines without Tesseract installed.
+OCR_STUB_DELAY = float(os.environ.get("OCR_STUB_DELAY", "0"))
+STUB_TEXT = """INVOICE
+Invoice No: INV/2046/0336
+Date: 2003-10-21
+Time: 15:47:00
+Buyer Name: Nirvaan Tailor
+Buyer Address: 483, Sane Road, Kochi-608404
+PAN No: ABCDE6643F
+GSTIN: 33ABCDE6643F1ZS
+
+Item Details:
+
+Item: Charger
+Quantity: 4 Rate: Rs.182 Amount: Rs.728
+
+CGST (9%): Rs.65.52
+SGST (9%): Rs.65.52
+Total Amount Payable: Rs.859.04
+
+Goods once sold will not be taken back.
+"""
+
+def _image_to_string(img, config=None):
+    if OCR_SETTINGS["engine"] == "stub":
+        if OCR_STUB_DELAY:
+            time.sleep(OCR_STUB_DELAY)
+        return STUB_TEXT
+    config = " ".join(c for c in (OCR_SETTINGS["config"], config) if c)
+    return pytesseract.image_to_string(img, lang=OCR_SETTINGS["lang"], config=config)
+
+def _template_text(img, doc):
+    """Field-crop OCR via a matching layout template, or None to fall back."""
+    with metrics.timer("template_detect", doc):
+        name = templates.detect(img)
+    if name is None:
+        return None
+    method = OCR_SETTINGS["preprocess"].get("binarize")
+    prepare = (lambda im: preprocess.binarize(im, method)) if method else None
+    with metrics.timer("ocr_fields", doc):
+        text = templates.ocr_fields(img, name, _image_to_string, prepare)
+    metrics.incr("template_hits" if text else "template_fallbacks")
+    return text
+
+def _read_image_bytes(img_path):
+    if hasattr(img_path, "read"):  # uploaded file-like object
+        data = img_path.read()
+        if hasattr(img_path, "seek"):
+            img_path.seek(0)
+        return data
+    with open(img_path, "rb") as f:
+        return f.read()
+
+def _doc_name(img_path):
+    return getattr(img_path, "name", None) or str(img_path)
+
+def extract_text_from_image(img_path, use_cache=True):
+    doc = _doc_name(img_path)
     try:
-        img = Image.open(img_path).convert("L")  # Grayscale
-        # img = img.point(lambda x: 0 if x < 140 else 255, '1')  # Optional binarization
-        text = pytesseract.image_to_string(img)
-        return text
+        with metrics.profile_document(doc):
+            with metrics.timer("read", doc):
+                data = _read_image_bytes(img_path)
+            key = ocr_cache.cache_key(data, OCR_SETTINGS) if use_cache else None
+            if key:
+                cached = ocr_cache.get(key)
+                if cached is not None:
+                    metrics.incr("ocr_cache_hits")
+                    return cached
+                metrics.incr("ocr_cache_misses")
+
+            with metrics.timer("decode", doc):
+                img = Image.open(io.BytesIO(data))
+                img.load()
+            with metrics.timer("grayscale", doc):
+                img = img.convert(OCR_SETTINGS["mode"])
+            text = _template_text(img, doc) if OCR_SETTINGS["templates"] else None
+            if text is None:
+                with metrics.timer("preprocess", doc):
+                    img = preprocess.apply(img, OCR_SETTINGS["preprocess"])
+                with metrics.timer("ocr", doc):
+                    text = _image_to_string(img)
+            if key:
+                ocr_cache.put(key, text, OCR_SETTINGS)
+            metrics.incr("images_ocred")
+            return text
     except Exception as e:
+        metrics.incr("ocr_errors")
         print(f"❌ Error processing {img_path}: {e}")
         return ""
 
-def run_ocr_on_folder(input_folder, output_folder):
+def _iter_image_files(input_folder):
+    # scandir streams entries, so huge folders never become one big list
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield entry.name
+
+def _ocr_task(image_path):
+    return image_path, extract_text_from_image(image_path)
+
+def _iter_ocr_results(input_folder, files, workers, max_pending):
+    """Yield (file, text) pairs, OCR-ing up to `workers` images at a time.
+
+    At most `max_pending` images are queued on the pool, so memory stays
+    flat regardless of folder size. Results come back in completion order.
+    """
+    if workers <= 1:
+        for file in files:
+            yield file, extract_text_from_image(os.path.join(input_folder, file))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for file in files:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield pending.pop(fut), fut.result()[1]
+            fut = pool.submit(_ocr_task, os.path.join(input_folder, file))
+            pending[fut] = file
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield pending.pop(fut), fut.result()[1]
+
+def _save_ocr_text(file, text, output_folder):
+    if len(text.strip()) < MIN_TEXT_LENGTH:
+        print(f"⚠️ OCR result too short for {file}, skipping.")
+        return False
+
+    output_file = os.path.splitext(file)[0] + ".txt"
+    output_path = os.path.join(output_folder, output_file)
+
+    try:
+        with fileio.atomic_write(output_path) as f:  # extract never sees half a file
+            f.write(text)
+        print(f"✅ OCR done: {file}")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to save OCR for {file}: {e}")
+        return False
+
+def run_ocr_on_folder(input_folder, output_folder, workers=1, max_pending=None, incremental=False):
+    """OCR every image in `input_folder` into `output_folder` as .txt files.
+
+    `workers` > 1 spreads images over a process pool; `max_pending` bounds
+    the work queue (defaults to PENDING_PER_WORKER jobs per worker).
+    With `incremental`, images already recorded in the output folder's
+    manifest with the same content are skipped.
+    Returns a stats dict with counts and images/second, or None if the
+    folder is missing or has no images.
+    """
     if not os.path.exists(input_folder):
         print(f"❌ Input folder '{input_folder}' does not exist.")
         return
 
     os.makedirs(output_folder, exist_ok=True)
-    files = [f for f in os.listdir(input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    files = _iter_image_files(input_folder)
+    first = next(files, None)
 
-    if not files:
+    if first is None:
         print("⚠️ No image files found in the input folder.")
         return
 
-    for file in files:
-        image_path = os.path.join(input_folder, file)
-        text = extract_text_from_image(image_path)
+    workers = max(1, workers or os.cpu_count() or 1)
+    max_pending = max_pending or workers * PENDING_PER_WORKER
+    files = chain([first], files)
 
-        if len(text.strip()) < 30:
-            print(f"⚠️ OCR result too short for {file}, skipping.")
-            continue
+    stats = {"images": 0, "saved": 0, "skipped": 0, "unchanged": 0}
+    manifest = None
+    if incremental:
+        manifest = Manifest(os.path.join(output_folder, OCR_MANIFEST))
 
-        output_file = os.path.splitext(file)[0] + ".txt"
-        output_path = os.path.join(output_folder, output_file)
+        def changed_files(names):
+            for name in names:
+                if manifest.status(os.path.join(input_folder, name)) == "unchanged":
+                    stats["unchanged"] += 1
+                else:
+                    yield name
+
+        files = changed_files(files)
+
+    start = time.perf_counter()
+    try:
+        for file, text in _iter_ocr_results(input_folder, files, workers, max_pending):
+            stats["images"] += 1
+            if _save_ocr_text(file, text, output_folder):
+                stats["saved"] += 1
+                if manifest is not None:
+                    manifest.record(os.path.join(input_folder, file))
+            else:
+                stats["skipped"] += 1
+    finally:
+        if manifest is not None:
+            manifest.close()
 
-        try:
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(text)
-            print(f"✅ OCR done: {file}")
-        except Exception as e:
-            print(f"❌ Failed to save OCR for {file}: {e}")
+    stats["seconds"] = time.perf_counter() - start
+    stats["images_per_sec"] = stats["images"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"📈 OCR throughput: {stats['images']} images in {stats['seconds']:.1f}s "
+          f"({stats['images_per_sec']:.2f} img/s, {workers} worker(s))")
+    if incremental:
+        print(f"⏭️ Skipped {stats['unchanged']} unchanged image(s).")
+    return stats
 
 if __name__ == "__main__":
-    run_ocr_on_folder("data/synthetic_invoices", "data/ocr_outputs")
+    run_ocr_on_folder("data/synthetic_invoices", "data/ocr_outputs", workers=os.cpu_count(), incremental=True)
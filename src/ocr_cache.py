@@ -0,0 +1,105 @@
+# src/ocr_cache.py
+# Persistent OCR result cache. Entries are keyed by a hash of the image
+# bytes plus the OCR settings, so re-running OCR over unchanged images is a
+# lookup instead of a Tesseract call.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DB = os.environ.get("OCR_CACHE_DB", "data/cache/ocr_cache.db")
+MAX_CACHE_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Size check/eviction runs once every EVICT_EVERY writes per process
+EVICT_EVERY = 100
+
+_local = threading.local()
+_puts = 0
+
+def settings_hash(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+def cache_key(image_bytes, settings):
+    h = hashlib.sha256(image_bytes)
+    h.update(settings_hash(settings).encode("ascii"))
+    return h.hexdigest()
+
+def _connect():
+    # one connection per process and thread (pool workers fork/spawn their
+    # own; sqlite3 connections can't be shared across threads)
+    key = (os.getpid(), CACHE_DB)
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "key", None) != key:
+        os.makedirs(os.path.dirname(CACHE_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key       TEXT PRIMARY KEY,
+                settings  TEXT NOT NULL,
+                text      TEXT NOT NULL,
+                size      INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache(last_used)")
+        _local.conn, _local.key = conn, key
+    return conn
+
+def get(key):
+    """Return cached text for `key`, or None on a miss."""
+    conn = _connect()
+    row = conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+    return row[0]
+
+def put(key, text, settings):
+    global _puts
+    conn = _connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO ocr_cache (key, settings, text, size, last_used) VALUES (?, ?, ?, ?, ?)",
+        (key, settings_hash(settings), text, len(text.encode("utf-8")), time.time()),
+    )
+    _puts += 1
+    if _puts % EVICT_EVERY == 0:
+        evict()
+
+def evict(max_bytes=None):
+    """Drop least-recently-used entries until the cache fits in `max_bytes`."""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    conn = _connect()
+    # one transaction and one DELETE: a single commit however many go
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        removed = 0
+        if total > max_bytes:
+            for (size,) in conn.execute("SELECT size FROM ocr_cache ORDER BY last_used, rowid"):
+                total -= size
+                removed += 1
+                if total <= max_bytes:
+                    break
+            conn.execute("DELETE FROM ocr_cache WHERE key IN "
+                         "(SELECT key FROM ocr_cache ORDER BY last_used, rowid LIMIT ?)", (removed,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return removed
+
+def invalidate(settings=None):
+    """Clear the cache.
+
+    With `settings`, only entries produced under *other* settings are
+    dropped, i.e. everything that is stale for the current configuration.
+    """
+    conn = _connect()
+    if settings is None:
+        cur = conn.execute("DELETE FROM ocr_cache")
+    else:
+        cur = conn.execute("DELETE FROM ocr_cache WHERE settings != ?", (settings_hash(settings),))
+    return cur.rowcount
@@ -0,0 +1,139 @@
+# src/pdf_ingest.py
+# PDF ingestion: text layer first, OCR only where a page has none.
+#
+# Every page's text layer is read with PyPDF2; pages whose layer is empty
+# or too short (scans) have their embedded images OCR'd on a shared
+# process pool, so a 50-page scanned statement is OCR'd in parallel
+# instead of page by page. The page texts are then split into invoices at
+# each new invoice number, so multi-invoice PDFs give one record each.
+
+import io
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+from src import metrics
+from src.db import PAGE_RANGE_MARK
+from src.extract import parse_invoice_text
+from src.ocr import MIN_TEXT_LENGTH, extract_text_from_image
+
+# Pages with fewer characters than this in their text layer are OCR'd
+MIN_PAGE_TEXT = MIN_TEXT_LENGTH
+# Processes OCR-ing scanned pages, shared by all uploads in this process
+OCR_WORKERS = int(os.environ.get("PDF_OCR_WORKERS", os.cpu_count() or 1))
+
+# Start of each invoice in the page texts (same keyword as extract's Invoice_No)
+INVOICE_START = re.compile(r"^.*?Invoice\s*No[:\-]?\s*([\w\/-]+)", re.IGNORECASE | re.MULTILINE)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _ocr_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the caller is usually a thread of a running app
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _ocr_images(images):
+    # runs in a pool worker: OCR each image of one page, in order
+    return "\n".join(extract_text_from_image(io.BytesIO(data)) for data in images)
+
+def _page_images(page):
+    try:
+        return [image.data for image in page.images]
+    except Exception:  # unsupported image filter etc.; nothing we can OCR
+        return []
+
+def page_texts(f, name="upload.pdf", workers=None):
+    """Text of every page of PDF `f`, in page order.
+
+    Pages with a usable text layer are returned as is; the rest are OCR'd
+    from their embedded images, in parallel when `workers` > 1 (defaults
+    to OCR_WORKERS).
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    reader = PdfReader(f)
+    texts, scanned = [], {}
+    with metrics.timer("pdf_text_layer", name):
+        for i, page in enumerate(reader.pages):
+            text = page.extract_text() or ""
+            texts.append(text)
+            if len(text.strip()) < MIN_PAGE_TEXT:
+                images = _page_images(page)
+                if images:
+                    scanned[i] = images
+    metrics.incr("pdf_pages", len(texts))
+    metrics.incr("pdf_pages_ocred", len(scanned))
+    if not scanned:
+        return texts
+
+    with metrics.timer("pdf_ocr", name):
+        if workers <= 1 or len(scanned) == 1:
+            results = {i: _ocr_images(images) for i, images in scanned.items()}
+        else:
+            pool = _ocr_pool()
+            futures = {i: pool.submit(_ocr_images, images) for i, images in scanned.items()}
+            results = {i: fut.result() for i, fut in futures.items()}
+    for i, text in results.items():
+        texts[i] = text
+    return texts
+
+def split_invoices(texts):
+    """Split page texts into one text per invoice.
+
+    A new invoice starts at the line of each invoice number that differs
+    from the current one; pages without an invoice number (continuations)
+    stay with the invoice before them. Returns [(first_page, last_page,
+    text)], pages numbered from 1.
+    """
+    invoices = []  # [first_page, last_page, [chunks], invoice_no]
+    for page_no, text in enumerate(texts, start=1):
+        pos = 0
+        for m in INVOICE_START.finditer(text):
+            number = m.group(1).upper()
+            if not invoices:
+                invoices.append([page_no, page_no, [], number])  # keeps any title above it
+                continue
+            if invoices[-1][3] in (None, number):
+                invoices[-1][3] = number
+                continue
+            if m.start() > pos:
+                invoices[-1][2].append(text[pos:m.start()])
+                invoices[-1][1] = page_no
+            invoices.append([page_no, page_no, [], number])
+            pos = m.start()
+        if not invoices:
+            invoices.append([page_no, page_no, [], None])
+        invoices[-1][2].append(text[pos:])
+        invoices[-1][1] = page_no
+    return [(first, last, "\n".join(chunks)) for first, last, chunks, _ in invoices]
+
+def source_name(name, first, last):
+    """Source_File of the invoice on pages `first`-`last` of PDF `name`."""
+    return f"{name}{PAGE_RANGE_MARK}{first}-{last}"
+
+def invoice_texts(texts, name):
+    """[(source, text)] of the invoices in the page texts of PDF `name`.
+    The source is `name` for a single-invoice PDF and includes the page
+    range otherwise, so each invoice can be told apart (source filter,
+    replaced sources, dedup). Invoices with too little text are skipped."""
+    invoices = split_invoices(texts)
+    return [(name if len(invoices) == 1 else source_name(name, first, last), text)
+            for first, last, text in invoices if len(text.strip()) >= MIN_TEXT_LENGTH]
+
+def pdf_records(f, name="upload.pdf", workers=None):
+    """One parsed invoice record per invoice found in PDF `f`."""
+    records = []
+    for source, text in invoice_texts(page_texts(f, name, workers), name):
+        with metrics.timer("parse", name):
+            record = parse_invoice_text(text)
+        record["Source_File"] = source
+        records.append(record)
+    return records
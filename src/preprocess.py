@@ -0,0 +1,139 @@
+# src/preprocess.py
+# Image preprocessing applied between decode/grayscale and Tesseract.
+#
+# Steps, each optional and driven by a settings dict (see PRESETS), run in
+# this order:
+#   layout      crop to the text regions of a known invoice layout and stack
+#               them into one smaller image (one Tesseract call, less paper)
+#   trim        cut surrounding whitespace, keeping a small margin
+#   target_dpi  resize from the image's DPI (or assume_dpi) to target_dpi
+#   binarize    "otsu" or a fixed 0-255 threshold
+#
+# The settings are part of ocr.OCR_SETTINGS, so changing them changes the
+# OCR cache key. Pick a preset with OCR_PREPROCESS=<name>; the default is
+# "none" (Tesseract sees the grayscale image, as before). The other presets
+# are opt-in until benchmarks/ocr_accuracy.py has been run against ground
+# truth with real Tesseract.
+
+import os
+
+from PIL import Image
+
+PRESETS = {
+    "none": {},  # grayscale only
+    "default": {"binarize": "otsu", "trim": True},
+    "fast": {"target_dpi": 200, "binarize": "otsu", "trim": True},
+    "regions": {"layout": "synthetic_india", "binarize": "otsu", "trim": True},
+}
+
+# Text regions (x0, y0, x1, y1) of known layouts, in the layout's own pixel
+# size; scaled to the actual image. "synthetic_india" matches
+# generate_invoices_indian.create_invoice_image: the header fields, the
+# item/tax lines and the terms line, skipping the title and "Item Details:".
+LAYOUTS = {
+    "synthetic_india": {
+        "size": (900, 700),
+        "regions": [(40, 75, 900, 365), (40, 415, 900, 580), (40, 605, 900, 640)],
+    },
+}
+
+ASSUME_DPI = 300
+# Never upscale more than this; upscaling costs Tesseract time quadratically
+MAX_UPSCALE = 2.0
+TRIM_MARGIN = 10
+# Pixels darker than this count as ink when trimming
+INK_THRESHOLD = 200
+# Blank rows between stacked regions
+REGION_GAP = 20
+
+def preset(name=None):
+    name = name or os.environ.get("OCR_PREPROCESS", "none")
+    if name not in PRESETS:
+        raise ValueError(f"Unknown preprocessing preset: {name} (choose from {', '.join(PRESETS)})")
+    return dict(PRESETS[name])
+
+def crop_layout(img, layout):
+    """Crop `img` to the layout's regions and stack them top to bottom."""
+    spec = LAYOUTS[layout]
+    sx, sy = img.width / spec["size"][0], img.height / spec["size"][1]
+    crops = [img.crop((round(x0 * sx), round(y0 * sy), round(x1 * sx), round(y1 * sy)))
+             for x0, y0, x1, y1 in spec["regions"]]
+    gap = round(REGION_GAP * sy)
+    out = Image.new(img.mode, (max(c.width for c in crops),
+                               sum(c.height for c in crops) + gap * (len(crops) - 1)), 255)
+    y = 0
+    for c in crops:
+        out.paste(c, (0, y))
+        y += c.height + gap
+    return out
+
+def image_dpi(img, assume_dpi=ASSUME_DPI):
+    dpi = img.info.get("dpi")
+    try:
+        dpi = float(dpi[0]) if dpi else 0.0
+    except (TypeError, ValueError):
+        dpi = 0.0
+    # JFIF files without a density unit report 1 (or 72 from some tools); ignore those
+    return dpi if dpi > 72 else assume_dpi
+
+def resize_to_dpi(img, target_dpi, assume_dpi=ASSUME_DPI):
+    scale = min(target_dpi / image_dpi(img, assume_dpi), MAX_UPSCALE)
+    if abs(scale - 1.0) < 0.05:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    resample = Image.Resampling.LANCZOS if scale < 1 else Image.Resampling.BICUBIC
+    return img.resize(size, resample)
+
+def otsu_threshold(img):
+    """Otsu's threshold from the image's 256-bin histogram."""
+    hist = img.histogram()[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_bg = weight_bg = 0
+    best, threshold = -1.0, 127
+    for i, h in enumerate(hist):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+def binarize(img, method="otsu"):
+    threshold = otsu_threshold(img) if method == "otsu" else int(method)
+    lut = [0 if i <= threshold else 255 for i in range(256)]
+    return img.point(lut)
+
+def trim(img, margin=TRIM_MARGIN):
+    """Crop to the bounding box of ink, plus `margin` pixels (Tesseract
+    reads text touching the border poorly)."""
+    bbox = img.point([255 if i < INK_THRESHOLD else 0 for i in range(256)]).getbbox()
+    if bbox is None:
+        return img
+    x0, y0, x1, y1 = bbox
+    return img.crop((max(0, x0 - margin), max(0, y0 - margin),
+                     min(img.width, x1 + margin), min(img.height, y1 + margin)))
+
+def apply(img, settings):
+    """Run the steps enabled in `settings` on a grayscale ("L") image."""
+    if not settings:
+        return img
+    if img.mode != "L":
+        img = img.convert("L")
+    if settings.get("layout"):
+        img = crop_layout(img, settings["layout"])
+    # trim before resizing/binarizing so those only touch the text area
+    if settings.get("trim"):
+        img = trim(img, settings.get("trim_margin", TRIM_MARGIN))
+    if settings.get("target_dpi"):
+        img = resize_to_dpi(img, settings["target_dpi"], settings.get("assume_dpi", ASSUME_DPI))
+    if settings.get("binarize"):
+        img = binarize(img, settings["binarize"])
+    return img
@@ -0,0 +1,271 @@
+# src/storage.py
+# Pluggable per-user dataset storage. CSV is the default and the format the
+# rest of the app writes; the Parquet backend keeps a typed, columnar copy
+# of it that supports column projection and predicate pushdown.
+#
+#   store = open_store("data/users/alice/invoice_data.csv")   # backend from env
+#   df = store.read(columns=["Date", "Total"], filters=[("Total", ">", 1000)])
+
+import json
+import operator
+import os
+
+import pandas as pd
+
+from src import dataset_meta, fileio, metrics, normalize, summaries
+from src.db import NUMERIC_COLUMNS
+
+# "csv" (default) or "parquet"
+BACKEND = os.environ.get("INVOICE_STORAGE_BACKEND", "csv").lower()
+# Parquet parts (one per batch of appended rows) before the copy is compacted
+MAX_PARQUET_PARTS = 32
+
+_OPS = {
+    "==": operator.eq, "=": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+def _apply_filters(df, filters):
+    """pandas fallback for pyarrow-style [(column, op, value), ...] filters."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op == "in":
+            mask &= df[col].isin(value)
+        elif op == "not in":
+            mask &= ~df[col].isin(value)
+        else:
+            mask &= _OPS[op](df[col], value)
+    return df[mask]
+
+def typed_frame(df):
+    """Numeric invoice columns as numbers (commas stripped, junk -> null).
+
+    Date/Time stay text: OCR'd dates come in mixed formats and coercing
+    them here would silently drop values.
+    """
+    df = df.copy()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", "", regex=False), errors="coerce")
+    if "Qty" in df.columns:
+        df["Qty"] = df["Qty"].round().astype("Int64")
+    for col in df.columns:
+        if col not in NUMERIC_COLUMNS:
+            df[col] = df[col].astype("string")
+    return df
+
+def arrow_schema(columns):
+    import pyarrow as pa
+    def arrow_type(col):
+        if col == "Qty":
+            return pa.int64()
+        return pa.float64() if col in NUMERIC_COLUMNS else pa.string()
+    return pa.schema([(c, arrow_type(c)) for c in columns])
+
+def _to_arrow(df):
+    import pyarrow as pa
+    df = typed_frame(df)
+    return pa.Table.from_pandas(df, schema=arrow_schema(df.columns), preserve_index=False)
+
+class CsvStore:
+    backend = "csv"
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def read(self, columns=None, filters=None):
+        if os.path.exists(fileio.journal_path(self.path)):
+            # an append is running (wait for it) or crashed (roll it back)
+            with fileio.file_lock(self.path):
+                fileio.recover(self.path)
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(list(columns) + [c for c, _, _ in (filters or [])]))
+        if normalize.FLAG_COLUMN in pd.read_csv(self.path, nrows=0).columns:
+            # normalized datasets: read as text and typed here, so a value some
+            # other writer stored unparsed is flagged instead of failing the read
+            df = normalize.coerce_stored(pd.read_csv(self.path, usecols=usecols, dtype=str))
+        else:
+            df = pd.read_csv(self.path, usecols=usecols)  # older datasets by inference
+        df = _apply_filters(df, filters)
+        return df[list(columns)] if columns is not None else df
+
+    def write(self, df):
+        with fileio.file_lock(self.path), summaries.updating(self.path) as summary:
+            with fileio.atomic_write(self.path, newline="") as f:
+                df.to_csv(f, index=False)
+            dataset_meta.refresh(self.path)
+            summary.add(df)
+
+    def append(self, df):
+        with fileio.file_lock(self.path):
+            if not self.exists():
+                return self.write(df)
+            fileio.recover(self.path)
+            before = dataset_meta.read(self.path)
+            header = pd.read_csv(self.path, nrows=0).columns
+            df = df.reindex(columns=header)
+            with summaries.updating(self.path, before) as summary:
+                with fileio.journaled_append(self.path) as f:
+                    df.to_csv(f, header=False, index=False)
+                dataset_meta.note_append(self.path, before, len(df))
+                summary.add(df)
+
+    def row_count(self):
+        return dataset_meta.row_count(self.path)
+
+    def to_csv_bytes(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+class ParquetStore:
+    """Typed, columnar copy of the user's CSV dataset, for fast reads.
+
+    The CSV stays the one source of truth: uploads, the batch CLI and this
+    store's write/append all store rows there, and the copy follows it.
+    The copy is a folder of Parquet parts plus the CSV version
+    (dataset_meta rows/size/crc32) it reflects. When the CSV was only
+    appended to since, just the new rows are converted, into one more
+    part; any other change (or MAX_PARQUET_PARTS parts) rebuilds the copy.
+    """
+    backend = "parquet"
+
+    def __init__(self, path, csv_path=None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("The Parquet backend needs pyarrow: pip install pyarrow") from e
+        self.path = path
+        self.csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+        self.csv = CsvStore(self.csv_path)
+
+    def _sync(self):
+        # bring the copy up to the CSV's version; call with the CSV's lock held
+        fileio.recover(self.csv_path)
+        meta = dataset_meta.read(self.csv_path)
+        state = _parquet_state(self.path)
+        if state is not None and state["version"] == list(_csv_version(meta)):
+            return
+        if state is not None and state["parts"] < MAX_PARQUET_PARTS and state["size"] < meta["size"] \
+                and dataset_meta.prefix_crc32(self.csv_path, state["size"]) == state["version"][2]:
+            metrics.incr("parquet_parts_added")
+            _write_parts(self.csv_path, self.path, meta, start=state["size"], part=state["parts"])
+        else:
+            metrics.incr("parquet_rebuilds")
+            _write_parts(self.csv_path, self.path, meta)
+
+    def exists(self):
+        return self.csv.exists()
+
+    def read(self, columns=None, filters=None):
+        import pyarrow.parquet as pq
+        with fileio.file_lock(self.csv_path):
+            self._sync()
+            table = pq.read_table(self.path, columns=list(columns) if columns is not None else None,
+                                  filters=filters or None)
+            normalized = normalize.FLAG_COLUMN in pd.read_csv(self.csv_path, nrows=0).columns
+        # plain object/float columns, same as pd.read_csv would give; a
+        # normalized dataset gets CsvStore.read's types (Date datetime64)
+        df = table.to_pandas(ignore_metadata=True)
+        return normalize.coerce_stored(df) if normalized else df
+
+    def write(self, df):
+        self.csv.write(df)
+
+    def append(self, df):
+        self.csv.append(df)
+
+    def row_count(self):
+        return self.csv.row_count()
+
+    def to_csv_bytes(self):
+        return self.csv.to_csv_bytes()
+
+def _parquet_state_path(parquet_path):
+    # "_" prefix: skipped by pyarrow when it reads the folder
+    return os.path.join(parquet_path, "_state.json")
+
+def _csv_version(meta):
+    return meta["rows"], meta["size"], meta["crc32"]
+
+def _parquet_state(parquet_path):
+    try:
+        with open(_parquet_state_path(parquet_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_parts(csv_path, parquet_path, meta, start=0, part=0, chunksize=100_000):
+    """Convert the rows of `csv_path` from byte offset `start` (0: the whole
+    file, replacing the copy) into Parquet parts numbered from `part`, then
+    record CSV version `meta`. Returns the rows written."""
+    import pyarrow.parquet as pq
+
+    if start == 0 or os.path.isfile(parquet_path):
+        # a full rebuild; a single-file copy predates the folder layout
+        if os.path.isfile(parquet_path):
+            os.remove(parquet_path)
+        elif os.path.isdir(parquet_path):
+            for name in os.listdir(parquet_path):
+                os.remove(os.path.join(parquet_path, name))
+        start = part = 0
+    os.makedirs(parquet_path, exist_ok=True)
+
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    schema = arrow_schema(columns)
+    rows = 0
+    with open(csv_path, "rb") as f:
+        if start:
+            f.seek(start)
+            chunks = pd.read_csv(f, header=None, names=columns, dtype=str, chunksize=chunksize)
+        else:
+            chunks = pd.read_csv(f, dtype=str, chunksize=chunksize)
+        with fileio.atomic_write(os.path.join(parquet_path, f"part-{part:05d}.parquet"), "wb") as out:
+            writer = pq.ParquetWriter(out, schema)
+            try:
+                for chunk in chunks:
+                    writer.write_table(_to_arrow(chunk))
+                    rows += len(chunk)
+            finally:
+                writer.close()
+    fileio.write_json(_parquet_state_path(parquet_path), {
+        "version": list(_csv_version(meta)), "size": meta["size"], "parts": part + 1,
+    })
+    return rows
+
+def migrate_csv_to_parquet(csv_path, parquet_path=None, chunksize=100_000):
+    """One-shot conversion of a user CSV into its Parquet copy.
+
+    The CSV is read in chunks and written row group by row group, so large
+    tenants don't need the whole dataset in memory. Returns the rows written.
+    """
+    parquet_path = parquet_path or os.path.splitext(csv_path)[0] + ".parquet"
+    with fileio.file_lock(csv_path):
+        fileio.recover(csv_path)
+        return _write_parts(csv_path, parquet_path, dataset_meta.read(csv_path), chunksize=chunksize)
+
+def open_store(csv_path, backend=None):
+    """Storage for the dataset whose canonical location is `csv_path`."""
+    backend = (backend or BACKEND).lower()
+    if backend == "parquet":
+        return ParquetStore(os.path.splitext(csv_path)[0] + ".parquet", csv_path=csv_path)
+    if backend == "csv":
+        return CsvStore(csv_path)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def migrate_users_dir(users_dir="data/users"):
+    """Convert every data/users/<user>/invoice_data.csv to Parquet."""
+    for name in sorted(os.listdir(users_dir)):
+        csv_path = os.path.join(users_dir, name, "invoice_data.csv")
+        if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+            rows = migrate_csv_to_parquet(csv_path)
+            print(f"✅ {name}: {rows} rows -> {os.path.splitext(csv_path)[0]}.parquet")
+
+if __name__ == "__main__":
+    import sys
+    migrate_users_dir(sys.argv[1] if len(sys.argv) > 1 else "data/users")
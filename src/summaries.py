@@ -0,0 +1,296 @@
+# src/summaries.py
+# Materialized summaries of each dataset (<csv>.summary.db), updated by the
+# writers as rows are stored, so the EDA's group-by charts read a few small
+# tables instead of scanning every invoice:
+#
+#   daily    date -> invoices, sum of Total
+#   buyers   Buyer_Name -> invoices, sum of Qty, sum of Total
+#   items    Item -> invoices, sum of Qty, sum of Amount
+#   hourly   hour of day -> invoices
+#   stats    numeric column -> count, mean, M2, min, max; batches are merged
+#            with Chan et al.'s parallel update (variance = M2 / (count - 1))
+#
+# Only rows the EDA keeps are counted: those with a value in every column
+# but normalize.OPTIONAL_COLUMNS (normalize.complete_rows), so the "All"
+# view agrees with filtered views and with describe().
+#
+# Appends add the aggregates of their rows; rewrites (replaced sources,
+# edits) recompute them from the rows written. Each summary records the
+# dataset version (dataset_meta rows/size/crc32) it describes: if the CSV
+# was written without updating it (an older writer, a maintenance
+# command), the next read rebuilds it in one streamed pass.
+#
+#   python -m src.summaries data/users/alice/invoice_data.csv   # rebuild
+
+import math
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from src import dataset_meta, fileio, metrics, normalize
+
+STATS_COLUMNS = ["Qty"] + normalize.AMOUNT_COLUMNS
+# Columns whose value counts are kept (table, key column)
+VALUE_TABLES = {"Buyer_Name": ("buyers", "buyer"), "Item": ("items", "item")}
+# Bumped whenever what the tables count changes; older summaries are rebuilt
+FORMAT = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily  (day TEXT PRIMARY KEY, invoices INTEGER NOT NULL, total REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS buyers (buyer TEXT PRIMARY KEY, invoices INTEGER NOT NULL, qty REAL NOT NULL, total REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS items  (item TEXT PRIMARY KEY, invoices INTEGER NOT NULL, qty REAL NOT NULL, amount REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS hourly (hour INTEGER PRIMARY KEY, invoices INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS stats  (col TEXT PRIMARY KEY, n INTEGER NOT NULL, mean REAL NOT NULL, m2 REAL NOT NULL,
+                                   min REAL NOT NULL, max REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_buyers_qty ON buyers(qty);
+CREATE INDEX IF NOT EXISTS idx_buyers_invoices ON buyers(invoices);
+CREATE INDEX IF NOT EXISTS idx_items_invoices ON items(invoices);
+-- dataset version the tables describe
+CREATE TABLE IF NOT EXISTS state  (id INTEGER PRIMARY KEY CHECK (id = 1), rows INTEGER, size INTEGER, crc32 INTEGER);
+"""
+_TABLES = ["daily", "buyers", "items", "hourly", "stats"]
+
+def summary_path(csv_path):
+    return csv_path + ".summary.db"
+
+def _version(meta):
+    return meta["rows"], meta["size"], meta["crc32"]
+
+def _upsert_sql(table, key, sums):
+    return (f"INSERT INTO {table} ({key}, {', '.join(sums)}) VALUES ({', '.join('?' * (len(sums) + 1))}) "
+            f"ON CONFLICT({key}) DO UPDATE SET " + ", ".join(f"{c} = {c} + excluded.{c}" for c in sums))
+
+def _column(df, col, parse):
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return parse(df[col]).set_axis(df.index)
+
+def _grouped(keys, **sums):
+    # rows of (key, invoices, *sums) per distinct non-null key
+    frame = pd.DataFrame({"key": keys, **sums}).dropna(subset=["key"])
+    if frame.empty:
+        return []
+    grouped = frame.groupby("key", sort=False)
+    agg = grouped.size().rename("invoices").to_frame()
+    for col in sums:
+        agg[col] = grouped[col].sum()
+    return agg.reset_index().astype(object).itertuples(index=False, name=None)
+
+def _merge_stats(old, new):
+    # (n, mean, m2, min, max) of two batches combined
+    if old is None:
+        return new
+    n_a, mean_a, m2_a, min_a, max_a = old
+    n_b, mean_b, m2_b, min_b, max_b = new
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n,
+            min(min_a, min_b), max(max_a, max_b))
+
+class Summary:
+    """Summary tables of one dataset.
+
+    Writers `add(df)` the rows they store (or `clear()` first when
+    rewriting) and `close(meta)` with the dataset's new dataset_meta to
+    commit; `close()` alone discards what was added. Use under the
+    dataset's file lock; see updating().
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.stale = False
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != FORMAT:
+            # counted under other rules: no longer current for any dataset version
+            self.conn.execute("DELETE FROM state")
+            self.conn.execute(f"PRAGMA user_version = {FORMAT}")
+            self.conn.commit()
+
+    def version(self):
+        return self.conn.execute("SELECT rows, size, crc32 FROM state WHERE id = 1").fetchone()
+
+    def is_current(self, meta):
+        """True when the tables describe the dataset version `meta`."""
+        version = self.version()
+        if version is None:
+            return meta["rows"] == 0  # never written: only an empty dataset matches
+        return tuple(version) == _version(meta)
+
+    def add(self, df):
+        """Add the aggregates of rows `df` (raw or normalized records).
+        A failure marks the summary stale (rebuilt on the next read)
+        instead of failing the write it belongs to."""
+        if self.stale or df is None or df.empty:
+            return
+        try:
+            with metrics.timer("summary_update"):
+                self._add(df.reset_index(drop=True))
+        except Exception as e:
+            self.stale = True
+            metrics.incr("summary_errors")
+            print(f"⚠️ Summary update failed, will rebuild: {e}")
+
+    def _add(self, df):
+        df = df[normalize.complete_rows(df)]
+        amount = {c: _column(df, c, normalize.parse_amounts) for c in STATS_COLUMNS}
+        dates = _column(df, "Date", normalize.parse_dates)
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            day = pd.Series(np.datetime_as_string(dates.to_numpy(), unit="D"), index=df.index).where(dates.notna())
+        else:
+            day = dates
+        hour = _column(df, "Time", normalize.parse_times).astype("string").str.slice(0, 2)
+        hour = hour.where(hour.str.fullmatch(r"[01]\d|2[0-3]").fillna(False).astype(bool))
+        buyer = _column(df, "Buyer_Name", lambda v: v.astype("string"))
+        item = _column(df, "Item", lambda v: v.astype("string"))
+        qty, total = amount["Qty"].astype("float64"), amount["Total"].astype("float64")
+
+        execute = self.conn.executemany
+        execute(_upsert_sql("daily", "day", ["invoices", "total"]), _grouped(day, total=total))
+        execute(_upsert_sql("buyers", "buyer", ["invoices", "qty", "total"]), _grouped(buyer, qty=qty, total=total))
+        execute(_upsert_sql("items", "item", ["invoices", "qty", "amount"]),
+                _grouped(item, qty=qty, amount=amount["Amount"].astype("float64")))
+        execute(_upsert_sql("hourly", "hour", ["invoices"]), [(int(h), n) for h, n in _grouped(hour)])
+
+        for col in STATS_COLUMNS:
+            x = amount[col].to_numpy(dtype="float64", na_value=np.nan)
+            x = x[np.isfinite(x)]
+            if not len(x):
+                continue
+            mean = float(x.mean())
+            batch = (len(x), mean, float(((x - mean) ** 2).sum()), float(x.min()), float(x.max()))
+            old = self.conn.execute("SELECT n, mean, m2, min, max FROM stats WHERE col = ?", (col,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO stats (col, n, mean, m2, min, max) VALUES (?, ?, ?, ?, ?, ?)",
+                              (col, *_merge_stats(old, batch)))
+
+    def clear(self):
+        self.stale = False
+        for table in _TABLES:
+            self.conn.execute(f"DELETE FROM {table}")
+
+    def save(self, meta):
+        self.conn.execute("INSERT OR REPLACE INTO state (id, rows, size, crc32) VALUES (1, ?, ?, ?)", _version(meta))
+        self.conn.commit()
+
+    def close(self, meta=None):
+        if meta is not None and not self.stale:
+            self.save(meta)
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+    # ---------- reads ----------
+    def top_buyers(self, limit=10):
+        rows = self.conn.execute("SELECT buyer, qty FROM buyers ORDER BY qty DESC, buyer LIMIT ?", (limit,)).fetchall()
+        return pd.Series([q for _, q in rows], index=pd.Index([b for b, _ in rows], name="Buyer_Name"),
+                         name="Qty", dtype="float64")
+
+    def top_values(self, column, limit=3):
+        """The `limit` most frequent values of `column` (one of VALUE_TABLES),
+        like Series.value_counts().head(limit)."""
+        table, key = VALUE_TABLES[column]
+        rows = self.conn.execute(f"SELECT {key}, invoices FROM {table} ORDER BY invoices DESC, {key} LIMIT ?",
+                                 (limit,)).fetchall()
+        return pd.Series([n for _, n in rows], index=pd.Index([v for v, _ in rows], name=column),
+                         name="count", dtype="int64")
+
+    def daily_totals(self):
+        rows = self.conn.execute("SELECT day, total FROM daily ORDER BY day").fetchall()
+        days = pd.to_datetime(pd.Series([d for d, _ in rows], dtype="string"), format="%Y-%m-%d")
+        return pd.Series([t for _, t in rows], index=pd.Index(days.dt.date, name="Date"), name="Total", dtype="float64")
+
+    def hourly_counts(self):
+        rows = self.conn.execute("SELECT hour, invoices FROM hourly ORDER BY hour").fetchall()
+        return pd.Series([n for _, n in rows], index=pd.Index([h for h, _ in rows], name="Hour"),
+                         name="Count", dtype="int64")
+
+    def column_stats(self):
+        """count, mean, std, min and max of each numeric column."""
+        rows = {col: (n, mean, math.sqrt(m2 / (n - 1)) if n > 1 else float("nan"), lo, hi)
+                for col, n, mean, m2, lo, hi in self.conn.execute("SELECT col, n, mean, m2, min, max FROM stats")}
+        return pd.DataFrame([rows[c] for c in STATS_COLUMNS if c in rows],
+                            index=[c for c in STATS_COLUMNS if c in rows],
+                            columns=["count", "mean", "std", "min", "max"])
+
+@contextmanager
+def updating(csv_path, before=None):
+    """Summary of `csv_path` to `add()` the rows written in the block.
+
+    With `before` (the dataset_meta read just before an append) the rows
+    are added to the current tables; without it the dataset is being
+    rewritten and the tables start empty. Committed with the dataset's new
+    version if the block succeeds. Use under the dataset's lock.
+    """
+    summary = Summary(summary_path(csv_path))
+    if before is None:
+        summary.clear()
+    elif not summary.is_current(before):
+        summary.stale = True  # someone wrote without us: rebuilt on the next read
+    try:
+        yield summary
+    except BaseException:
+        summary.close()
+        raise
+    summary.close(dataset_meta.read(csv_path))
+
+def rebuild(csv_path, chunksize=100_000):
+    """Recompute the summary of `csv_path` from the CSV in one streamed pass."""
+    with fileio.file_lock(csv_path), metrics.timer("summary_rebuild"):
+        fileio.recover(csv_path)
+        current = Summary(summary_path(csv_path))
+        fresh = current.is_current(dataset_meta.read(csv_path))
+        current.close()
+        if fresh:  # another reader rebuilt it while we waited for the lock
+            return
+        with updating(csv_path) as summary:
+            if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+                # as text: whoever wrote it may not have normalized it. Every
+                # column is read, as any of them can make a row incomplete.
+                for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=str, keep_default_na=False):
+                    summary.add(chunk)
+        metrics.incr("summary_rebuilds")
+
+@contextmanager
+def reading(csv_path):
+    """Summary of `csv_path` to read, rebuilt first if it is out of date."""
+    summary = Summary(summary_path(csv_path))
+    if not summary.is_current(dataset_meta.read(csv_path)):
+        summary.close()
+        rebuild(csv_path)
+        summary = Summary(summary_path(csv_path))
+    try:
+        yield summary
+    finally:
+        summary.close()
+
+def top_buyers(csv_path, limit=10):
+    with reading(csv_path) as summary:
+        return summary.top_buyers(limit)
+
+def top_values(csv_path, column, limit=3):
+    with reading(csv_path) as summary:
+        return summary.top_values(column, limit)
+
+def daily_totals(csv_path):
+    with reading(csv_path) as summary:
+        return summary.daily_totals()
+
+def hourly_counts(csv_path):
+    with reading(csv_path) as summary:
+        return summary.hourly_counts()
+
+def column_stats(csv_path):
+    with reading(csv_path) as summary:
+        return summary.column_stats()
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        rebuild(path)
+        print(f"✅ {path}: summary rebuilt ({dataset_meta.row_count(path)} rows)")
@@ -0,0 +1,169 @@
+# src/templates.py
+# Layout templates for known invoice formats. A template lists the text
+# lines of the layout as boxes, which invoice fields each line holds and
+# what characters it can contain. For an image that matches a template we
+# OCR only those line crops (grouped by character whitelist, one Tesseract
+# call per group) instead of the full page, then emit canonical
+# "Label: value" text that parse_invoice_text reads unambiguously.
+#
+# Detection is OCR-free: the image is shrunk to the template size and its
+# inked rows are compared with the template's line boxes.
+
+import hashlib
+import json
+import re
+
+from PIL import Image
+
+# Characters each charset may contain (label characters are added per line)
+CHARSETS = {
+    "digits": "0123456789",
+    "amount": "0123456789.,",
+    "datetime": "0123456789-/:APMapm",
+}
+# Fraction of ink rows that must fall inside the template's boxes (and of
+# boxes that must contain ink) for the template to be picked
+MATCH_THRESHOLD = 0.95
+INK_THRESHOLD = 160
+REGION_GAP = 12
+
+TEMPLATES = {}
+
+def register(name, size, lines, decorations=()):
+    """Add a layout to the registry.
+
+    `size` is the layout's (width, height); `lines` a list of dicts with
+    "box" (x0, y0, x1, y1), "fields" {field: regex with one group} and an
+    optional "charset" (key of CHARSETS, or None for free text), in the
+    order they appear on the page. `decorations` are boxes with text that
+    is not OCR'd (titles, headings); they still count during detection.
+    """
+    TEMPLATES[name] = {"size": tuple(size), "lines": list(lines), "decorations": list(decorations)}
+
+def fingerprint():
+    """Hash of the registry; part of the OCR settings so cached text from
+    older templates is not reused."""
+    return hashlib.sha1(json.dumps(TEMPLATES, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+# generate_invoices_indian.create_invoice_image: one field per line at fixed
+# y offsets on a 900x700 canvas (boxes are generous to allow other fonts)
+def _row(y, x0=40):
+    return (x0, y - 5, 900, y + 32)
+
+register("synthetic_india", (900, 700), [
+    {"box": _row(80), "fields": {"Invoice_No": r"Invoice\s*No[:\-]?\s*([\w\/-]+)"}},
+    {"box": _row(120), "fields": {"Date": r"Date[:\-]?\s*([\d\-\/]+)"}, "charset": "datetime"},
+    {"box": _row(160), "fields": {"Time": r"Time[:\-]?\s*([\d:APMapm]+)"}, "charset": "datetime"},
+    {"box": _row(200), "fields": {"Buyer_Name": r"Buyer\s*Name[:\-]?\s*(.+)"}},
+    {"box": _row(240), "fields": {"Buyer_Address": r"Buyer\s*Address[:\-]?\s*(.+)"}},
+    {"box": _row(280), "fields": {"PAN": r"PAN[:\-]?\s*([A-Z0-9]{10})"}},
+    {"box": _row(320), "fields": {"GSTIN": r"GSTIN[:\-]?\s*([\dA-Z]{15})"}},
+    {"box": _row(420), "fields": {"Item": r"Item[:\-]?\s*(.+)"}},
+    {"box": _row(450), "fields": {"Qty": r"Quantity[:\-]?\s*(\d+)",
+                                  "Rate": r"Rate[:\-]?\s*Rs\.?(\d+)",
+                                  "Amount": r"Amount[:\-]?\s*Rs\.?([\d,.]+)"}, "charset": "amount"},
+    {"box": _row(490), "fields": {"CGST": r"CGST.*Rs\.?([\d,.]+)"}, "charset": "amount"},
+    {"box": _row(520), "fields": {"SGST": r"SGST.*Rs\.?([\d,.]+)"}, "charset": "amount"},
+    {"box": _row(550), "fields": {"Total": r"Total\s*Amount\s*Payable[:\-]?\s*Rs\.?([\d,.]+)"},
+     "charset": "amount"},
+    {"box": _row(610), "fields": {"Terms": r"(.+)"}},
+], decorations=[(280, 35, 620, 72), _row(380)])
+
+# Labels the canonical text uses, i.e. what extract.FIELD_PATTERNS expects
+CANONICAL_LABELS = {
+    "Invoice_No": "Invoice No: {}", "Date": "Date: {}", "Time": "Time: {}",
+    "Buyer_Name": "Buyer Name: {}", "Buyer_Address": "Buyer Address: {}",
+    "PAN": "PAN No: {}", "GSTIN": "GSTIN: {}", "Item": "Item: {}",
+    "Qty": "Quantity: {}", "Rate": "Rate: Rs.{}", "Amount": "Amount: Rs.{}",
+    "CGST": "CGST: Rs.{}", "SGST": "SGST: Rs.{}",
+    "Total": "Total Amount Payable: Rs.{}", "Terms": "Terms: {}",
+}
+
+_compiled = {}
+
+def _pattern(regex):
+    if regex not in _compiled:
+        _compiled[regex] = re.compile(regex, re.IGNORECASE)
+    return _compiled[regex]
+
+def _scaled(box, sx, sy):
+    x0, y0, x1, y1 = box
+    return (round(x0 * sx), round(y0 * sy), round(x1 * sx), round(y1 * sy))
+
+def match_score(img, template):
+    """How well the ink in grayscale `img` lines up with the template (0-1)."""
+    w, h = template["size"]
+    if abs(img.width / img.height - w / h) > 0.02:
+        return 0.0
+    small = img.resize((w, h), Image.Resampling.BOX) if img.size != (w, h) else img
+    width = small.width
+    # 1 where a pixel is ink; `1 in row` is a C-level scan
+    data = small.point([1 if v < INK_THRESHOLD else 0 for v in range(256)]).tobytes()
+    ink = [1 in data[y * width:(y + 1) * width] for y in range(h)]
+    n_ink = sum(ink)
+    if not n_ink:
+        return 0.0
+    boxes = [line["box"] for line in template["lines"]] + template["decorations"]
+    covered = [False] * h
+    for _, y0, _, y1 in boxes:
+        covered[max(0, y0):min(h, y1)] = [True] * (min(h, y1) - max(0, y0))
+    inside = sum(i and c for i, c in zip(ink, covered))
+    filled = sum(any(ink[max(0, y0):y1]) for _, y0, _, y1 in boxes)
+    return min(inside / n_ink, filled / len(boxes))
+
+def detect(img):
+    """Name of the best-matching template for grayscale `img`, or None."""
+    best, best_score = None, MATCH_THRESHOLD
+    for name, template in TEMPLATES.items():
+        score = match_score(img, template)
+        if score >= best_score:
+            best, best_score = name, score
+    return best
+
+def _whitelist(lines):
+    charset = CHARSETS[lines[0]["charset"]]
+    labels = "".join(re.sub(r"\\.|[^A-Za-z%()]", "", r) for line in lines for r in line["fields"].values())
+    return "".join(sorted(set(charset + labels + ":.%()")))
+
+def _stack(crops):
+    out = Image.new("L", (max(c.width for c in crops),
+                          sum(c.height for c in crops) + REGION_GAP * len(crops)), 255)
+    y = REGION_GAP // 2
+    for c in crops:
+        out.paste(c, (0, y))
+        y += c.height + REGION_GAP
+    return out
+
+def ocr_fields(img, name, image_to_string, prepare=None):
+    """OCR the template's lines in grayscale `img`.
+
+    Lines are grouped by charset; each group is stacked into one image and
+    read with `image_to_string(image, config)` (one text line per crop).
+    Returns canonical invoice text, or None if any line fails to read or
+    match its fields, so the caller can fall back to full-page OCR.
+    """
+    template = TEMPLATES[name]
+    sx, sy = img.width / template["size"][0], img.height / template["size"][1]
+    groups = {}
+    for line in template["lines"]:
+        groups.setdefault(line.get("charset"), []).append(line)
+
+    values = {}
+    for charset, lines in groups.items():
+        crops = [img.crop(_scaled(line["box"], sx, sy)) for line in lines]
+        stacked = _stack(crops)
+        if prepare:
+            stacked = prepare(stacked)
+        config = "--psm 6"
+        if charset:
+            config += f" -c tessedit_char_whitelist={_whitelist(lines)}"
+        text_lines = [t.strip() for t in image_to_string(stacked, config).splitlines() if t.strip()]
+        if len(text_lines) != len(lines):
+            return None
+        for line, text in zip(lines, text_lines):
+            for field, regex in line["fields"].items():
+                m = _pattern(regex).search(text)
+                if not m:
+                    return None
+                values[field] = m.group(1).strip()
+    return "\n".join(CANONICAL_LABELS[f].format(values[f]) for f in CANONICAL_LABELS if f in values) + "\n"
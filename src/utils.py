@@ -1,31 +1,3 @@
 # src/utils.py
-import json
-import os
-
-USER_FILE = "src/user.json"
-
-def load_users():
-    if not os.path.exists(USER_FILE):
-        with open(USER_FILE, "w") as f:
-            json.dump({}, f)
-    with open(USER_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-def save_users(users):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f, indent=4)
-
-def authenticate_user(username, password):
-    users = load_users()
-    return username in users and users[username] == password
-
-def register_user(username, password):
-    users = load_users()
-    if username in users:
-        return False
-    users[username] = password
-    save_users(users)
-    return True
+# Kept for older imports; accounts live in src/auth.py (SQLite user store).
+from src.auth import authenticate_user, register_user  # noqa: F401
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pandas as pd
+
+from src import dedup
+from src.extract import extract_incremental, upsert_records, write_records
+
+SAMPLE_CSV = "data/structured_csv/invoice_data.csv"
+
+def sample(n=5):
+    return pd.read_csv(SAMPLE_CSV, dtype=str, keep_default_na=False).head(n)
+
+def test_index_follows_deleted_dataset(tmp_path):
+    csv_path = str(tmp_path / "invoice_data.csv")
+    first = upsert_records(csv_path, sample())
+    assert len(first) > 0
+
+    os.remove(csv_path)  # dataset reset
+    again = upsert_records(csv_path, sample())
+    assert len(again) == len(first)
+    assert len(pd.read_csv(csv_path)) == len(first)
+
+def test_index_follows_recreated_dataset(tmp_path):
+    csv_path = str(tmp_path / "invoice_data.csv")
+    upsert_records(csv_path, sample())
+    pd.DataFrame(columns=sample().columns).to_csv(csv_path, index=False)  # header only
+
+    assert len(upsert_records(csv_path, sample())) > 0
+
+def test_index_rebuilt_after_external_write(tmp_path):
+    csv_path = str(tmp_path / "invoice_data.csv")
+    upsert_records(csv_path, sample(3))
+    sample(6).to_csv(csv_path, index=False)  # written without the index
+
+    saved = upsert_records(csv_path, sample(6))
+    assert saved.empty
+
+def test_sqlite_append_dedups_rows_already_stored(tmp_path):
+    db_path = str(tmp_path / "invoices.db")
+    stored = write_records(sample().to_dict("records"), db_path)
+    os.remove(dedup.index_path(db_path))  # e.g. written before the index existed
+
+    assert write_records(sample().to_dict("records"), db_path, append=True) == 0
+    assert stored > 0
+
+def test_incremental_replaces_changed_file(tmp_path):
+    folder = tmp_path / "ocr"
+    folder.mkdir()
+    for i in range(1, 6):
+        shutil.copy(f"data/ocr_outputs/invoice_india_{i}.txt", folder)
+    csv_path = str(tmp_path / "invoice_data.csv")
+    assert extract_incremental(str(folder), csv_path, chunk_size=2) == 5
+
+    changed = folder / "invoice_india_2.txt"
+    changed.write_text(changed.read_text() + "\n")
+    assert extract_incremental(str(folder), csv_path, chunk_size=2) == 1
+    stored = pd.read_csv(csv_path)
+    assert len(stored) == 5
+    assert stored["Source_File"].is_unique
+
+def test_unread_invoice_numbers_share_no_block(tmp_path):
+    index = dedup.DedupIndex(str(tmp_path / "index.db"))
+    rows = sample(3)
+    rows["Invoice_No"] = "INV"  # extract's fallback when no number was read
+    rows["Total"] = "100"
+    rows["Date"] = ["2024-01-01", "2024-02-01", "2024-03-01"]
+    rows["Buyer_Name"] = ["Ravi Kumar", "Ravi Kumal", "Ravi Kumor"]
+    kept = index.filter(rows)
+    assert len(kept) == 3
+    assert not kept["Validation_Flags"].str.contains(dedup.NEAR_FLAG).any()
+    index.close(save=False)
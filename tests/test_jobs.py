@@ -0,0 +1,19 @@
+import time
+from contextlib import closing
+
+from src import jobs
+
+def _running_job(conn, owner):
+    return conn.execute(
+        "INSERT INTO jobs (batch, username, filename, path, csv_path, status, created, owner)"
+        " VALUES ('b', 'u', 'f', 'p', 'c', ?, ?, ?)", (jobs.RUNNING, time.time(), owner)).lastrowid
+
+def test_only_jobs_of_gone_owners_are_reclaimed(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "spool"), max_workers=1)
+    with closing(queue._connect()) as conn, conn:
+        conn.execute("INSERT INTO owners (owner, heartbeat) VALUES ('live', ?), ('gone', ?)",
+                     (time.time(), time.time() - 2 * jobs.OWNER_TIMEOUT))
+        live, gone = _running_job(conn, "live"), _running_job(conn, "gone")
+    assert queue._reclaim() == [gone]
+    with closing(queue._connect()) as conn:
+        assert conn.execute("SELECT status FROM jobs WHERE id = ?", (live,)).fetchone()[0] == jobs.RUNNING
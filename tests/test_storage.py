@@ -0,0 +1,18 @@
+import shutil
+
+import pandas as pd
+
+from src.normalize import normalize_csv
+from src.storage import CsvStore, ParquetStore
+
+SAMPLE_CSV = "data/structured_csv/invoice_data.csv"
+
+def test_backends_read_the_same_frame(tmp_path):
+    csv_path = str(tmp_path / "invoice_data.csv")
+    shutil.copy(SAMPLE_CSV, csv_path)
+    normalize_csv(csv_path)
+
+    from_csv = CsvStore(csv_path).read()
+    from_parquet = ParquetStore(str(tmp_path / "invoice_data.parquet"), csv_path).read()
+    assert from_parquet.dtypes.to_dict() == from_csv.dtypes.to_dict()
+    pd.testing.assert_frame_equal(from_parquet, from_csv)